@@ -6,10 +6,28 @@ load_dotenv()
 # Get the absolute path of the project's root directory
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
+# --- Local Caches ---
+# Persistent caches (LLM answers, etc.) live here. Safe to delete at any time.
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".lar_cache")
+
+# --- Startup Profiling ---
+STARTUP_HISTORY_PATH = os.path.join(CACHE_DIR, "startup_history.jsonl")
+STARTUP_ONLINE_BUDGET = 6.0         # Seconds; a slower time-to-online is reported
+STARTUP_HISTORY_WINDOW = 10         # Recent runs the median is taken over
+STARTUP_REGRESSION_FACTOR = 1.3     # Slower than median x this is reported as a regression
+
 # --- Audio Settings ---
 RECORDING_PATH = os.path.join(PROJECT_ROOT, "audio", "prompt.wav")
 SAMPLE_RATE = 16000
 
+# --- Audio Output (shared mixer for TTS and earcons) ---
+# Piper's en_GB-cori-medium voice produces 22.05kHz mono S16_LE
+AUDIO_OUTPUT_SAMPLE_RATE = 22050
+# 128 frames is ~5.8ms per callback, which keeps earcon latency under 10ms
+AUDIO_OUTPUT_BLOCKSIZE = 128
+# Every .wav in this directory is decoded into memory at startup
+EARCON_DIR = os.path.join(PROJECT_ROOT, "assets", "audio")
+
 # --- ASR ---
 RECORDING_PATH = os.path.join(os.getcwd(), "assets", "audio", "temp_recording.wav")
 SAMPLE_RATE = 16000 # Sarvam API works best with 16kHz
@@ -19,17 +37,126 @@ SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
 PIPER_PATH = os.path.join(PROJECT_ROOT, "tools", "piper", "piper")
 PIPER_MODEL_PATH = os.path.join(PROJECT_ROOT, "tools", "piper", "en_GB-cori-medium.onnx")
 PIPER_CONFIG_PATH = os.path.join(PROJECT_ROOT, "tools", "piper", "en_GB-cori-medium.onnx.json")
+# The mic stays muted until a sentence has been played, waiting at most this long
+# for Piper's first audio and again for the mixer to finish playing it
+TTS_PLAYBACK_TIMEOUT = 30.0
 
 # --- LLM ---
 # The model name for the Gemini API
 LLM_MODEL_NAME = "gemini-2.5-flash"
 
+# --- LLM Backends (Ollama) ---
+OLLAMA_BASE_URL = "http://127.0.0.1:11434"
+OLLAMA_MODEL = "lar-model"
+# Every backend speaks the Ollama API. "tier" is "small" (fast, simple prompts)
+# or "large" (preferred for complex prompts). The first entry is the primary,
+# used for warm-up, summaries and embeddings.
+LLM_BACKENDS = [
+    {"name": "local", "url": OLLAMA_BASE_URL, "model": OLLAMA_MODEL, "tier": "small"},
+    # {"name": "local-large", "url": OLLAMA_BASE_URL, "model": "lar-model-large", "tier": "large"},
+]
+# Optional remote Ollama endpoint (e.g. a GPU box on the LAN)
+if os.getenv("LAR_REMOTE_OLLAMA_URL"):
+    LLM_BACKENDS.append({
+        "name": "remote",
+        "url": os.getenv("LAR_REMOTE_OLLAMA_URL"),
+        "model": os.getenv("LAR_REMOTE_OLLAMA_MODEL", OLLAMA_MODEL),
+        "tier": "large"
+    })
+LLM_HEDGE_DELAY = 1.5           # Seconds without a first token before also asking the next backend
+LLM_COMPLEXITY_THRESHOLD = 2    # prompt_complexity() score at which the "large" tier is preferred
+
+# --- LLM Client (Ollama) ---
+LLM_CONNECT_TIMEOUT = 2.0       # Seconds to establish the TCP connection
+LLM_FIRST_TOKEN_TIMEOUT = 20.0  # Seconds to wait for the first token (covers a cold model load)
+LLM_IDLE_TIMEOUT = 8.0          # Max seconds between tokens once streaming has started
+LLM_POOL_SIZE = 4               # Keep-alive connections held by the shared session
+LLM_BREAKER_FAILURE_THRESHOLD = 3   # Consecutive failures before the circuit opens
+LLM_BREAKER_RESET_SECONDS = 30.0    # How long to short-circuit before retrying Ollama
+
+# --- LLM Warm-up and Keep-Alive ---
+# Sent as Ollama's keep_alive with every request: a duration like "30m", or -1 to pin the model in memory
+LLM_KEEP_ALIVE = "30m"
+LLM_HEARTBEAT_INTERVAL = 240.0  # Seconds of idleness before a no-op load request refreshes keep_alive
+LLM_HEARTBEAT_HOURS = (7, 24)   # Local hours [start, end) during which the model is kept resident
+LLM_COLD_LOAD_THRESHOLD = 0.5   # A reported load_duration above this (seconds) is logged as a cold load
+
+# --- LLM Response Length ---
+LLM_MAX_SENTENCES = 2           # Only this many sentences of an answer are spoken
+LLM_TOKENS_PER_SENTENCE = 40    # Used to derive Ollama's num_predict from the sentence budget
+
+# --- LLM Response Cache ---
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.json")
+LLM_CACHE_MAX_ENTRIES = 256
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Also match paraphrases by embedding similarity (one extra Ollama call per lookup)
+LLM_CACHE_USE_EMBEDDINGS = False
+LLM_CACHE_SIMILARITY = 0.92
+
+# --- LLM Chat History ---
+# The Modelfile already bakes in Lar's system prompt; re-sending it every turn
+# only adds prompt-evaluation time. Enable this for models built without it.
+LLM_SEND_SYSTEM_PROMPT = False
+LLM_HISTORY_TOKEN_BUDGET = 1024     # Older turns are summarised once history exceeds this
+LLM_HISTORY_SUMMARY_TOKENS = 200    # Upper bound on the rolling summary
+# Summarise old turns with the LLM itself instead of the extractive summariser.
+# Better summaries, but it competes with the next question for the (CPU-bound) model.
+LLM_HISTORY_USE_LLM_SUMMARY = False
+
+# --- Fastpath Execution ---
+FASTPATH_MAX_WORKERS = 6         # Handlers run on a bounded thread pool
+FASTPATH_MAX_PER_HANDLER = 2     # So one slow intent can't take every worker
+FASTPATH_DEFAULT_DEADLINE = 1.5  # Seconds before "working on it" (handlers may declare their own)
+
+# --- Weather Service ---
+WEATHER_URL = "https://wttr.in/?format=%C+%t"
+WEATHER_TTL_SECONDS = 900           # A reading older than this is stale
+WEATHER_REFRESH_INTERVAL = 600      # Background refresh period (shorter than the TTL)
+WEATHER_TIMEOUT = 5.0               # Seconds per HTTP request
+WEATHER_MAX_STALE_SECONDS = 3 * 3600  # Stale readings are served up to this age when refreshes fail
+
+# --- News Service ---
+NEWS_FEEDS = ["http://feeds.bbci.co.uk/news/world/rss.xml"]
+NEWS_POLL_INTERVAL = 600    # Seconds between conditional (ETag/Last-Modified) polls
+NEWS_TIMEOUT = 5.0          # Seconds per HTTP request
+NEWS_MAX_HEADLINES = 50     # Deduplicated headlines kept in memory
+
+# --- Intent Classifier ---
+# Fuzzy fallback when no exact fastpath trigger matches ("skip this song").
+# Run `python core/intent_classifier.py` for precision vs. LLM fallback per threshold.
+INTENT_CLASSIFIER_ENABLED = True
+INTENT_CLASSIFIER_THRESHOLD = 0.6
+# Side-effecting commands (playback, volume, apps) also need to beat the next-best
+# label by this much; a close call goes to the LLM instead of doing the wrong thing
+INTENT_CLASSIFIER_MARGIN = 0.1
+
+# --- LLM Tool Calls ---
+# Let the LLM trigger fastpath handlers with structured tool calls. Needs a
+# tool-capable base model in the Modelfile; when off, post-LLM actions fall
+# back to keyword matching on the prompt, scheduled as soon as it is known.
+LLM_TOOL_CALLS_ENABLED = True
+LLM_TOOL_RESULT_TIMEOUT = 10.0  # Seconds to wait for tool results when the LLM said nothing itself
+# Keyword-matched actions (tool calls off) are matched as soon as the prompt is known.
+# "after_first_sentence": run once the first sentence is queued for TTS; "immediate": run straight away
+POST_LLM_ACTION_ORDER = "after_first_sentence"
+POST_LLM_GATE_TIMEOUT = 10.0    # Seconds an action waits for its turn before running anyway
+
 # --- Voice Activity Detection (VAD) Settings ---
 # SILENCE_THRESHOLD = 2000000
 SILENCE_THRESHOLD = 500000
 SILENCE_DURATION = 1.0
 MIC_DEVICE_INDEX = 8
 
+# --- Speculative LLM Prefetch ---
+# After this much silence the audio so far is transcribed as a "partial" and,
+# if it is an LLM question, the LLM request starts before SILENCE_DURATION ends.
+SPECULATIVE_LLM_ENABLED = True
+SPECULATION_SILENCE_DURATION = 0.35
+# Less speech than this (seconds, before the pause) is a command like "pause" or
+# "volume up": no partial is sent, so ASR is free for its final transcript.
+SPECULATION_MIN_SPEECH_DURATION = 1.2
+
 # --- Wake Word (Porcupine) Settings ---
 PICOVOICE_ACCESS_KEY = os.getenv("PICOVOICE_ACCESS_KEY", "YOUR_PICOVOICE_ACCESS_KEY_HERE")
 
@@ -46,4 +173,60 @@ SPOTIPY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI")
 # This is the 'scope' or permissions Lar will ask for
 SPOTIPY_SCOPE = "user-modify-playback-state user-read-playback-state"
 # Path to store the authentication token
-SPOTIPY_CACHE_PATH = os.path.join(PROJECT_ROOT, ".spotify_token_cache")
\ No newline at end of file
+SPOTIPY_CACHE_PATH = os.path.join(PROJECT_ROOT, ".spotify_token_cache")
+
+# --- Spotify Service ---
+SPOTIFY_POLL_INTERVAL = 20.0          # Seconds between background playback-state reads
+SPOTIFY_STATE_MAX_AGE = 120.0         # Older cached state is re-read before a command uses it
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300.0  # Refresh the OAuth token this many seconds before expiry
+SPOTIFY_TIMEOUT = 5.0                 # Seconds per Web API request
+
+# --- Spotify Search Cache ---
+# "play <query>" results, so repeat requests skip the search round trip
+SPOTIFY_SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "spotify_search.json")
+SPOTIFY_SEARCH_CACHE_MAX_ENTRIES = 500
+SPOTIFY_SEARCH_CACHE_TTL_SECONDS = 30 * 24 * 3600  # Older hits are still used, then re-searched in the background
+SPOTIFY_SEARCH_FUZZY_CUTOFF = 0.85                 # difflib ratio for matching ASR variants of a cached query
+
+# --- Application Index ---
+# "open <app>" resolves against .desktop files and $PATH, cached here
+APP_INDEX_CACHE_PATH = os.path.join(CACHE_DIR, "app_index.json")
+APP_FUZZY_CUTOFF = 0.8  # difflib ratio for near-miss app names ("libre office writer")
+# Spoken names that should open something other than what they'd resolve to
+APP_ALIASES = {
+    "firefox": "brave",
+    "browser": "brave",
+    "console": "gnome-terminal",
+    "terminal": "gnome-terminal",
+    "code": "cursor",
+    "visual studio": "cursor",
+}
+# $PATH programs without a .desktop entry that may still be opened by name. Only
+# executables backing an installed .desktop entry are offered otherwise, so "open
+# shutdown" or "open rm" can't run system commands.
+APP_PATH_ALLOWLIST = ("brave", "gnome-terminal", "cursor")
+
+# --- System Volume ---
+SYSTEM_VOLUME_COALESCE_WINDOW = 0.15  # Seconds; adjustments within this window become one write
+SYSTEM_VOLUME_MAX_STATE_AGE = 30.0    # Cached sink state is re-read if older (backends without events)
+SYSTEM_VOLUME_ECHO_WINDOW = 0.25      # Sink events this soon after our own write are its echo, not re-read
+
+# --- Pipeline ---
+# Bounded channels between the listener, ASR, logic and TTS stages
+PIPELINE_ASR_CHANNEL_SIZE = 4      # Utterance audio; the oldest is dropped if ASR falls this far behind
+PIPELINE_LOGIC_CHANNEL_SIZE = 8    # Transcripts
+PIPELINE_TTS_CHANNEL_SIZE = 32     # Sentences waiting to be spoken
+
+
+# --- Latency Tracing ---
+# Per-utterance spans (speech end, ASR, routing, LLM first token, first audio) as JSON lines
+TRACE_ENABLED = True
+TRACE_PATH = os.path.join(CACHE_DIR, "trace.jsonl")
+TRACE_MAX_BYTES = 2_000_000   # Rotated past this size...
+TRACE_BACKUPS = 3             # ...keeping this many old files (trace.jsonl.1, .2, ...)
+TRACE_OPEN_REQUESTS = 64      # Requests tracked at once; the oldest unfinished one is forgotten
+
+# --- Metrics ---
+# Latency histograms (LLM, tools, services, trace spans) are printed at shutdown
+# and every METRICS_REPORT_INTERVAL seconds while running; 0 turns the periodic report off
+METRICS_REPORT_INTERVAL = 900.0
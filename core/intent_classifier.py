@@ -0,0 +1,237 @@
+# core/intent_classifier.py
+import math
+import re
+from collections import Counter
+
+# --- Training Data ---
+# Paraphrases the keyword registries miss, mapped to a canonical command: a
+# phrase the matching handler already understands. The canonical command,
+# not the user's wording, is what gets passed to the handler.
+CANONICAL_EXAMPLES = {
+    "pause": ["pause the music", "pause the music please", "pause it", "pause the song",
+              "hold the music", "pause playback", "pause spotify please", "pause this track"],
+    "resume": ["resume the music", "continue playing", "keep playing", "unpause", "carry on playing",
+               "resume playback", "start the music again"],
+    "stop": ["stop the music", "stop playing", "stop the song", "turn off the music", "stop playback"],
+    "next": ["skip this song", "skip", "skip track", "skip it", "next one", "play the next song",
+             "go to the next track", "skip to the next song", "change the song"],
+    "previous": ["go back a song", "play the previous song", "previous one", "back one track",
+                 "play the last song again", "go to the previous track"],
+    "toggle music": ["toggle playback", "toggle the music"],
+    "what time": ["what time is it", "tell me the time", "what's the time now", "do you know the time",
+                  "time please", "what hour is it", "what is the current time"],
+    "what weather": ["what's the weather like", "how's the weather", "weather please", "is it going to rain",
+                     "what's the weather today", "how hot is it outside", "what's it like outside",
+                     "weather report", "what's the temperature outside"],
+    "headlines": ["news please", "what's happening in the world", "give me the news", "latest news",
+                  "read me the headlines", "any news today", "what are the headlines"],
+    "volume up": ["louder", "make it louder", "turn it up", "increase the volume", "raise the volume",
+                  "crank it up", "a bit louder please"],
+    "volume down": ["quieter", "make it quieter", "turn it down", "lower the volume", "decrease the volume",
+                    "a bit quieter please", "too loud"],
+    "mute": ["mute the music", "mute spotify", "silence the music"],
+    "unmute": ["unmute the music", "unmute spotify"],
+    "system volume up": ["raise the system volume", "increase the computer volume", "louder system sound"],
+    "system volume down": ["lower the system volume", "decrease the computer volume", "quieter system sound"],
+    "system mute": ["mute the computer", "mute my pc", "mute all sound"],
+    "system unmute": ["unmute the computer", "unmute my pc"],
+}
+
+# Utterances that look a little like commands but are questions for the LLM
+NOT_COMMANDS = [
+    "what is the theme of hamlet", "what's the time complexity of quicksort", "tell me about the weather on mars",
+    "what time did the titanic sink", "who is the best music producer", "what is the news industry",
+    "how do you stop a nosebleed", "what's the next big thing in tech", "explain the timeline of world war two",
+    "how does weather forecasting work", "why do songs get stuck in my head", "what's your favourite song",
+    "who wrote the song yesterday", "how loud is a jet engine", "what does pause mean in music theory",
+    "tell me a joke", "how are you today", "what is the meaning of life", "give me a recipe for pasta",
+    "who was the previous president", "what is volume in physics", "how long is a football match",
+    "recommend a good book", "what is the capital of france", "why is the sky blue",
+]
+
+# Held-out utterances for the evaluation report: (text, expected canonical or None for the LLM)
+EVAL_SET = [
+    ("pause the music please", "pause"), ("please pause", "pause"), ("pause this song", "pause"),
+    ("skip this song", "next"), ("skip the track", "next"), ("next track please", "next"),
+    ("go back one song", "previous"), ("previous track please", "previous"),
+    ("resume the song", "resume"), ("continue the music", "resume"), ("stop the music now", "stop"),
+    ("what's the weather like", "what weather"), ("how is the weather today", "what weather"),
+    ("is it raining outside", "what weather"), ("what's the temperature", "what weather"),
+    ("what time is it now", "what time"), ("tell me the current time", "what time"),
+    ("what's the news", "headlines"), ("any headlines today", "headlines"),
+    ("make the music louder", "volume up"), ("turn the volume up a bit", "volume up"),
+    ("make it a little quieter", "volume down"), ("lower the music", "volume down"),
+    ("mute the song", "mute"), ("mute my computer", "system mute"),
+    ("pause that song", "pause"), ("stop this song", "stop"),
+    ("what is the theme of macbeth", None), ("what time does the sun set in winter", None),
+    ("how does rain form", None), ("who sang the song thriller", None), ("what's new in python", None),
+    ("how do i stop procrastinating", None), ("tell me about the history of music", None),
+    ("what is a weather balloon", None), ("why is the ocean salty", None), ("explain quantum computing", None),
+    ("what is the loudest animal", None), ("who invented the radio", None), ("what's the best pizza topping", None),
+    ("how many players are on a football team", None), ("skip to the good part of the story", None),
+]
+
+# Character n-grams (over the space-padded text) are robust to ASR spelling
+# variants and contractions ("what's" vs "what is"); whole words are added as
+# extra features so the verb ("pause" vs "skip") outweighs shared filler.
+NGRAM_SIZES = (3, 4, 5)
+WORD_FEATURE_WEIGHT = 3
+
+def _ngrams(text: str) -> Counter:
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    text = " " + " ".join(words) + " "
+    grams = Counter()
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    for word in words:
+        grams[f"<{word}>"] += WORD_FEATURE_WEIGHT
+    return grams
+
+
+class IntentClassifier:
+    """
+    Nearest-neighbour intent classifier over character n-gram TF-IDF vectors.
+
+    Each training utterance is a sparse unit vector; a query is scored against
+    the examples sharing at least one n-gram (via an inverted index), and the
+    label of the most similar example wins. A None label is a known LLM
+    question, so near misses of real questions aren't stolen from the LLM.
+    classify() also reports the margin over the best example of any other
+    label, so callers can refuse close calls ("pause this song" is nearly
+    as close to "skip this song" as to the pause examples).
+    Pure Python, well under a millisecond per query for this training set.
+    """
+    def __init__(self, examples: list, threshold: float = 0.6):
+        self.threshold = threshold
+        documents = [(_ngrams(text), label) for text, label in examples]
+        doc_freq = Counter(gram for grams, _ in documents for gram in grams)
+        self.idf = {gram: math.log((1 + len(documents)) / (1 + df)) + 1 for gram, df in doc_freq.items()}
+
+        self.labels = []
+        self.texts = []
+        self.index = {}  # n-gram -> [(example id, weight)]
+        for text, (grams, label) in zip((t for t, _ in examples), documents):
+            vector = self._weigh(grams)
+            example_id = len(self.labels)
+            self.labels.append(label)
+            self.texts.append(text)
+            for gram, weight in vector.items():
+                self.index.setdefault(gram, []).append((example_id, weight))
+
+    @classmethod
+    def from_registry(cls, commands: dict, single_word_triggers: dict, threshold: float = 0.6):
+        """Trains on the registry triggers plus CANONICAL_EXAMPLES and NOT_COMMANDS."""
+        examples = [(trigger, trigger) for trigger in single_word_triggers]
+        for keyword_tuples in commands.values():
+            examples.extend((" ".join(t), " ".join(t)) for t in keyword_tuples)
+        for canonical, phrases in CANONICAL_EXAMPLES.items():
+            examples.append((canonical, canonical))
+            examples.extend((phrase, canonical) for phrase in phrases)
+        examples.extend((text, None) for text in NOT_COMMANDS)
+        return cls(examples, threshold)
+
+    def _weigh(self, grams: Counter) -> dict:
+        vector = {gram: (1 + math.log(count)) * self.idf[gram]
+                  for gram, count in grams.items() if gram in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {gram: w / norm for gram, w in vector.items()} if norm else {}
+
+    def _scores(self, text: str) -> dict:
+        scores = {}
+        for gram, weight in self._weigh(_ngrams(text)).items():
+            for example_id, example_weight in self.index.get(gram, ()):
+                scores[example_id] = scores.get(example_id, 0.0) + weight * example_weight
+        return scores
+
+    def nearest(self, text: str) -> tuple:
+        """Returns (label, similarity, matched example, margin over the next-best label)."""
+        scores = self._scores(text)
+        if not scores:
+            return None, 0.0, None, 0.0
+        best = max(scores, key=scores.get)
+        label = self.labels[best]
+        runner_up = max((score for example_id, score in scores.items() if self.labels[example_id] != label),
+                        default=0.0)
+        return label, scores[best], self.texts[best], scores[best] - runner_up
+
+    def classify(self, text: str) -> tuple:
+        """Returns (canonical command, similarity, margin); the command is None to use the LLM."""
+        label, score, _, margin = self.nearest(text)
+        if label is None or score < self.threshold:
+            return None, score, margin
+        return label, score, margin
+
+
+if __name__ == '__main__':
+    # Evaluation report: precision of fuzzy matches vs. how often commands fall back to the LLM
+    import os
+    import sys
+    import time
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from modules.fastpath import COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS
+    from core.router import IntentRouter
+    import config
+
+    router = IntentRouter(COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS)
+    classifier = IntentClassifier.from_registry(COMMANDS, SINGLE_WORD_TRIGGERS)
+    commands = [(text, expected) for text, expected in EVAL_SET if expected]
+    questions = [text for text, expected in EVAL_SET if not expected]
+
+    def dispatch(text: str, margin: float):
+        """What core_logic would dispatch: side-effecting commands also need the margin."""
+        label, _, label_margin = classifier.classify(text)
+        if label is None:
+            return None
+        if router.match(label).handler.side_effects and label_margin < margin:
+            return None
+        return label
+
+    def evaluate(margin: float) -> tuple:
+        accepted = correct = fallback = wrong_actions = 0
+        for text, expected in commands:
+            if router.match(text):
+                continue
+            label = dispatch(text, margin)
+            if label is None:
+                fallback += 1
+            else:
+                accepted += 1
+                correct += label == expected
+                wrong_actions += label != expected and router.match(label).handler.side_effects
+        stolen = sum(1 for text in questions if not router.match(text) and dispatch(text, margin))
+        precision = correct / accepted * 100 if accepted else 100.0
+        return (f"{precision:>9.0f}% {fallback:>7}/{len(commands):<5} {stolen:>11}/{len(questions):<5} "
+                f"{wrong_actions:>8}")
+
+    exact_hits = sum(1 for text, _ in commands if router.match(text))
+    print(f"--- Evaluation on {len(commands)} held-out commands, {len(questions)} LLM questions ---")
+    print(f"Exact router alone: {len(commands) - exact_hits}/{len(commands)} commands fall back to the LLM\n")
+
+    header = f"{'precision':>10} {'LLM fallback':>13} {'questions stolen':>17} {'wrong actions':>13}"
+    print(f"{'threshold':>9} {header}")
+    for threshold in (0.4, 0.5, 0.6, 0.7, 0.8):
+        classifier.threshold = threshold
+        print(f"{threshold:>9.1f} {evaluate(config.INTENT_CLASSIFIER_MARGIN)}")
+
+    classifier.threshold = config.INTENT_CLASSIFIER_THRESHOLD
+    print(f"\n{'margin':>9} {header}  (threshold {classifier.threshold})")
+    for margin in (0.0, 0.05, 0.1, 0.15, 0.2):
+        print(f"{margin:>9.2f} {evaluate(margin)}")
+
+    print("\n--- Misses at the default threshold and margin ---")
+    for text, expected in EVAL_SET:
+        if router.match(text):
+            continue
+        predicted = dispatch(text, config.INTENT_CLASSIFIER_MARGIN)
+        if predicted != expected:
+            label, score, neighbour, margin = classifier.nearest(text)
+            print(f"{text!r}: expected {expected}, got {predicted} "
+                  f"({label} {score:.2f} ~ {neighbour!r}, margin {margin:.2f})")
+
+    start = time.perf_counter()
+    for _ in range(200):
+        for text, _ in EVAL_SET:
+            classifier.classify(text)
+    per_query = (time.perf_counter() - start) / (200 * len(EVAL_SET)) * 1000
+    print(f"\nClassification latency: {per_query:.3f} ms per utterance")
@@ -0,0 +1,399 @@
+# core/pipeline.py
+import asyncio
+import itertools
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Generic, NamedTuple, TypeVar
+
+T = TypeVar("T")
+In = TypeVar("In")
+Out = TypeVar("Out")
+
+# Cancelled request IDs remembered, so late items for them are still dropped
+_CANCELLED_HISTORY = 256
+
+
+class Envelope(NamedTuple):
+    request_id: int   # One spoken request; 0 for items that belong to none (e.g. the greeting)
+    payload: Any
+
+
+class Channel(Generic[T]):
+    """
+    Bounded FIFO of Envelopes between stages, served by the pipeline's event
+    loop. Coroutines use `await put()` / `await get()`; other threads use
+    put_threadsafe(). A full channel makes writers wait (backpressure),
+    except a `drop_oldest` channel, which discards its oldest item instead,
+    so a real-time producer like the microphone never blocks.
+    """
+    def __init__(self, name: str, maxsize: int, drop_oldest: bool = False):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize)
+        self._loop = None  # Set by the pipeline when it starts
+
+    async def put(self, envelope: Envelope):
+        if self.closed:
+            return
+        if self.drop_oldest and self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        await self._queue.put(envelope)
+
+    async def get(self) -> Envelope:
+        return await self._queue.get()
+
+    def put_threadsafe(self, envelope: Envelope) -> bool:
+        """Puts from any thread, waiting while the channel is full. False if the pipeline stopped."""
+        if self.closed or self._loop is None:
+            return False
+        future = asyncio.run_coroutine_threadsafe(self.put(envelope), self._loop)
+        while True:
+            try:
+                future.result(timeout=0.25)
+                return True
+            except FutureTimeout:
+                if self.closed:  # Stopped while we were waiting for room
+                    future.cancel()
+                    return False
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class StageContext:
+    """What a stage handler knows about the request it is working on."""
+    def __init__(self, pipeline: "Pipeline", stage: "Stage", request_id: int):
+        self.pipeline = pipeline
+        self.stage = stage
+        self.request_id = request_id
+
+    @property
+    def cancelled(self) -> bool:
+        return self.pipeline.is_cancelled(self.request_id)
+
+    def emit(self, payload: Any, channel: Channel | None = None) -> bool:
+        """Sends a result downstream (to the stage's output unless `channel` is given). Thread-safe."""
+        channel = channel or self.stage.output
+        if self.cancelled:
+            return False
+        return channel.put_threadsafe(Envelope(self.request_id, payload))
+
+    async def send(self, payload: Any, channel: Channel | None = None):
+        """emit() for coroutine handlers."""
+        if not self.cancelled:
+            await (channel or self.stage.output).put(Envelope(self.request_id, payload))
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Runs `callback` if this request is cancelled (right away if it already is)."""
+        self.pipeline._add_cancel_callback(self.request_id, callback)
+
+
+class Stage(Generic[In, Out]):
+    """
+    Takes items from `input` one at a time and calls `handler(payload, ctx)`.
+
+    `blocking` handlers are plain functions run on the stage's own worker
+    thread (so an engine like Whisper or Piper always sees the same thread);
+    the others are coroutines run on the event loop. Results go out through
+    ctx.emit() / ctx.send(). Items of cancelled requests are skipped.
+    """
+    def __init__(self, name: str, handler: Callable, input: Channel[In],
+                 output: Channel[Out] | None = None, blocking: bool = False):
+        self.name = name
+        self.handler = handler
+        self.input = input
+        self.output = output
+        self.blocking = blocking
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stage-{name}") if blocking else None
+        self.current = None  # Request ID being handled
+
+    async def run(self, pipeline: "Pipeline"):
+        loop = asyncio.get_running_loop()
+        while True:
+            envelope = await self.input.get()
+            if pipeline.is_cancelled(envelope.request_id):
+                continue
+            ctx = StageContext(pipeline, self, envelope.request_id)
+            self.current = envelope.request_id
+            try:
+                if self.blocking:
+                    await loop.run_in_executor(self.executor, self.handler, envelope.payload, ctx)
+                else:
+                    task = asyncio.ensure_future(self.handler(envelope.payload, ctx))
+                    pipeline._add_cancel_callback(envelope.request_id,
+                                                  lambda: loop.call_soon_threadsafe(task.cancel))
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        if pipeline.stopped or not task.cancelled():
+                            raise
+                        # Only this request was cancelled; carry on with the next item
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Pipeline] Stage '{self.name}' failed on request {envelope.request_id}: {e}")
+                traceback.print_exc()
+            finally:
+                self.current = None
+
+
+class Pipeline:
+    """
+    Stages connected by bounded channels, driven by one asyncio event loop
+    on a background thread.
+
+    Nothing polls: stages wake when an item arrives, cancel(request_id)
+    drops that request's queued items and tells its running handlers, and
+    stop() cancels every stage at once instead of waiting for timeouts.
+    """
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.channels = []
+        self.stages = []
+        self.stopped = False
+        self._ids = itertools.count(1)
+        self._cancelled = OrderedDict()   # request_id -> None, oldest first
+        self._callbacks = {}              # request_id -> [callback]
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._tasks = []
+        self._done = threading.Event()
+
+    def channel(self, name: str, maxsize: int, drop_oldest: bool = False) -> Channel:
+        channel = Channel(name, maxsize, drop_oldest)
+        self.channels.append(channel)
+        return channel
+
+    def stage(self, name: str, handler: Callable, input: Channel, output: Channel | None = None,
+              blocking: bool = False) -> Stage:
+        stage = Stage(name, handler, input, output, blocking)
+        self.stages.append(stage)
+        return stage
+
+    def new_request_id(self) -> int:
+        return next(self._ids)
+
+    # --- Lifecycle ---
+
+    def start(self) -> "Pipeline":
+        ready = threading.Event()
+
+        def run_loop():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            for channel in self.channels:
+                channel._loop = self._loop
+            self._tasks = [self._loop.create_task(stage.run(self), name=f"stage-{stage.name}")
+                           for stage in self.stages]
+            ready.set()
+            try:
+                self._loop.run_until_complete(asyncio.gather(*self._tasks, return_exceptions=True))
+            finally:
+                self._loop.close()
+                self._done.set()
+
+        self._thread = threading.Thread(target=run_loop, daemon=True, name=f"{self.name}-loop")
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self, timeout: float = 1.0):
+        """Stops every stage now. Blocking handlers mid-call finish on their own (daemon) threads."""
+        if self.stopped:
+            return
+        self.stopped = True
+        for channel in self.channels:
+            channel.closed = True
+        with self._lock:
+            callbacks = [cb for cbs in self._callbacks.values() for cb in cbs]
+            self._callbacks.clear()
+        for callback in callbacks:
+            self._run_callback(callback)
+        if self._loop is not None and not self._loop.is_closed():
+            for task in self._tasks:
+                self._loop.call_soon_threadsafe(task.cancel)
+        for stage in self.stages:
+            if stage.executor:
+                stage.executor.shutdown(wait=False, cancel_futures=True)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until the pipeline has stopped."""
+        return self._done.wait(timeout)
+
+    # --- Per-request cancellation ---
+
+    def cancel(self, request_id: int):
+        """Drops the request's queued items and runs its on_cancel callbacks."""
+        with self._lock:
+            self._cancelled[request_id] = None
+            while len(self._cancelled) > _CANCELLED_HISTORY:
+                self._cancelled.popitem(last=False)
+            callbacks = self._callbacks.pop(request_id, [])
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def is_cancelled(self, request_id: int) -> bool:
+        return self.stopped or request_id in self._cancelled
+
+    def _add_cancel_callback(self, request_id: int, callback: Callable[[], None]):
+        with self._lock:
+            if not self.is_cancelled(request_id):
+                self._callbacks.setdefault(request_id, []).append(callback)
+                return
+        self._run_callback(callback)
+
+    @staticmethod
+    def _run_callback(callback):
+        try:
+            callback()
+        except Exception as e:
+            print(f"[Pipeline] Cancel callback failed: {e}")
+
+
+if __name__ == '__main__':
+    # Benchmark against the thread-and-queue design this replaces: three
+    # stages (ASR -> logic -> TTS) with simulated blocking work, comparing
+    # end-to-end latency per request and the time to shut down.
+    import queue
+    import statistics
+    import time
+
+    ASR_WORK, LOGIC_WORK, TTS_WORK = 0.004, 0.002, 0.001   # Seconds of blocking work per item
+    SENTENCES = 3                                          # Logic emits this many items per request
+    REQUESTS, SPACING = 100, 0.02
+
+    def percentiles(samples):
+        samples = sorted(samples)
+        return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.95)] * 1000)
+
+    def bench_threads():
+        """The old design: one thread per stage, queue.get(timeout=1.0) polling a stop event."""
+        asr_q, logic_q, tts_q = queue.Queue(), queue.Queue(), queue.Queue()
+        stop, started, finished = threading.Event(), {}, {}
+
+        def asr():
+            while not stop.is_set():
+                try:
+                    rid = asr_q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                time.sleep(ASR_WORK)
+                logic_q.put(rid)
+
+        def logic():
+            while not stop.is_set():
+                try:
+                    rid = logic_q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                for n in range(SENTENCES):
+                    time.sleep(LOGIC_WORK)
+                    tts_q.put((rid, n))
+
+        def tts():
+            while not stop.is_set():
+                try:
+                    rid, n = tts_q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                time.sleep(TTS_WORK)
+                if n == SENTENCES - 1:
+                    finished[rid] = time.perf_counter()
+
+        threads = [threading.Thread(target=fn, daemon=True) for fn in (asr, logic, tts)]
+        for thread in threads:
+            thread.start()
+        for rid in range(REQUESTS):
+            started[rid] = time.perf_counter()
+            asr_q.put(rid)
+            time.sleep(SPACING)
+        while len(finished) < REQUESTS:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return [finished[r] - started[r] for r in started], time.perf_counter() - start
+
+    def bench_pipeline():
+        pipeline = Pipeline("bench")
+        asr_in, logic_in, tts_in = (pipeline.channel(n, maxsize=64) for n in ("asr", "logic", "tts"))
+        started, finished = {}, {}
+
+        def asr(payload, ctx):
+            time.sleep(ASR_WORK)
+            ctx.emit(payload)
+
+        def logic(payload, ctx):
+            for n in range(SENTENCES):
+                time.sleep(LOGIC_WORK)
+                ctx.emit(n)
+
+        def tts(n, ctx):
+            time.sleep(TTS_WORK)
+            if n == SENTENCES - 1:
+                finished[ctx.request_id] = time.perf_counter()
+
+        pipeline.stage("asr", asr, asr_in, logic_in, blocking=True)
+        pipeline.stage("logic", logic, logic_in, tts_in, blocking=True)
+        pipeline.stage("tts", tts, tts_in, blocking=True)
+        pipeline.start()
+        for _ in range(REQUESTS):
+            rid = pipeline.new_request_id()
+            started[rid] = time.perf_counter()
+            asr_in.put_threadsafe(Envelope(rid, None))
+            time.sleep(SPACING)
+        while len(finished) < REQUESTS:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        pipeline.stop()
+        return [finished[r] - started[r] for r in started], time.perf_counter() - start
+
+    def check_cancellation():
+        """A cancelled request's queued sentences are dropped; other requests are untouched."""
+        pipeline = Pipeline("cancel")
+        logic_in, tts_in = pipeline.channel("logic", 8), pipeline.channel("tts", 8)
+        spoken = []
+
+        def logic(payload, ctx):
+            for n in range(5):
+                if ctx.cancelled:
+                    return
+                ctx.emit(f"{payload}-{n}")
+                time.sleep(0.01)
+
+        def tts(sentence, ctx):
+            time.sleep(0.02)
+            spoken.append(sentence)
+
+        pipeline.stage("logic", logic, logic_in, tts_in, blocking=True)
+        pipeline.stage("tts", tts, tts_in, blocking=True)
+        pipeline.start()
+        logic_in.put_threadsafe(Envelope(1, "a"))
+        logic_in.put_threadsafe(Envelope(2, "b"))
+        time.sleep(0.03)
+        pipeline.cancel(1)
+        time.sleep(0.4)
+        pipeline.stop()
+        return spoken
+
+    print("--- Pipeline vs. threads + polling queues ---")
+    thread_latency, thread_shutdown = bench_threads()
+    pipe_latency, pipe_shutdown = bench_pipeline()
+    floor = (ASR_WORK + SENTENCES * LOGIC_WORK + TTS_WORK) * 1000
+    print(f"work per request: {floor:.1f} ms")
+    print("threads : latency p50 %.1f ms p95 %.1f ms | shutdown %.0f ms" % (*percentiles(thread_latency), thread_shutdown * 1000))
+    print("pipeline: latency p50 %.1f ms p95 %.1f ms | shutdown %.0f ms" % (*percentiles(pipe_latency), pipe_shutdown * 1000))
+    print("cancelled request 1 mid-answer, spoken:", check_cancellation())
@@ -0,0 +1,227 @@
+# core/router.py
+import re
+from typing import Callable, NamedTuple
+
+# Apostrophes split tokens ("what's" -> "what", "s") for prompts and triggers alike
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+def parse_args(pattern: re.Pattern, text: str) -> str:
+    """The first group (or the whole match) of a handler's args pattern in `text`, or ""."""
+    found = pattern.search(text)
+    if found is None:
+        return ""
+    return found.group(1) if pattern.groups else found.group()
+
+
+class RouteMatch(NamedTuple):
+    handler: Callable
+    kind: str      # 'single', 'prefix', 'keywords' or 'fuzzy'
+    trigger: str   # The trigger that matched, as written in the registry (canonical command if fuzzy)
+    args: str | None  # Parsed by the handler's args pattern (after a prefix trigger); None if it has none
+
+
+class IntentRouter:
+    """
+    Compiled matcher for the fastpath command registries. One lookup per
+    utterance returns the handler and its parsed arguments, or None.
+
+    The trigger tables are compiled once into token-level structures:
+    single-word triggers into a dict keyed by the whole token sequence,
+    prefix commands into a token trie walked from the start of the prompt
+    (longest prefix wins), and keyword tuples into an Aho-Corasick automaton
+    that finds every keyword phrase in one left-to-right pass. Matching is on
+    whole tokens, so "the time" no longer matches "theme".
+    """
+
+    def __init__(self, commands: dict, single_word_triggers: dict, prefix_commands: dict,
+                 arg_patterns: dict | None = None):
+        # Optional handler -> regex for the text after a prefix
+        self.arg_patterns = {handler: re.compile(pattern) for handler, pattern in (arg_patterns or {}).items()}
+        self.single = {tuple(tokenize(trigger)): (handler, trigger)
+                       for trigger, handler in single_word_triggers.items()}
+
+        # Prefix trie: token -> child node; the None key marks the end of a prefix
+        self.prefix_trie = {}
+        for prefix, handler in prefix_commands.items():
+            node = self.prefix_trie
+            for token in tokenize(prefix):
+                node = node.setdefault(token, {})
+            node[None] = (handler, prefix)
+
+        # Keyword rules in registry order; the first complete rule wins
+        self.phrases = []         # phrase id -> token tuple
+        phrase_ids = {}
+        self.rules = []           # (handler, trigger label, number of distinct phrases)
+        self.phrase_rules = []    # phrase id -> rule indices using it
+        for handler, keyword_tuples in commands.items():
+            for keyword_tuple in keyword_tuples:
+                ids = set()
+                for keyword in keyword_tuple:
+                    phrase = tuple(tokenize(keyword))
+                    if phrase not in phrase_ids:
+                        phrase_ids[phrase] = len(self.phrases)
+                        self.phrases.append(phrase)
+                        self.phrase_rules.append([])
+                    ids.add(phrase_ids[phrase])
+                for phrase_id in ids:
+                    self.phrase_rules[phrase_id].append(len(self.rules))
+                self.rules.append((handler, " + ".join(keyword_tuple), len(ids)))
+        self._build_automaton()
+
+    def _build_automaton(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for phrase_id, phrase in enumerate(self.phrases):
+            state = 0
+            for token in phrase:
+                if token not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][token] = len(self.goto) - 1
+                state = self.goto[state][token]
+            self.out[state].append(phrase_id)
+
+        # Breadth-first failure links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                if state == 0:
+                    continue  # Depth-1 states fail back to the root
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def _scan_keywords(self, tokens: list) -> set:
+        found = set()
+        state = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def _parse_args(self, handler, text: str) -> str | None:
+        pattern = self.arg_patterns.get(handler)
+        return None if pattern is None else parse_args(pattern, text)
+
+    def match(self, text: str) -> RouteMatch | None:
+        clean = text.lower()
+        spans = [(m.group(), m.end()) for m in _TOKEN.finditer(clean)]
+        if not spans:
+            return None
+        tokens = [token for token, _ in spans]
+
+        # 1. Single-word exact matches
+        hit = self.single.get(tuple(tokens))
+        if hit:
+            return RouteMatch(hit[0], 'single', hit[1], self._parse_args(hit[0], clean))
+
+        # 2. Longest prefix command
+        node, best = self.prefix_trie, None
+        for index, token in enumerate(tokens):
+            node = node.get(token)
+            if node is None:
+                break
+            if None in node:
+                best = (node[None], spans[index][1])
+        if best:
+            (handler, prefix), end = best
+            return RouteMatch(handler, 'prefix', prefix, self._parse_args(handler, clean[end:].strip(" .?!,")))
+
+        # 3. Keyword rules, all phrases present as whole tokens
+        found = self._scan_keywords(tokens)
+        if not found:
+            return None
+        counts = {}
+        for phrase_id in found:
+            for rule in self.phrase_rules[phrase_id]:
+                counts[rule] = counts.get(rule, 0) + 1
+        complete = [rule for rule, count in counts.items() if count == self.rules[rule][2]]
+        if not complete:
+            return None
+        handler, trigger, _ = self.rules[min(complete)]
+        return RouteMatch(handler, 'keywords', trigger, self._parse_args(handler, clean))
+
+
+if __name__ == '__main__':
+    # Benchmark against the old substring matcher over a large prompt corpus
+    import os
+    import sys
+    import time
+    import random
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from modules.fastpath import COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS, ARG_PATTERNS
+
+    def legacy_match(user_prompt: str):
+        """The previous core_logic matcher, kept here for comparison."""
+        clean_prompt = user_prompt.strip(" .?!,").lower()
+        if clean_prompt in SINGLE_WORD_TRIGGERS:
+            return SINGLE_WORD_TRIGGERS[clean_prompt]
+        for prefix in sorted(PREFIX_COMMANDS.keys(), key=len, reverse=True):
+            if clean_prompt == prefix or clean_prompt.startswith(prefix + " "):
+                return PREFIX_COMMANDS[prefix]
+        for function, keyword_tuples in COMMANDS.items():
+            for keyword_tuple in keyword_tuples:
+                if all(keyword in clean_prompt for keyword in keyword_tuple):
+                    return function
+        return None
+
+    commands = [
+        "what's the time", "what time is it?", "play music", "pause", "next song", "open spotify",
+        "search for pizza near me", "look up the eiffel tower", "set volume to 40", "volume up",
+        "system volume down", "what's the weather like", "today's forecast", "headlines",
+        "what's in the news today", "top story please", "turn down the music", "launch terminal",
+    ]
+    questions = [
+        "what is the theme of hamlet", "explain the timeline of world war two", "who wrote the odyssey",
+        "tell me a joke about cats", "how does photosynthesis work", "what is the meaning of life",
+        "why is the sky blue", "give me a recipe for pasta", "what's your favourite football team",
+        "can you recommend a good book", "what is the weathering of rocks", "how do airplanes fly",
+        "who is the current prime minister", "what's the latest on the stock market", "describe a sunset",
+    ]
+    fillers = ["", "hey lar ", "okay ", "um ", "so "]
+    tails = ["", " please", " for me", " right now", " thanks"]
+    rng = random.Random(0)
+    corpus = [rng.choice(fillers) + rng.choice(commands + questions) + rng.choice(tails)
+              for _ in range(20000)]
+
+    router = IntentRouter(COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS, ARG_PATTERNS)
+
+    def bench(label, fn, calls_per_prompt):
+        start = time.perf_counter()
+        for prompt in corpus:
+            for _ in range(calls_per_prompt):
+                fn(prompt)
+        per_prompt = (time.perf_counter() - start) / len(corpus) * 1e6
+        print(f"{label:<34} {per_prompt:7.1f} us/utterance")
+
+    print(f"--- Intent routing over {len(corpus)} prompts ---")
+    bench("legacy (type check + process)", legacy_match, 2)
+    bench("compiled router (one lookup)", router.match, 1)
+
+    print("\n--- Prompts routed differently ---")
+    seen = set()
+    for prompt in commands + questions:
+        old, new = legacy_match(prompt), router.match(prompt)
+        if old is not (new.handler if new else None) and prompt not in seen:
+            seen.add(prompt)
+            old_name = old.__name__ if old else "llm"
+            new_name = f"{new.handler.__name__} ({new.kind}: {new.trigger})" if new else "llm"
+            print(f"{prompt!r}: {old_name} -> {new_name}")
+
+    print("\n--- Parsed arguments ---")
+    for prompt in ("search for pizza near me.", "set volume to 40", "set system volume to 25 please",
+                   "open visual studio"):
+        print(f"{prompt!r}: {router.match(prompt)}")
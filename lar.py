@@ -3,9 +3,8 @@ import sys
 import os
 import signal
 import random
-import queue
+import importlib
 import threading
-import time
 import numpy as np
 
 # --- Project Path Setup ---
@@ -13,184 +12,314 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 if script_dir not in sys.path:
     sys.path.append(script_dir)
 
+# Imported first: its clock starts the startup report
+from modules.startup import profiler, StartupError
+
 # --- Module Imports ---
 try:
-    import config
-    # MODIFIED: Import the listener from main.py
-    from main import run_wake_word_listener_thread, stop_event, signal_handler
-    from modules.asr import transcribe_audio
-    from modules.llm_handler import query_llm_stream
-    from modules.core_logic import get_prompt_handler_type, process_prompt
-    from modules.post_llm_tools import run_post_llm_actions
-    from modules.tts import TTS_Server
-    from modules.utils import THINKING_PHRASES, humanize_text
+    with profiler.phase("imports"):
+        import config
+        # MODIFIED: Import the listener from main.py
+        from main import run_wake_word_listener_thread, create_porcupine, stop_event, signal_handler
+        from modules.asr import transcribe_audio, init_asr
+        from modules.llm_handler import query_llm_stream, create_chat_history, cache_answer
+        from modules.llm_keepalive import warm_up_all, ModelKeepAlive
+        from modules.speculation import SpeculativeRequest
+        from modules.core_logic import get_prompt_handler_type, resolve_prompt
+        from modules.fastpath.executor import FastpathExecutor
+        from modules.post_llm_tools import PostLLMActionScheduler, ToolCallDispatcher, TOOLS, is_tool_intent
+        from modules.tts import TTS_Server
+        from core.pipeline import Pipeline, Envelope
+        from modules.tracing import get_tracer
+        from modules.utils import THINKING_PHRASES, humanize_text
+        from modules.audio_output import load_earcons, shutdown_mixer
+        from modules.metrics import MetricsReporter, print_report
 except ImportError as e:
     print(f"Error importing modules: {e}")
     sys.exit(1)
 
-# --- Global Queues ---
-asr_queue = queue.Queue()
-logic_queue = queue.Queue()
-tts_queue = queue.Queue()
+# --- Pipeline ---
+# Listener -> ASR -> logic -> TTS. Each item carries the ID of the spoken request it belongs to,
+# allocated by the tracer when the listener hears the wake word or a follow-up.
+pipeline = Pipeline("lar")
+tracer = get_tracer()
+# The microphone thread must never block, so the oldest audio is dropped if ASR falls far behind
+asr_channel = pipeline.channel("asr", maxsize=config.PIPELINE_ASR_CHANNEL_SIZE, drop_oldest=True)
+logic_channel = pipeline.channel("logic", maxsize=config.PIPELINE_LOGIC_CHANNEL_SIZE)
+tts_channel = pipeline.channel("tts", maxsize=config.PIPELINE_TTS_CHANNEL_SIZE)
+
+class UtteranceSink:
+    """
+    What the wake-word listener puts ("partial"/"final", audio, request_id)
+    into. The partial and final of one utterance share the request ID.
+    """
+    def put(self, item):
+        kind, audio, request_id = item
+        asr_channel.put_threadsafe(Envelope(request_id, (kind, audio)))
 
 # --- MODIFIED: Global Chat History ---
-# This variable will be managed by the logic_worker
-chat_history = []
+# This token-budgeted history will be managed by the logic_worker
+chat_history = create_chat_history()
+
+# --- Fastpath Handler Pool ---
+# Handlers run off the logic worker; their replies go straight to the TTS stage
+fastpath_executor = FastpathExecutor(deliver=lambda text: tts_channel.put_threadsafe(Envelope(0, text)))
+# Keyword-matched post-LLM actions, used when the model can't call tools
+post_llm_scheduler = None if config.LLM_TOOL_CALLS_ENABLED else PostLLMActionScheduler()
 
 # --- Global TTS Speaking Event (for muting mic) ---
 tts_is_speaking_event = threading.Event()
 
-def asr_worker(stop_event):
-    """ASR worker thread: transcribes audio from asr_queue and puts text on logic_queue."""
-    while not stop_event.is_set():
-        try:
-            numpy_array = asr_queue.get(timeout=1.0)
-            if numpy_array is None: continue # Handle potential None from queue
-
-            text = transcribe_audio(numpy_array).lower()
-            if text and text.strip():
-                logic_queue.put(text)
-        except queue.Empty:
-            continue
-        except Exception as e:
-            print(f"[ASR Worker] Error: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-
-def logic_worker(stop_event):
-    """Logic worker thread: processes prompts from logic_queue and puts responses on tts_queue."""
-    global chat_history # <-- We will read and write to this global variable
-    
-    while not stop_event.is_set():
+def transcribe(item, ctx):
+    """
+    ASR stage: transcribes audio and passes the text on to the logic stage.
+    Items are (kind, audio) where kind is 'partial' (speculative) or 'final'.
+    """
+    kind, numpy_array = item
+
+    # A partial is stale once anything newer (usually its final) is waiting
+    if kind == 'partial' and not asr_channel.empty():
+        return
+
+    # A partial's transcription is abandoned as soon as its final arrives
+    should_abort = (lambda: not asr_channel.empty()) if kind == 'partial' else None
+    text = transcribe_audio(numpy_array, should_abort=should_abort).lower()
+    if kind == 'final':
+        tracer.mark(ctx.request_id, "asr_done")
+    if text and text.strip():
+        ctx.emit((kind, text))
+
+def instruct_prompt(user_prompt: str) -> str:
+    # We still ask the LLM to be concise, but we won't trust it.
+    return f"{user_prompt} Please answer in one or two sentences."
+
+def start_speculative_stream(partial_prompt: str, history, cancel_token, on_tool_call):
+    """
+    Starts an LLM request for a partial transcript (see SpeculativeRequest).
+    No cache key: the answer is only cached once the final transcript confirms it.
+    """
+    return query_llm_stream(
+        instruct_prompt(partial_prompt),
+        history=history,
+        max_sentences=config.LLM_MAX_SENTENCES,
+        cancel_token=cancel_token,
+        tools=TOOLS if config.LLM_TOOL_CALLS_ENABLED else None,
+        on_tool_call=on_tool_call
+    )
+
+def make_logic_handler():
+    """
+    Logic stage: routes each transcript and sends the spoken replies to the TTS stage.
+    A new final utterance supersedes the previous LLM answer (its unspoken sentences are dropped).
+    """
+    # chat_history is updated in place by query_llm_stream
+    speculation = None # In-flight SpeculativeRequest for the latest partial transcript
+    last_llm_request = None
+
+    def handle_prompt(item, ctx):
+        nonlocal speculation, last_llm_request
+        kind, user_prompt = item
+
+        if kind == 'partial':
+            # Start the LLM early on a stable partial transcript. Nothing is spoken yet.
+            if speculation:
+                speculation.cancel()
+                speculation = None
+            if get_prompt_handler_type(user_prompt) == 'llm':
+                print(f"[Logic Worker] Speculating on partial transcript: '{user_prompt}'")
+                speculation = SpeculativeRequest(user_prompt, start_speculative_stream, chat_history)
+            return
+
+        print(f"You: {user_prompt}")
+        if last_llm_request is not None:
+            pipeline.cancel(last_llm_request)
+            last_llm_request = None
+        
+        handler_type = get_prompt_handler_type(user_prompt)
+        tracer.mark(ctx.request_id, "routed", route=handler_type)
+
+        # Reconcile any speculative request with the final transcript
+        confirmed = None
+        if speculation:
+            if handler_type == 'llm' and speculation.matches(user_prompt):
+                confirmed = speculation
+            else:
+                speculation.cancel()
+            speculation = None
+        
+        if handler_type == 'fastpath':
+            # Never blocks: slow handlers say "working on it" and answer later
+            resolved = resolve_prompt(user_prompt)
+            if resolved:
+                handler, text, args = resolved
+                fastpath_executor.submit(handler, text, deliver=ctx.emit, args=args)
+        
+        elif handler_type == 'llm':
+            last_llm_request = ctx.request_id
+            ctx.emit(random.choice(THINKING_PHRASES))
+
+            # Keyword-matched actions start now, in parallel with the answer
+            action = post_llm_scheduler.schedule(user_prompt) if post_llm_scheduler else None
+
+            is_first_sentence = True
+            # Tool calls run as soon as they are parsed, while the text is spoken
+            tools = ToolCallDispatcher()
+            # Prompts asking for an action are never answered from (or stored in) the cache
+            cache_key = None if is_tool_intent(user_prompt) else user_prompt
+            if confirmed:
+                # The speculative request already has a head start
+                sentence_generator = confirmed.consume(on_tool_call=tools.dispatch)
+            else:
+                # The generator stops itself after LLM_MAX_SENTENCES, closes the
+                # Ollama stream and records the (truncated) answer in chat_history.
+                # Repeated, history-independent questions are served from the cache.
+                sentence_generator = query_llm_stream(
+                    instruct_prompt(user_prompt),
+                    history=chat_history,
+                    max_sentences=config.LLM_MAX_SENTENCES,
+                    cache_key=cache_key,
+                    tools=TOOLS if config.LLM_TOOL_CALLS_ENABLED else None,
+                    on_tool_call=tools.dispatch,
+                    on_first_token=lambda: tracer.mark(ctx.request_id, "llm_first_token")
+                )
+
+            try:
+                for sentence in sentence_generator:
+                    if ctx.cancelled:
+                        break  # Superseded or shutting down
+                    if is_first_sentence:
+                        # Cached and speculative answers had their first token earlier (or never)
+                        tracer.mark(ctx.request_id, "llm_first_token",
+                                    source="speculation" if confirmed else "first_sentence")
+                        final_sentence = humanize_text(sentence)
+                        is_first_sentence = False
+                    else:
+                        final_sentence = sentence
+                    
+                    ctx.emit(final_sentence)
+                    if action:
+                        action.release()  # Spoken acknowledgement first, then the side effect
+            finally:
+                # Cancels generation if we stop early for any reason
+                sentence_generator.close()
+                if action:
+                    action.release()
+            if confirmed:
+                confirmed.commit(chat_history, cache=lambda answer: cache_answer(cache_key, answer))
+            print(f"[Logic Worker] History updated. Length: {len(chat_history)}")
+
+            if is_first_sentence and tools.called:
+                # The model only called tools, so let their results answer
+                for result in tools.wait(config.LLM_TOOL_RESULT_TIMEOUT):
+                    ctx.emit(result)
+
+    return handle_prompt
+
+def make_speaker(tts_server):
+    """TTS stage: speaks each sentence, muting the microphone meanwhile."""
+    def speak(sentence, ctx):
+        if not sentence:
+            return
+        request_id = ctx.request_id
+        audio_started = threading.Event()
+
+        def on_audio():
+            tracer.mark(request_id, "first_audio")
+            audio_started.set()
+
+        tts_is_speaking_event.set()
         try:
-            user_prompt = logic_queue.get(timeout=1.0)
-            print(f"You: {user_prompt}")
-            
-            handler_type = get_prompt_handler_type(user_prompt)
-            
-            if handler_type == 'fastpath':
-                response_text = process_prompt(user_prompt)
-                if response_text:
-                    tts_queue.put(response_text)
-            
-            elif handler_type == 'llm':
-                tts_queue.put(random.choice(THINKING_PHRASES))
-                
-                # We still ask the LLM to be concise, but we won't trust it.
-                instructed_prompt = f"{user_prompt} Please answer in one or two sentences."
-
-                is_first_sentence = True
-                sentence_generator = query_llm_stream(instructed_prompt, history=chat_history)
-                
-                # --- NEW CONCISENESS ENFORCEMENT ---
-                sentence_count = 0
-                MAX_SENTENCES = 2 # We will *only* speak this many sentences
-                # --- END NEW ENFORCEMENT ---
-
-                try:
-                    while True:
-                        sentence = next(sentence_generator)
-
-                        # --- NEW: Check sentence count BEFORE speaking ---
-                        if sentence_count >= MAX_SENTENCES:
-                            # We've spoken enough.
-                            # We must now exhaust the generator to get the history,
-                            # but we will *not* speak any more.
-                            print(f"[Logic Worker] Forcing stream truncation after {MAX_SENTENCES} sentences.")
-                            try:
-                                while True: next(sentence_generator) # Keep pulling until it's empty
-                            except StopIteration as e:
-                                # This is the *real* end of the stream
-                                chat_history = e.value if e.value is not None else chat_history
-                                print(f"[Logic Worker] Stream truncated. History updated. Length: {len(chat_history)}")
-                            break # Exit the main 'while True' loop
-                        # --- END NEW CHECK ---
-
-                        if is_first_sentence:
-                            final_sentence = humanize_text(sentence)
-                            is_first_sentence = False
-                        else:
-                            final_sentence = sentence
-                        
-                        tts_queue.put(final_sentence)
-                        sentence_count += 1 # Increment AFTER queuing the sentence
-
-                except StopIteration as e:
-                    # This happens if the LLM response was *already* short (less than 2 sentences)
-                    chat_history = e.value if e.value is not None else chat_history
-                    print(f"[Logic Worker] History updated (short response). Length: {len(chat_history)}")
-                # --- END MODIFIED LLM CALL ---
-
-                # Run post-LLM actions
-                run_post_llm_actions(user_prompt)
-                
-        except queue.Empty:
-            continue
-        except Exception as e:
-            print(f"[Logic Worker] Error: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-
-def main_loop(tts_server):
+            tts_server.speak(sentence, on_audio=on_audio)
+        finally:
+            # speak() only hands the text to Piper; the mixer buffers the audio, so
+            # keep the mic muted until the sentence has actually been played
+            if audio_started.wait(config.TTS_PLAYBACK_TIMEOUT):
+                tts_server.mixer.wait_for_tts(timeout=config.TTS_PLAYBACK_TIMEOUT)
+            tts_is_speaking_event.clear()
+    return speak
+
+def start_service(module: str, getter: str):
     """
-    Main loop: starts worker threads and handles TTS output.
+    A background startup phase that imports a service module and starts the
+    service. Services (and feedparser, spotipy, ...) stay out of the "imports" phase.
     """
+    def start():
+        return getattr(importlib.import_module(module), getter)()
+    return start
+
+def main_loop(tts_server, porcupine=None):
+    """
+    Main loop: starts the listener thread and the pipeline, then waits for shutdown.
+    """
+    pipeline.stage("asr", transcribe, asr_channel, logic_channel, blocking=True)
+    pipeline.stage("logic", make_logic_handler(), logic_channel, tts_channel, blocking=True)
+    pipeline.stage("tts", make_speaker(tts_server), tts_channel, blocking=True)
+    pipeline.start()
+
     # Start the wake word listener thread
     threading.Thread(
         target=run_wake_word_listener_thread,
-        args=(asr_queue, stop_event, tts_is_speaking_event, config.MIC_DEVICE_INDEX),
-        daemon=True
-    ).start()
-    
-    # Start the ASR worker thread
-    threading.Thread(
-        target=asr_worker,
-        args=(stop_event,),
-        daemon=True
-    ).start()
-    
-    # Start the Logic worker thread
-    threading.Thread(
-        target=logic_worker,
-        args=(stop_event,),
+        args=(UtteranceSink(), stop_event, tts_is_speaking_event, config.MIC_DEVICE_INDEX, porcupine),
         daemon=True
     ).start()
     
     # Speak startup message
-    tts_server.speak("Lar is online and ready.")
+    profiler.mark_online()
+    tts_channel.put_threadsafe(Envelope(0, "Lar is online and ready."))
     
-    # Main TTS loop: get sentences from tts_queue and speak them
-    while not stop_event.is_set():
-        sentence_to_speak = None
-        try:
-            sentence_to_speak = tts_queue.get(timeout=1.0)
-
-            if sentence_to_speak:
-                tts_is_speaking_event.set()
-                tts_server.speak(sentence_to_speak)
-
-        except queue.Empty:
-            continue
-        except Exception as e:
-            print(f"TTS Worker Error: {e}")
-        finally:
-            if sentence_to_speak:
-                # This logic is correct:
-                # Wait for audio to finish playing (approx)
-                # A better way would be to estimate audio length, but this is fine.
-                time.sleep(0.1) 
-                tts_is_speaking_event.clear()
+    # Everything runs on the pipeline; Ctrl+C sets stop_event
+    stop_event.wait()
+    pipeline.stop()
 
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
-    
-    tts_server = TTS_Server()
+
+    # Independent components start concurrently. The LLM warm-up isn't needed
+    # for fastpath commands, so Lar goes online without waiting for it.
+    try:
+        components = profiler.run_parallel(
+            required={
+                "ASR warm-up": init_asr,
+                "Piper load": TTS_Server,
+                "Porcupine init": create_porcupine,
+                # Decode earcons up front so acknowledgements never touch the disk
+                "Earcons": load_earcons,
+            },
+            background={
+                "LLM warm-up": warm_up_all,
+                # First reading is fetched now, so weather queries are answered from memory
+                "Weather service": start_service("modules.services.weather", "get_weather_service"),
+                "News service": start_service("modules.services.news", "get_news_service"),
+                # Connects with the cached token (if any) and reads the playback state
+                "Spotify service": start_service("modules.services.spotify", "get_spotify_service"),
+                # Follows media players appearing/leaving on D-Bus for "open spotify"
+                "MPRIS watcher": start_service("modules.services.mpris", "get_mpris_watcher"),
+                # Loads the cached app index, rescanning only changed directories
+                "App index": start_service("modules.services.app_index", "get_app_index"),
+                # Opens the audio-server connection and reads the sink state once
+                "System audio": start_service("modules.services.system_audio", "get_system_audio"),
+            }
+        )
+    except StartupError as e:
+        print(f"FATAL: {e}")
+        if "Piper load" in e.results:
+            e.results["Piper load"].shutdown()
+        if "Porcupine init" in e.results:
+            e.results["Porcupine init"].delete()
+        shutdown_mixer()
+        sys.exit(1)
+
+    ModelKeepAlive(stop_event).start()
+    if config.METRICS_REPORT_INTERVAL > 0:
+        MetricsReporter(stop_event, config.METRICS_REPORT_INTERVAL).start()
+    tts_server = components["Piper load"]
     
     try:
         print("Starting Lar in command-line mode...")
-        main_loop(tts_server)
+        main_loop(tts_server, components["Porcupine init"])
     finally:
+        fastpath_executor.shutdown()
         tts_server.shutdown()
-        print("Lar has shut down.")
\ No newline at end of file
+        shutdown_mixer()
+        print_report()
+        print("Lar has shut down.")
@@ -21,9 +21,11 @@ try:
     import config
     # We only import the server class for the test block
     from modules.tts import TTS_Server
-    from modules.asr import transcribe_audio
+    from modules.asr import transcribe_audio, init_asr
     from modules.core_logic import process_prompt
     from modules.utils import play_sound, ACK_START_SOUND, humanize_text, sanitize_text_for_tts
+    from modules.audio_output import load_earcons, shutdown_mixer, earcon_playing
+    from modules.tracing import get_tracer
 
 except ImportError as e:
     print(f"Error importing modules: {e}")
@@ -38,16 +40,30 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
+def create_porcupine():
+    """Creates the Porcupine wake-word engine (can be done during startup, off the listener thread)."""
+    return pvporcupine.create(
+        access_key=config.PICOVOICE_ACCESS_KEY,
+        keyword_paths=[config.PORCUPINE_KEYWORD_PATH],
+        sensitivities=[config.PORCUPINE_SENSITIVITY]
+    )
+
 def run_wake_word_listener_thread(
     asr_queue: queue.Queue, 
     stop_event: threading.Event, 
     tts_is_speaking_event: threading.Event, 
-    mic_device_index: int
+    mic_device_index: int,
+    porcupine=None
 ):
     """
     Listens for the wake word and then records a command using VAD,
     all on a single, continuous PyAudio stream.
     Includes a "follow-up" mode to avoid repeating the wake word.
+    Puts ("final", audio, request_id) on asr_queue for each command, preceded
+    by a speculative ("partial", audio, request_id) when the speaker first pauses.
+    The request ID is allocated by the tracer when the wake word or a
+    follow-up is heard, and the end of speech is marked on it.
+    Pass a `porcupine` from create_porcupine() to skip creating it here.
     """
 
     # --- MODIFIED: Added new state ---
@@ -59,15 +75,12 @@ def run_wake_word_listener_thread(
     FOLLOW_UP_TIMEOUT_DURATION = 5.0 # 5 seconds
 
     pa = None
-    porcupine = None
     audio_stream = None
+    tracer = get_tracer()
 
     try:
-        porcupine = pvporcupine.create(
-            access_key=config.PICOVOICE_ACCESS_KEY,
-            keyword_paths=[config.PORCUPINE_KEYWORD_PATH],
-            sensitivities=[config.PORCUPINE_SENSITIVITY]
-        )
+        if porcupine is None:
+            porcupine = create_porcupine()
 
         pa = pyaudio.PyAudio()
         audio_stream = pa.open(
@@ -89,6 +102,11 @@ def run_wake_word_listener_thread(
         # --- NEW: Follow-up timer ---
         follow_up_timer_start = None
 
+        # Set once a speculative partial has been sent for the current pause
+        partial_sent = False
+        speech_start_frame = 0 # Index in command_audio_buffer where speech began
+        request_id = None # Traced request for the command being recorded
+
         is_speaking = False
         was_tts_speaking = False  # Track if TTS was speaking to detect when it resumes
 
@@ -111,6 +129,8 @@ def run_wake_word_listener_thread(
                 keyword_index = porcupine.process(pcm_struct)
                 if keyword_index >= 0:
                     print("Wake word detected! Listening for command...")
+                    request_id = tracer.begin("wake_word")
+                    play_sound(ACK_START_SOUND)
                     command_audio_buffer.clear()
                     silence_start_time = None
                     wake_word_time = time.time()  # Track when wake word was detected
@@ -118,6 +138,10 @@ def run_wake_word_listener_thread(
                     current_state = STATE_RECORDING_COMMAND
 
             elif current_state == STATE_RECORDING_COMMAND:
+                # Drop the frames that would only contain our own acknowledgement earcon
+                if earcon_playing():
+                    continue
+
                 # This logic is identical to your old file
                 frame_int16 = np.array(pcm_struct, dtype=np.int16)
                 frame_np = frame_int16.astype(np.float32) / 32768.0
@@ -133,21 +157,41 @@ def run_wake_word_listener_thread(
                 if volume_norm > config.SILENCE_THRESHOLD:
                     if not is_speaking:
                         is_speaking = True
+                        speech_start_frame = len(command_audio_buffer) - 1
                         print("Speech detected, recording...", end="", flush=True)
                     print(".", end="", flush=True)
                     silence_start_time = None
                     wake_word_time = None
+                    partial_sent = False # Speech resumed, any earlier partial is outdated
                 else:
                     # Silence detected
                     if is_speaking:
                         if silence_start_time is None:
                             silence_start_time = time.time()
 
-                        if (time.time() - silence_start_time) > config.SILENCE_DURATION:
+                        silence_elapsed = time.time() - silence_start_time
+
+                        # A short pause is usually the end of the command. Send what we have
+                        # so ASR and the LLM can start while we wait out the full silence.
+                        # Only for speech long enough to be a question for the LLM.
+                        speech_duration = ((len(command_audio_buffer) - speech_start_frame)
+                                           * porcupine.frame_length / porcupine.sample_rate - silence_elapsed)
+                        if (config.SPECULATIVE_LLM_ENABLED and not partial_sent
+                                and silence_elapsed > config.SPECULATION_SILENCE_DURATION
+                                and silence_elapsed <= config.SILENCE_DURATION
+                                and speech_duration >= config.SPECULATION_MIN_SPEECH_DURATION):
+                            partial_audio = np.concatenate(command_audio_buffer)
+                            asr_queue.put(("partial", (partial_audio * 32767).astype(np.int16), request_id))
+                            partial_sent = True
+
+                        if silence_elapsed > config.SILENCE_DURATION:
                             print("\nCommand recorded (silence detected).")
+                            tracer.mark(request_id, "speech_end", at=silence_start_time)
+                            tracer.mark(request_id, "endpointed")
                             full_command_audio = np.concatenate(command_audio_buffer)
                             full_command_audio = (full_command_audio * 32767).astype(np.int16)
-                            asr_queue.put(full_command_audio)
+                            asr_queue.put(("final", full_command_audio, request_id))
+                            partial_sent = False
 
                             # --- MODIFIED: Go to FOLLOW_UP state ---
                             print(f"Listening for follow-up ({FOLLOW_UP_TIMEOUT_DURATION}s)...")
@@ -185,13 +229,16 @@ def run_wake_word_listener_thread(
                 if volume_norm > config.SILENCE_THRESHOLD:
                     # Speech detected! Go back to recording state
                     print("Follow-up detected! Listening for command...")
+                    request_id = tracer.begin("follow_up")
                     
                     frame_np = frame_int16.astype(np.float32) / 32768.0
                     command_audio_buffer.clear()
                     command_audio_buffer.append(frame_np)
+                    speech_start_frame = 0
 
                     silence_start_time = None
                     wake_word_time = None
+                    partial_sent = False
                     is_speaking = True # We are already speaking
                     follow_up_timer_start = None # Clear follow-up timer
                     current_state = STATE_RECORDING_COMMAND
@@ -213,6 +260,8 @@ def run_wake_word_listener_thread(
 
 # --- Test Block (Unchanged from your file) ---
 if __name__ == "__main__":
+    init_asr()
+    load_earcons()
     tts = TTS_Server()
     test_asr_queue = queue.Queue()
     test_tts_is_speaking_event = threading.Event()
@@ -229,7 +278,9 @@ if __name__ == "__main__":
         
         while not stop_event.is_set():
             try:
-                recording = test_asr_queue.get(timeout=1.0)
+                kind, recording, _request_id = test_asr_queue.get(timeout=1.0)
+                if kind != "final":
+                    continue # Speculative partials are only used by lar.py
                 user_prompt = transcribe_audio(recording).lower()
                 if user_prompt:
                     print(f"You: {user_prompt}")
@@ -241,4 +292,5 @@ if __name__ == "__main__":
             except queue.Empty:
                 continue
     finally:
-        tts.shutdown()
\ No newline at end of file
+        tts.shutdown()
+        shutdown_mixer()
\ No newline at end of file
@@ -5,7 +5,6 @@ import time
 import tempfile
 import numpy as np
 import subprocess
-from scipy.io.wavfile import write
 
 # --- Robust Path Setup ---
 try:
@@ -19,31 +18,41 @@ except ImportError:
     sys.exit(1)
 
 # --- whisper.cpp Configuration ---
-print("Initializing ASR (whisper.cpp, distil-large-v3.5)...")
-
 WHISPER_CPP_DIR = os.path.join(config.PROJECT_ROOT, "whisper.cpp")
 WHISPER_CPP_MAIN = os.path.join(WHISPER_CPP_DIR, "build", "bin", "whisper-cli")
 WHISPER_MODEL_PATH = os.path.join(WHISPER_CPP_DIR, "models", "ggml-distil-large-v3.5.bin")
 
-# Check if the model and executable exist
-if not os.path.exists(WHISPER_CPP_MAIN):
-    print(f"FATAL: whisper.cpp executable not found at {WHISPER_CPP_MAIN}")
-    sys.exit(1)
-if not os.path.exists(WHISPER_MODEL_PATH):
-    print(f"FATAL: Whisper model not found at {WHISPER_MODEL_PATH}")
-    sys.exit(1)
+# How often a running transcription checks whether it should be abandoned
+ABORT_POLL_INTERVAL = 0.02
 
-print("✅ ASR (whisper.cpp) initialized successfully.")
+def init_asr(warm_up: bool = True):
+    """
+    Checks that whisper.cpp and its model exist and, optionally, runs one
+    transcription of silence so the model file is in the page cache before
+    the first real command. Raises RuntimeError if ASR can't work.
+    Called during startup (concurrently with the other components) rather
+    than at import time.
+    """
+    print("Initializing ASR (whisper.cpp, distil-large-v3.5)...")
+    if not os.path.exists(WHISPER_CPP_MAIN):
+        raise RuntimeError(f"whisper.cpp executable not found at {WHISPER_CPP_MAIN}")
+    if not os.path.exists(WHISPER_MODEL_PATH):
+        raise RuntimeError(f"Whisper model not found at {WHISPER_MODEL_PATH}")
+    if warm_up:
+        transcribe_audio(np.zeros(config.SAMPLE_RATE // 2, dtype=np.int16))
+    print("✅ ASR (whisper.cpp) initialized successfully.")
 
 
-def transcribe_audio(audio_input: str | np.ndarray) -> str:
+def transcribe_audio(audio_input: str | np.ndarray, should_abort=None) -> str:
     """
     Transcribes audio using the local whisper.cpp executable.
     Accepts either a file path (str) or a numpy array (np.ndarray).
+    If `should_abort()` turns true while whisper.cpp runs, it is killed and "" returned.
     """
     
     # Handle numpy array input
     if isinstance(audio_input, np.ndarray):
+        from scipy.io.wavfile import write  # Deferred: only needed once audio arrives
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
         try:
             write(temp_file.name, config.SAMPLE_RATE, audio_input)
@@ -78,14 +87,30 @@ def transcribe_audio(audio_input: str | np.ndarray) -> str:
     
     try:
         # Run the C++ binary with the fixed environment
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            check=True,
             encoding='utf-8',
             env=custom_env  # <-- FIX 3: Passing the environment
         )
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=ABORT_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if should_abort and should_abort():
+                    process.kill()
+                    process.wait()
+                    process.stdout.close()
+                    process.stderr.close()
+                    print(f"[ASR] Transcription abandoned after {time.time() - start_time:.2f}s.")
+                    if os.path.exists(f"{audio_file_path}.txt"):
+                        os.unlink(f"{audio_file_path}.txt")
+                    return ""
+        result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        result.check_returncode()
         
         transcript_file_path = f"{audio_file_path}.txt"
         
@@ -131,6 +156,11 @@ def transcribe_audio(audio_input: str | np.ndarray) -> str:
 if __name__ == '__main__':
     # Test block
     print("--- Testing ASR (whisper.cpp) Module ---")
+    try:
+        init_asr(warm_up=False)
+    except RuntimeError as e:
+        print(f"FATAL: {e}")
+        sys.exit(1)
     test_file_path = os.path.join(WHISPER_CPP_DIR, "samples", "jfk.wav")
     
     if os.path.exists(test_file_path):
@@ -0,0 +1,217 @@
+# modules/audio_output.py
+import sys
+import os
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: config.py not found.")
+    sys.exit(1)
+
+
+def _resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Linear resampling. Good enough for short earcons, and only ever done once at load time."""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    duration = len(samples) / src_rate
+    dst_length = max(1, int(round(duration * dst_rate)))
+    src_positions = np.linspace(0, len(samples) - 1, num=dst_length)
+    return np.interp(src_positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class AudioMixer:
+    """
+    A single, always-open output stream shared by earcons and TTS.
+    Earcons are mixed on top of the TTS PCM in the audio callback, so playing
+    one never opens a device or waits for anything.
+    """
+    def __init__(self, sample_rate: int = config.AUDIO_OUTPUT_SAMPLE_RATE,
+                 blocksize: int = config.AUDIO_OUTPUT_BLOCKSIZE):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._voices = []          # [samples, position] pairs for playing earcons
+        self._tts_chunks = []      # float32 arrays waiting to be played
+        self._tts_position = 0     # read position inside self._tts_chunks[0]
+        self._pcm_remainder = b""  # odd trailing byte from the last TTS write
+        self._earcons_heard_until = 0.0  # monotonic time the last earcon leaves the speaker
+        self._tts_idle = threading.Event()
+        self._tts_idle.set()
+
+        self.stream = sd.OutputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype='float32',
+            blocksize=blocksize,
+            latency='low',
+            callback=self._callback
+        )
+
+    def start(self):
+        self.stream.start()
+        print(f"[Audio] Output mixer started ({self.sample_rate} Hz, block {self.stream.blocksize}).")
+
+    def play(self, samples: np.ndarray):
+        """Queues a preloaded float32 buffer for mixing. Returns immediately."""
+        if samples is None or len(samples) == 0:
+            return
+        with self._lock:
+            self._voices.append([samples, 0])
+
+    def is_earcon_playing(self) -> bool:
+        """True until the last queued earcon has been played, output latency included."""
+        with self._lock:
+            return bool(self._voices) or time.monotonic() < self._earcons_heard_until
+
+    def write_pcm(self, data: bytes):
+        """Queues raw S16_LE mono PCM (as produced by Piper) for playback."""
+        data = self._pcm_remainder + data
+        if len(data) % 2:
+            self._pcm_remainder = data[-1:]
+            data = data[:-1]
+        else:
+            self._pcm_remainder = b""
+        if not data:
+            return
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        with self._lock:
+            self._tts_chunks.append(samples)
+            self._tts_idle.clear()
+
+    def is_tts_playing(self) -> bool:
+        return not self._tts_idle.is_set()
+
+    def wait_for_tts(self, timeout: float | None = None) -> bool:
+        """Blocks until all queued TTS audio has been played."""
+        return self._tts_idle.wait(timeout)
+
+    def _callback(self, outdata, frames, time_info, status):
+        out = np.zeros(frames, dtype=np.float32)
+        with self._lock:
+            # 1. TTS stream
+            filled = 0
+            while filled < frames and self._tts_chunks:
+                chunk = self._tts_chunks[0]
+                take = min(frames - filled, len(chunk) - self._tts_position)
+                out[filled:filled + take] = chunk[self._tts_position:self._tts_position + take]
+                filled += take
+                self._tts_position += take
+                if self._tts_position >= len(chunk):
+                    self._tts_chunks.pop(0)
+                    self._tts_position = 0
+            if not self._tts_chunks:
+                self._tts_idle.set()
+
+            # 2. Earcons, mixed on top
+            still_playing = []
+            for voice in self._voices:
+                samples, position = voice
+                take = min(frames, len(samples) - position)
+                out[:take] += samples[position:position + take]
+                voice[1] = position + take
+                if voice[1] < len(samples):
+                    still_playing.append(voice)
+            if self._voices and not still_playing:
+                # The last block is still in the device buffer
+                self._earcons_heard_until = time.monotonic() + self.stream.latency
+            self._voices = still_playing
+
+        np.clip(out, -1.0, 1.0, out=out)
+        outdata[:, 0] = out
+
+    def close(self):
+        try:
+            self.stream.stop()
+            self.stream.close()
+        except Exception as e:
+            print(f"[Audio] Error closing output stream: {e}")
+
+
+# --- Global Mixer and Earcon Bank ---
+_mixer = None
+_mixer_lock = threading.Lock()
+EARCONS = {}
+
+def get_mixer() -> AudioMixer:
+    """Returns the process-wide mixer, creating and starting it on first use."""
+    global _mixer
+    with _mixer_lock:
+        if _mixer is None:
+            _mixer = AudioMixer()
+            _mixer.start()
+        return _mixer
+
+def load_earcons(sound_dir: str = config.EARCON_DIR) -> dict:
+    """
+    Decodes every WAV in sound_dir into memory, resampled to the mixer rate.
+    Keyed by absolute path so callers can keep passing paths to play_sound().
+    """
+    if not os.path.isdir(sound_dir):
+        print(f"[Audio] Earcon directory not found: {sound_dir}")
+        return EARCONS
+
+    for filename in sorted(os.listdir(sound_dir)):
+        if not filename.lower().endswith(".wav"):
+            continue
+        path = os.path.abspath(os.path.join(sound_dir, filename))
+        try:
+            data, fs = sf.read(path, dtype='float32', always_2d=True)
+            mono = data.mean(axis=1).astype(np.float32)
+            EARCONS[path] = _resample(mono, fs, config.AUDIO_OUTPUT_SAMPLE_RATE)
+        except Exception as e:
+            print(f"[Audio] Failed to load earcon {filename}: {e}")
+
+    print(f"[Audio] Preloaded {len(EARCONS)} earcon(s).")
+    return EARCONS
+
+def play_earcon(sound_path: str) -> bool:
+    """Plays a preloaded earcon without blocking. Returns False if it isn't loaded."""
+    samples = EARCONS.get(os.path.abspath(sound_path))
+    if samples is None:
+        return False
+    get_mixer().play(samples)
+    return True
+
+def earcon_playing() -> bool:
+    """Whether an earcon is still audible, e.g. so the microphone doesn't record it."""
+    mixer = _mixer
+    return mixer is not None and mixer.is_earcon_playing()
+
+def shutdown_mixer():
+    global _mixer
+    with _mixer_lock:
+        if _mixer is not None:
+            _mixer.close()
+            _mixer = None
+
+
+if __name__ == '__main__':
+    print("--- Testing Audio Output Mixer ---")
+    load_earcons()
+    mixer = get_mixer()
+    try:
+        # A one-second 440 Hz tone as fake TTS, with a short blip on top
+        t = np.arange(config.AUDIO_OUTPUT_SAMPLE_RATE) / config.AUDIO_OUTPUT_SAMPLE_RATE
+        tone = (0.2 * np.sin(2 * np.pi * 440 * t) * 32767).astype('<i2').tobytes()
+        mixer.write_pcm(tone)
+        blip = (0.2 * np.sin(2 * np.pi * 880 * t[:2205])).astype(np.float32)
+
+        start = time.perf_counter()
+        mixer.play(blip)
+        print(f"play() returned in {(time.perf_counter() - start) * 1000:.3f} ms")
+        assert mixer.is_earcon_playing(), "the listener must see the earcon as playing"
+
+        mixer.wait_for_tts(timeout=3.0)
+        time.sleep(0.2)
+        assert not mixer.is_earcon_playing()
+    finally:
+        shutdown_mixer()
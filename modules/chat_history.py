@@ -0,0 +1,212 @@
+# modules/chat_history.py
+import sys
+import os
+import threading
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.segmenter import split_sentences
+except ImportError:
+    print("Error: Could not import from modules. Check paths.")
+    sys.exit(1)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English). Good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def extractive_summary(previous_summary: str, turns: list) -> str:
+    """
+    Cheap summariser: keeps each question and the first sentence of its answer.
+    Used when no LLM summariser is configured or the LLM one fails.
+    """
+    parts = [previous_summary] if previous_summary else []
+    for user_text, assistant_text in turns:
+        answer = split_sentences(assistant_text)
+        parts.append(f"You asked: {user_text.strip()} I said: {answer[0] if answer else ''}".strip())
+    return " ".join(parts)
+
+
+class ChatHistory:
+    """
+    Token-budgeted conversation memory for the LLM.
+
+    Recent turns are kept verbatim. When the estimated size goes over
+    `token_budget`, the oldest turns are folded into a rolling summary (on a
+    background thread, so the next question isn't delayed) until the history
+    is back under half the budget. Compacting in batches rather than a turn at
+    a time keeps the message list a stable, append-only prefix for several
+    turns in a row, which is what lets Ollama reuse its cached KV state from
+    the previous turn instead of re-evaluating the whole prompt.
+    """
+    # The summary is replayed as a user/assistant exchange rather than a system
+    # message, because any system message would replace the Modelfile's SYSTEM prompt.
+    SUMMARY_REQUEST = "Remind me what we talked about earlier."
+
+    def __init__(self, token_budget: int = config.LLM_HISTORY_TOKEN_BUDGET,
+                 summary_token_budget: int = config.LLM_HISTORY_SUMMARY_TOKENS,
+                 summarizer=None):
+        self.token_budget = token_budget
+        # The summary must leave room for verbatim turns, or every turn would compact
+        self.summary_token_budget = min(summary_token_budget, token_budget // 4)
+        self.summarizer = summarizer or extractive_summary
+        self.summary = ""
+        self.turns = []  # (user_text, assistant_text) tuples
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def messages(self) -> list:
+        """Returns the history in Ollama /api/chat message format."""
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append({"role": "user", "content": self.SUMMARY_REQUEST})
+                messages.append({"role": "assistant", "content": self.summary})
+            for user_text, assistant_text in self.turns:
+                messages.append({"role": "user", "content": user_text})
+                messages.append({"role": "assistant", "content": assistant_text})
+            return messages
+
+    def estimated_tokens(self) -> int:
+        with self._lock:
+            total = estimate_tokens(self.summary) if self.summary else 0
+            for user_text, assistant_text in self.turns:
+                total += estimate_tokens(user_text) + estimate_tokens(assistant_text)
+            return total
+
+    def add_exchange(self, user_text: str, assistant_text: str):
+        """Records one finished turn, compacting older turns if over budget."""
+        if not assistant_text:
+            return
+        with self._lock:
+            self.turns.append((user_text, assistant_text))
+        if self.estimated_tokens() > self.token_budget:
+            self._start_compaction()
+
+    def fork(self) -> "ChatHistory":
+        """An independent copy, e.g. for a speculative request that may be thrown away."""
+        with self._lock:
+            copy = ChatHistory(self.token_budget, self.summary_token_budget, self.summarizer)
+            copy.summary = self.summary
+            copy.turns = list(self.turns)
+        return copy
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+
+    def _start_compaction(self):
+        with self._lock:
+            if self._compacting or len(self.turns) < 2:
+                return
+            # Fold the oldest turns until the verbatim part fits under the low-water mark
+            low_water = self.token_budget // 2 - self.summary_token_budget
+            remaining = sum(estimate_tokens(u) + estimate_tokens(a) for u, a in self.turns)
+            fold_count = 0
+            while fold_count < len(self.turns) - 1 and remaining > low_water:
+                user_text, assistant_text = self.turns[fold_count]
+                remaining -= estimate_tokens(user_text) + estimate_tokens(assistant_text)
+                fold_count += 1
+            if not fold_count:
+                return
+            self._compacting = True
+            old_turns = self.turns[:fold_count]
+            previous_summary = self.summary
+        threading.Thread(
+            target=self._compact,
+            args=(previous_summary, old_turns),
+            daemon=True
+        ).start()
+
+    def _compact(self, previous_summary: str, old_turns: list):
+        try:
+            try:
+                summary = self.summarizer(previous_summary, old_turns)
+            except Exception as e:
+                print(f"[History] Summariser failed, using extractive summary: {e}")
+                summary = extractive_summary(previous_summary, old_turns)
+
+            # Keep the rolling summary itself within budget (drop its oldest part)
+            max_chars = self.summary_token_budget * 4
+            if len(summary) > max_chars:
+                summary = summary[-max_chars:].split(" ", 1)[-1]
+
+            with self._lock:
+                # Turns added while we were summarising stay untouched
+                self.turns = self.turns[len(old_turns):]
+                self.summary = summary.strip()
+            print(f"[History] Folded {len(old_turns)} turn(s) into the summary. "
+                  f"History is now ~{self.estimated_tokens()} tokens.")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def __len__(self):
+        """Number of messages that will be sent, matching the old list-based history."""
+        with self._lock:
+            return len(self.turns) * 2 + (2 if self.summary else 0)
+
+
+if __name__ == '__main__':
+    # Compare the prompt size of the old unbounded history with the managed one
+    import time
+    SYSTEM_PROMPT_TOKENS = 80
+    TURNS = 20
+    question = "Tell me something interesting about football in the nineteen fifties. Please answer in one or two sentences."
+    answer = "Football in the fifties was dominated by Hungary, whose Golden Team went unbeaten for years. They changed tactics forever."
+
+    history = ChatHistory(token_budget=300, summary_token_budget=60)
+    legacy_tokens = SYSTEM_PROMPT_TOKENS
+    legacy_messages = []
+    legacy_prompts, managed_prompts = [], []  # The messages sent on each turn
+    print("--- Prompt tokens sent per turn (estimated) ---")
+    print(f"{'turn':>4} {'legacy':>8} {'managed':>8}")
+    for turn in range(1, TURNS + 1):
+        legacy_tokens += estimate_tokens(question)
+        managed_tokens = history.estimated_tokens() + estimate_tokens(question)
+        print(f"{turn:>4} {legacy_tokens:>8} {managed_tokens:>8}")
+        legacy_tokens += estimate_tokens(answer)
+        user_message = {"role": "user", "content": question}
+        legacy_prompts.append(legacy_messages + [user_message])
+        managed_prompts.append(history.messages() + [user_message])
+        legacy_messages += [user_message, {"role": "assistant", "content": answer}]
+        history.add_exchange(question, answer)
+        time.sleep(0.01)  # Let background compaction finish
+
+    # Measured: replay both conversations against Ollama and read the
+    # prompt_eval_count/prompt_eval_duration it reports (what the handler logs).
+    # Prompt caching is left on, as in real use.
+    from modules.llm_client import OllamaClient, LLMClientError
+
+    def prompt_eval(client: OllamaClient, messages: list) -> tuple:
+        payload = {"model": config.OLLAMA_MODEL, "messages": messages, "stream": True,
+                   "keep_alive": config.LLM_KEEP_ALIVE, "options": {"num_predict": 1}}
+        for chunk in client.stream("/api/chat", payload):
+            if chunk.get("done"):
+                return chunk.get("prompt_eval_count", 0), chunk.get("prompt_eval_duration", 0) / 1e6
+        return 0, 0.0
+
+    print(f"\n--- Prompt eval per turn, measured on {config.OLLAMA_MODEL} ---")
+    client = OllamaClient(config.OLLAMA_BASE_URL)
+    try:
+        prompt_eval(client, [{"role": "user", "content": "hi"}])  # Load the model first
+        measured = {"legacy": [], "managed": []}
+        for name, prompts in (("legacy", legacy_prompts), ("managed", managed_prompts)):
+            for messages in prompts:
+                measured[name].append(prompt_eval(client, messages))
+    except (LLMClientError, OSError) as e:
+        print(f"Ollama not reachable at {config.OLLAMA_BASE_URL}, skipping: {e}")
+    else:
+        print(f"{'turn':>4} {'legacy':>16} {'managed':>16}")
+        for turn, (legacy, managed) in enumerate(zip(measured["legacy"], measured["managed"]), start=1):
+            print(f"{turn:>4} {legacy[0]:>6} tok {legacy[1]:>5.0f} ms {managed[0]:>6} tok {managed[1]:>5.0f} ms")
+        for name, samples in measured.items():
+            durations = sorted(duration for _, duration in samples)
+            print(f"{name}: {sum(durations):.0f} ms total, median {durations[len(durations) // 2]:.0f} ms, "
+                  f"last turn {samples[-1][1]:.0f} ms")
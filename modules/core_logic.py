@@ -1,68 +1,76 @@
 # modules/core_logic.py
 import sys
+from functools import lru_cache
 
 # --- MODIFIED IMPORTS ---
 try:
-    from modules.fastpath import COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS
+    from modules.fastpath import COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS, ARG_PATTERNS
+    from core.router import IntentRouter, RouteMatch
+    from core.intent_classifier import IntentClassifier
+    import config
 except ImportError as e:
     print(f"FATAL: core_logic.py could not import from modules.fastpath: {e}")
     sys.exit(1)
 
+# All registries are compiled once, at import time
+ROUTER = IntentRouter(COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS, ARG_PATTERNS)
+
+# Fuzzy fallback for paraphrases the exact triggers miss ("skip this song")
+CLASSIFIER = None
+if config.INTENT_CLASSIFIER_ENABLED:
+    CLASSIFIER = IntentClassifier.from_registry(COMMANDS, SINGLE_WORD_TRIGGERS,
+                                                threshold=config.INTENT_CLASSIFIER_THRESHOLD)
+
+@lru_cache(maxsize=64)
+def route_prompt(user_prompt: str) -> RouteMatch | None:
+    """
+    Matches the prompt against the fastpath registries. Cached, so the
+    logic worker's type check and the following process_prompt() share one lookup.
+    """
+    match = ROUTER.match(user_prompt)
+    if match or CLASSIFIER is None:
+        return match
+
+    canonical, score, margin = CLASSIFIER.classify(user_prompt)
+    if canonical is None:
+        return None
+    # The canonical command is a phrase the exact router (and the handler) understands
+    canonical_match = ROUTER.match(canonical)
+    if canonical_match is None:
+        return None
+    if canonical_match.handler.side_effects and margin < config.INTENT_CLASSIFIER_MARGIN:
+        # Too close to another label to risk the wrong action ("pause" vs "next")
+        print(f"[Router] Fuzzy match too close to call: '{user_prompt}' -> '{canonical}' "
+              f"({score:.2f}, margin {margin:.2f}), asking the LLM.")
+        return None
+    print(f"[Router] Fuzzy match: '{user_prompt}' -> '{canonical}' ({score:.2f})")
+    return RouteMatch(canonical_match.handler, 'fuzzy', canonical, canonical_match.args)
+
 def get_prompt_handler_type(user_prompt: str) -> str:
     """
     Checks the prompt against fastpath commands to determine the handler type.
     Returns 'fastpath' or 'llm'.
     """
-    clean_prompt = user_prompt.strip(" .?!,").lower()
-    
-    # 1. Check for single-word exact matches
-    if clean_prompt in SINGLE_WORD_TRIGGERS:
-        return 'fastpath'
-    
-    # 2. Check for prefix commands
-    #    We check longer prefixes first (e.g., "search for" before "search")
-    for prefix in sorted(PREFIX_COMMANDS.keys(), key=len, reverse=True):
-        # --- THIS IS THE FIX ---
-        # Check if the prompt IS the prefix OR starts with the prefix + space
-        if clean_prompt == prefix or clean_prompt.startswith(prefix + " "):
-            return 'fastpath'
-        # --- END FIX ---
-            
-    # 3. Check multi-word keyword commands
-    for function, keyword_tuples in COMMANDS.items():
-        for keyword_tuple in keyword_tuples:
-            if all(keyword in clean_prompt for keyword in keyword_tuple):
-                return 'fastpath'
-                
-    # If no match, it's an LLM prompt
-    return 'llm'
+    return 'fastpath' if route_prompt(user_prompt) else 'llm'
+
+def resolve_prompt(user_prompt: str) -> tuple | None:
+    """
+    Returns (handler, text to call it with, parsed args), or None if no
+    fastpath command matches. args is None for handlers without an args pattern.
+    """
+    match = route_prompt(user_prompt)
+    if match is None:
+        return None
+    # Fuzzy matches hand the handler the canonical command, not the user's wording
+    return match.handler, (match.trigger if match.kind == 'fuzzy' else user_prompt), match.args
 
 def process_prompt(user_prompt: str) -> str | None:
     """
     Processes the prompt against the fastpath command registry.
     Returns the command's response string or None if no match is found.
     """
-    clean_prompt = user_prompt.strip(" .?!,").lower()
-    
-    # 1. Check for single-word exact matches
-    if clean_prompt in SINGLE_WORD_TRIGGERS:
-        function = SINGLE_WORD_TRIGGERS[clean_prompt]
-        return function(user_prompt)
-    
-    # 2. Check for prefix commands
-    for prefix in sorted(PREFIX_COMMANDS.keys(), key=len, reverse=True):
-        # --- THIS IS THE FIX ---
-        # Check if the prompt IS the prefix OR starts with the prefix + space
-        if clean_prompt == prefix or clean_prompt.startswith(prefix + " "):
-            function = PREFIX_COMMANDS[prefix]
-            return function(user_prompt)
-        # --- END FIX ---
-            
-    # 3. Check multi-word keyword commands
-    for function, keyword_tuples in COMMANDS.items():
-        for keyword_tuple in keyword_tuples:
-            if all(keyword in clean_prompt for keyword in keyword_tuple):
-                return function(user_prompt)
-    
-    # If no fastpath command matched, return None
-    return None
\ No newline at end of file
+    resolved = resolve_prompt(user_prompt)
+    if resolved is None:
+        return None
+    handler, text, args = resolved
+    return handler(text, args) if args is not None else handler(text)
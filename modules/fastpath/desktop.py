@@ -4,6 +4,10 @@ import urllib.parse
 import string
 import time
 from shutil import which  # <-- NEW IMPORT
+from .registry import command
+from . import REGISTRY
+from modules.services.mpris import get_mpris_watcher
+from modules.services.app_index import get_app_index, normalize_name
 
 # --- NEW Helper Function ---
 def _launch_spotify() -> bool:
@@ -41,108 +45,103 @@ def _launch_spotify() -> bool:
     print("[Desktop] Could not find launch command for Spotify (native/flatpak/snap).")
     return False
 
-# --- Program Launch Logic (MODIFIED) ---
-PROGRAM_REGISTRY = {
-    "firefox": ["brave"],
-    "browser": ["brave"],
-    "brave": ["brave"],
-    "terminal": ["gnome-terminal"],
-    "console": ["gnome-terminal"],
-    "code": ["cursor"],
-    "visual studio": ["cursor"],
-    "cursor": ["cursor"],
-    "spotify": [] # <-- MODIFIED: Now handled by _launch_spotify
-}
+# --- Program Launch Logic ---
+# Words around the app name in "open the spotify app please"
+LAUNCH_FILLER = {"open", "launch", "start", "the", "app", "application", "program", "up", "please", "for", "me"}
 
-def handle_program_launch(text: str) -> str:
-    """Launches a program from the PROGRAM_REGISTRY."""
-    for trigger, command_list in PROGRAM_REGISTRY.items():
-        if trigger in text:
-            
-            if trigger == "spotify":
-                try:
-                    status_cmd_str = "playerctl --player=spotify status"
-                    status_result = subprocess.run(
-                        status_cmd_str,
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=2,
-                        check=False
-                    )
+def _spoken_app_name(text: str) -> str:
+    return " ".join(word for word in normalize_name(text).split() if word not in LAUNCH_FILLER)
+
+def _open_spotify() -> str:
+    """Launches Spotify (if needed) and waits for it to be controllable."""
+    # Runs on a fastpath worker; readiness comes from D-Bus, not polling
+    watcher = get_mpris_watcher()
+    if watcher.is_running("spotify"):
+        return "Spotify is already running."
+
+    print("[Desktop] Spotify not running. Launching...")
+    
+    # --- MODIFIED: Use new multi-launch strategy ---
+    launched = _launch_spotify()
+    if not launched:
+        print("[Desktop] All launch methods failed.")
+        return "I tried to open Spotify, but couldn't find a valid launch command."
 
-                    if status_result.returncode == 0:
-                        return "Spotify is already running."
+    print("[Desktop] Waiting for Spotify to appear on the session bus...")
+    max_wait_seconds = 30
+    start = time.monotonic()
+    if watcher.wait_for("spotify", max_wait_seconds):
+        print(f"[Desktop] Spotify is now responsive after {time.monotonic() - start:.1f} seconds.")
+        return "Opening Spotify."
+    
+    print(f"[Desktop] Waited {max_wait_seconds}s, Spotify is still not responsive.")
 
-                    print("[Desktop] Spotify not running. Launching...")
-                    
-                    # --- MODIFIED: Use new multi-launch strategy ---
-                    launched = _launch_spotify()
-                    if not launched:
-                        print("[Desktop] All launch methods failed.")
-                        return "I tried to open Spotify, but couldn't find a valid launch command."
+    # --- MODIFIED: Add xdg-open fallback ---
+    print("[Desktop] Trying xdg-open fallback...")
+    try:
+        subprocess.Popen(["xdg-open", "spotify:home"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        print("[Desktop] Triggered Spotify via xdg-open; giving it 5s...")
+        if watcher.wait_for("spotify", 5):
+            print("[Desktop] Spotify became responsive after xdg-open.")
+            return "Opening Spotify."
+    except Exception as e:
+        print(f"[Desktop] xdg-open fallback failed: {e}")
+    
+    return "I tried to open Spotify, but it's not responding."
 
-                    print("[Desktop] Waiting for Spotify to become responsive...")
-                    max_wait_seconds = 30
-                    for i in range(max_wait_seconds):
-                        time.sleep(1)
-                        status_check = subprocess.run(
-                            status_cmd_str,
-                            shell=True,
-                            capture_output=True,
-                            text=True,
-                            timeout=1,
-                            check=False
-                        )
-                        if status_check.returncode == 0:
-                            print(f"[Desktop] Spotify is now responsive after {i+1} seconds.")
-                            return "Opening Spotify."
-                    
-                    print(f"[Desktop] Waited {max_wait_seconds}s, Spotify is still not responsive.")
+@command(
+    prefixes=("open", "launch"),
+    post_llm=True,
+    side_effects=True,
+    deadline=1.0,  # Waiting for Spotify to come up can take 30s+
+    post_llm_keywords=[
+        ("open", "firefox"), ("launch", "firefox"),
+        ("open", "browser"), ("launch", "browser"),
+        ("open", "brave"), ("launch", "brave"),
+        ("open", "terminal"), ("launch", "terminal"),
+        ("open", "console"), ("launch", "console"),
+        ("open", "code"), ("launch", "code"),
+        ("open", "visual studio"), ("launch", "visual studio"),
+        ("open", "cursor"), ("launch", "cursor"),
+        ("open", "spotify"), ("launch", "spotify")
+    ]
+)
+def handle_program_launch(text: str) -> str:
+    """Launches an installed application, looked up in the XDG/$PATH app index."""
+    spoken = _spoken_app_name(text)
+    if not spoken:
+        return "Which program should I open?"
+    if "spotify" in spoken.split():
+        return _open_spotify()
 
-                    # --- MODIFIED: Add xdg-open fallback ---
-                    print("[Desktop] Trying xdg-open fallback...")
-                    try:
-                        subprocess.Popen(["xdg-open", "spotify:home"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                        print("[Desktop] Triggered Spotify via xdg-open; giving it 5s...")
-                        for _ in range(5):
-                            time.sleep(1)
-                            status_check = subprocess.run(status_cmd_str, shell=True, capture_output=True, text=True, timeout=1, check=False)
-                            if status_check.returncode == 0:
-                                print("[Desktop] Spotify became responsive after xdg-open.")
-                                return "Opening Spotify."
-                    except Exception as e:
-                        print(f"[Desktop] xdg-open fallback failed: {e}")
-                        pass
-                    
-                    return "I tried to open Spotify, but it's not responding."
-                    
-                except FileNotFoundError:
-                    return "Error: 'playerctl' command not found."
-                except Exception as e:
-                    return f"An error occurred while launching Spotify: {e}"
-            
-            else:
-                # Original logic for other programs
-                try:
-                    subprocess.Popen(command_list)
-                    return f"Opening {trigger}."
-                except FileNotFoundError:
-                    return f"Error: The command '{command_list[0]}' was not found on your system."
-                except Exception as e:
-                    return f"An error occurred: {e}"
-                    
-    return "I'm not sure which program to open."
+    app = get_app_index().resolve(spoken)
+    if app is None:
+        return f"I couldn't find a program called {spoken}."
+    try:
+        subprocess.Popen(app["argv"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        return f"Opening {spoken}."
+    except FileNotFoundError:
+        return f"Error: The command '{app['argv'][0]}' was not found on your system."
+    except Exception as e:
+        return f"An error occurred: {e}"
 
-# --- Web Search Logic (Unchanged) ---
-SEARCH_TRIGGERS = [
-    "look up",
-    "search for"
-]
+# --- Web Search Logic ---
+def _search_triggers() -> list:
+    """The phrases declared for handle_web_search below (prefixes and post-LLM keywords), longest first."""
+    spec = REGISTRY.get("handle_web_search")
+    triggers = set(spec.prefixes) | {" ".join(keywords) for keywords in spec.post_llm_keywords}
+    return sorted(triggers, key=len, reverse=True)
 
+@command(
+    prefixes=("look up", "search for"),
+    post_llm=True,
+    side_effects=True,
+    post_llm_keywords=[("look", "up"), ("search", "for"), ("find", "information on")]
+)
 def handle_web_search(text: str) -> str:
     """Performs a web search using Brave."""
-    for trigger in SEARCH_TRIGGERS:
+    for trigger in _search_triggers():
         if trigger in text:
             try:
                 query_start_index = text.find(trigger) + len(trigger)
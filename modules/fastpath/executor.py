@@ -0,0 +1,131 @@
+# modules/fastpath/executor.py
+import sys
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: executor.py could not import config.")
+    sys.exit(1)
+
+# Spoken when a handler misses its deadline; the real result follows when ready
+WORKING_PHRASES = [
+    "Working on it.",
+    "On it, one moment.",
+    "Give me a second on that.",
+]
+
+handler_hist = get_histogram("fastpath.handler")
+
+
+class FastpathExecutor:
+    """
+    Runs fastpath handlers on a bounded thread pool so a slow handler (e.g.
+    waiting 30s for Spotify to launch) never holds up the next command.
+
+    Each call has a deadline (the handler's declared one, else the default).
+    If the result isn't ready by then, a "working on it" reply is delivered
+    straight away and the result follows whenever it arrives. Each handler
+    may only occupy `per_handler_limit` workers, so a burst of one slow
+    intent can't starve the fast ones.
+    """
+    def __init__(self, deliver, max_workers: int = config.FASTPATH_MAX_WORKERS,
+                 per_handler_limit: int = config.FASTPATH_MAX_PER_HANDLER,
+                 default_deadline: float = config.FASTPATH_DEFAULT_DEADLINE):
+        self.deliver = deliver
+        self.default_deadline = default_deadline
+        self.per_handler_limit = per_handler_limit
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fastpath")
+        self._in_flight = {}  # handler name -> running count
+        self._lock = threading.Lock()
+
+    def submit(self, handler, text: str, deliver=None, args: str | None = None) -> bool:
+        """
+        Schedules handler(text), or handler(text, args) when parsed arguments
+        are given. Replies go to `deliver` if given, else the executor's
+        default. Returns False if the handler is already at its limit.
+        """
+        deliver = deliver or self.deliver
+        name = getattr(handler, "__name__", repr(handler))
+        with self._lock:
+            if self._in_flight.get(name, 0) >= self.per_handler_limit:
+                print(f"[Fastpath] {name} is busy ({self.per_handler_limit} in flight), rejecting.")
+                deliver("I'm still working on the last one.")
+                return False
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+
+        deadline = getattr(handler, "deadline", None) or self.default_deadline
+        state = {"done": False, "late": False}
+        state_lock = threading.Lock()
+        start = time.perf_counter()
+
+        def on_deadline():
+            with state_lock:
+                if state["done"]:
+                    return
+                state["late"] = True
+            print(f"[Fastpath] {name} missed its {deadline:.1f}s deadline, result will follow.")
+            deliver(random.choice(WORKING_PHRASES))
+
+        timer = threading.Timer(deadline, on_deadline)
+        timer.daemon = True
+
+        def run():
+            try:
+                result = handler(text, args) if args is not None else handler(text)
+            except Exception as e:
+                print(f"[Fastpath] Error in {name}: {e}")
+                result = "Sorry, something went wrong with that."
+            finally:
+                timer.cancel()
+                handler_hist.record(time.perf_counter() - start)
+                with self._lock:
+                    self._in_flight[name] -= 1
+            with state_lock:
+                state["done"] = True
+                late = state["late"]
+            if late:
+                print(f"[Fastpath] {name} finished after {time.perf_counter() - start:.1f}s.")
+            if result:
+                deliver(result)
+
+        timer.start()
+        self.pool.submit(run)
+        return True
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    # A slow and a fast handler submitted back to back must not block each other
+    def slow_handler(text):
+        time.sleep(1.0)
+        return f"slow done: {text}"
+    slow_handler.deadline = 0.3
+
+    def fast_handler(text):
+        return f"fast done: {text}"
+
+    start = time.perf_counter()
+    def deliver(text):
+        print(f"  +{time.perf_counter() - start:.2f}s  {text}")
+
+    print("--- Testing Fastpath Executor ---")
+    executor = FastpathExecutor(deliver, max_workers=4, per_handler_limit=1, default_deadline=0.5)
+    executor.submit(slow_handler, "open spotify")
+    executor.submit(fast_handler, "what time")
+    executor.submit(slow_handler, "open spotify again")  # Over the per-handler limit
+    time.sleep(1.2)
+    print(f"handler latency: {handler_hist.summary()}")
+    executor.shutdown()
@@ -0,0 +1,233 @@
+# modules/fastpath/registry.py
+import ast
+import importlib
+import json
+import os
+import re
+import sys
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from core.router import parse_args
+except ImportError:
+    print("Error: registry.py could not import config.")
+    sys.exit(1)
+
+# Handler modules in registration order. Within the keyword rules, earlier
+# modules (and earlier functions in a module) win ties.
+HANDLER_MODULES = ("system", "music", "web_api", "desktop")
+
+REGISTRY_CACHE_PATH = os.path.join(config.CACHE_DIR, "fastpath_registry.json")
+REGISTRY_CACHE_VERSION = 3
+
+SPEC_FIELDS = ("single", "prefixes", "keywords", "args", "post_llm", "post_llm_keywords", "deadline",
+               "side_effects")
+
+
+def command(single: tuple = (), prefixes: tuple = (), keywords: tuple = (), args: str | None = None,
+            post_llm: bool = False, post_llm_keywords: tuple = (), deadline: float | None = None,
+            side_effects: bool = False):
+    """
+    Declares a fastpath handler and everything that routes to it:
+
+      single             whole-utterance triggers ("pause")
+      prefixes           triggers the utterance starts with ("search for ...")
+      keywords           tuples of words/phrases that must all appear
+      args               regex applied to the text after a prefix (or the whole
+                         utterance); the first group (or the whole match) is
+                         passed to the handler as its second argument, `args`
+      post_llm           whether the LLM may trigger it (tool calls)
+      post_llm_keywords  extra keyword tuples for the keyword post-LLM fallback
+      deadline           seconds before a "working on it" reply is spoken
+                         (default FASTPATH_DEFAULT_DEADLINE)
+      side_effects       whether it changes something (playback, volume, apps);
+                         fuzzy matches only reach it with a clear margin
+
+    The arguments must be literals: the registry is read from the source with
+    `ast`, so routing never has to import a handler module.
+    """
+    def decorator(function):
+        function.fastpath_spec = {
+            "single": single, "prefixes": prefixes, "keywords": keywords, "args": args,
+            "post_llm": post_llm, "post_llm_keywords": post_llm_keywords, "deadline": deadline,
+            "side_effects": side_effects
+        }
+        return function
+    return decorator
+
+
+class LazyHandler:
+    """
+    Stands in for a handler; its module is only imported on the first call.
+    Handlers with an args pattern are called as handler(text, args): the
+    router passes the arguments it parsed, other callers (tool calls) get
+    them parsed from `text` here.
+    """
+    def __init__(self, module: str, name: str, doc: str = "", deadline: float | None = None,
+                 args: str | None = None, side_effects: bool = False):
+        self.module = module
+        self.__name__ = name
+        self.__doc__ = doc
+        self.deadline = deadline
+        self.side_effects = side_effects
+        self.args_pattern = re.compile(args) if args else None
+        self._function = None
+
+    def resolve(self):
+        if self._function is None:
+            module = importlib.import_module(f"modules.fastpath.{self.module}")
+            self._function = getattr(module, self.__name__)
+        return self._function
+
+    def __call__(self, text: str, args: str | None = None):
+        if self.args_pattern is None:
+            return self.resolve()(text)
+        if args is None:
+            args = parse_args(self.args_pattern, text.lower())
+        return self.resolve()(text, args)
+
+    def __repr__(self):
+        return f"<LazyHandler {self.module}.{self.__name__}>"
+
+
+class HandlerSpec:
+    """One registered handler: its lazy callable plus its declared triggers."""
+    def __init__(self, module: str, name: str, doc: str, **spec):
+        self.module = module
+        self.name = name
+        self.doc = doc
+        self.single = tuple(spec.get("single", ()))
+        self.prefixes = tuple(spec.get("prefixes", ()))
+        self.keywords = [tuple(k) for k in spec.get("keywords", ())]
+        self.args = spec.get("args")
+        self.post_llm = bool(spec.get("post_llm", False))
+        self.post_llm_keywords = [tuple(k) for k in spec.get("post_llm_keywords", ())]
+        self.deadline = spec.get("deadline")
+        self.side_effects = bool(spec.get("side_effects", False))
+        self.handler = LazyHandler(module, name, doc, self.deadline, self.args, self.side_effects)
+
+    def to_dict(self) -> dict:
+        return {"module": self.module, "name": self.name, "doc": self.doc,
+                "single": self.single, "prefixes": self.prefixes, "keywords": self.keywords,
+                "args": self.args, "post_llm": self.post_llm, "post_llm_keywords": self.post_llm_keywords,
+                "deadline": self.deadline, "side_effects": self.side_effects}
+
+
+class Registry:
+    """All fastpath handlers, with the lookup tables the router and tools are built from."""
+    def __init__(self, specs: list):
+        self.specs = specs
+
+    def tables(self) -> tuple:
+        """(COMMANDS, SINGLE_WORD_TRIGGERS, PREFIX_COMMANDS) in the historic table formats."""
+        commands, single_word, prefix = {}, {}, {}
+        for spec in self.specs:
+            if spec.keywords:
+                commands[spec.handler] = spec.keywords
+            for trigger in spec.single:
+                single_word[trigger] = spec.handler
+            for trigger in spec.prefixes:
+                prefix[trigger] = spec.handler
+        return commands, single_word, prefix
+
+    def arg_patterns(self) -> dict:
+        return {spec.handler: spec.args for spec in self.specs if spec.args}
+
+    def post_llm_specs(self) -> list:
+        return [spec for spec in self.specs if spec.post_llm]
+
+    def get(self, name: str) -> HandlerSpec | None:
+        for spec in self.specs:
+            if spec.name == name:
+                return spec
+        return None
+
+
+def _source_path(module: str) -> str:
+    return os.path.join(script_dir, f"{module}.py")
+
+def _source_stamps() -> dict:
+    return {module: os.stat(_source_path(module)).st_mtime_ns for module in HANDLER_MODULES}
+
+def _is_command_decorator(node) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    return (isinstance(func, ast.Name) and func.id == "command") or \
+           (isinstance(func, ast.Attribute) and func.attr == "command")
+
+def scan_module(module: str) -> list:
+    """Reads the @command declarations from a handler module's source without importing it."""
+    with open(_source_path(module), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=f"{module}.py")
+    specs = []
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        for decorator in node.decorator_list:
+            if not _is_command_decorator(decorator):
+                continue
+            spec = {}
+            for keyword in decorator.keywords:
+                if keyword.arg not in SPEC_FIELDS:
+                    raise ValueError(f"{module}.{node.name}: unknown @command argument '{keyword.arg}'")
+                spec[keyword.arg] = ast.literal_eval(keyword.value)
+            specs.append(HandlerSpec(module, node.name, ast.get_docstring(node) or "", **spec))
+    return specs
+
+def load_registry(cache_path: str = REGISTRY_CACHE_PATH) -> Registry:
+    """
+    Loads the serialised registry if the handler sources haven't changed since
+    it was written, otherwise rescans them and rewrites the cache.
+    """
+    stamps = _source_stamps()
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") == REGISTRY_CACHE_VERSION and data.get("sources") == stamps:
+            return Registry([HandlerSpec(**entry) for entry in data["handlers"]])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    specs = [spec for module in HANDLER_MODULES for spec in scan_module(module)]
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": REGISTRY_CACHE_VERSION, "sources": stamps,
+                       "handlers": [spec.to_dict() for spec in specs]}, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"[Fastpath] Could not write registry cache: {e}")
+    return Registry(specs)
+
+
+if __name__ == '__main__':
+    # Startup cost: scanning sources vs. loading the cache vs. the old eager imports
+    import time
+    import tempfile
+    cache_path = os.path.join(tempfile.mkdtemp(), "registry.json")
+
+    start = time.perf_counter()
+    registry = load_registry(cache_path)
+    scanned = time.perf_counter() - start
+    start = time.perf_counter()
+    registry = load_registry(cache_path)
+    cached = time.perf_counter() - start
+    print(f"--- Fastpath registry: {len(registry.specs)} handlers ---")
+    for spec in registry.specs:
+        print(f"{spec.module}.{spec.name}: single={spec.single} prefixes={spec.prefixes} "
+              f"keywords={len(spec.keywords)} post_llm={spec.post_llm}")
+    print(f"\nscan sources: {scanned * 1000:.1f} ms, load cache: {cached * 1000:.1f} ms")
+    print("handler modules imported so far:",
+          [m for m in HANDLER_MODULES if f"modules.fastpath.{m}" in sys.modules] or "none")
+
+    start = time.perf_counter()
+    for module in HANDLER_MODULES:
+        importlib.import_module(f"modules.fastpath.{module}")
+    print(f"eager import of every handler module (old startup): {(time.perf_counter() - start) * 1000:.1f} ms")
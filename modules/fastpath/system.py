@@ -1,7 +1,12 @@
 # modules/fastpath/system.py
 import datetime
 import pytz
+from .registry import command
 
+@command(
+    keywords=[("what", "time"), ("current", "time"), ("the", "time")],
+    post_llm=True
+)
 def handle_time_query(text: str) -> str:
     """Gets the current time for the IST time zone and formats it."""
     ist = pytz.timezone('Asia/Kolkata')
@@ -1,31 +1,59 @@
 # modules/fastpath/web_api.py
-import requests
-import feedparser
+from .registry import command
+from modules.services.weather import get_weather_service
+from modules.services.news import get_news_service
 
 # --- Weather Query ---
+
+@command(
+    keywords=[("what", "weather"), ("today's", "forecast"), ("the", "weather")],
+    post_llm=True,
+    deadline=2.0
+)
 def handle_weather_query(text: str) -> str:
     """Gets the current weather from wttr.in."""
-    try:
-        response = requests.get("https://wttr.in/?format=%C+%t")
-        response.raise_for_status() # Raise error for bad responses
-        weather_data = response.text.strip()
-        return f"The current weather is {weather_data}."
-    except requests.RequestException as e:
-        print(f"Weather API error: {e}")
+    service = get_weather_service()
+    record = service.current()
+    if record is None:
+        # Nothing cached yet (e.g. the very first query); fetch once, synchronously
+        service.refresh(wait=True)
+        record = service.current()
+    if record is None:
         return "Sorry, I couldn't get the weather right now."
+    if service.is_fresh(record):
+        return f"The current weather is {record.conditions}."
+    minutes = int(record.age() // 60)
+    return f"As of {minutes} minutes ago, the weather was {record.conditions}."
 
 # --- News Query ---
-NEWS_FEED_URL = "http://feeds.bbci.co.uk/news/world/rss.xml"
 
+def _news_service():
+    service = get_news_service()
+    if not service.headlines:
+        # Nothing polled yet (e.g. the very first query); poll once, synchronously
+        service.poll(wait=True)
+    return service
+
+@command(
+    single=("headlines",),
+    keywords=[("what", "news"), ("top", "story")],
+    post_llm=True,
+    deadline=2.0
+)
 def handle_news_query(text: str) -> str:
-    """Gets the top news headline from an RSS feed."""
-    try:
-        feed = feedparser.parse(NEWS_FEED_URL)
-        if not feed.entries:
-            return "Sorry, I couldn't retrieve any headlines."
-        
-        top_headline = feed.entries[0].title
-        return f"The latest headline is: {top_headline}"
-    except Exception as e:
-        print(f"News feed error: {e}")
-        return "Sorry, I couldn't get the news right now."
\ No newline at end of file
+    """Gets the top news headline from the background-polled feeds."""
+    headline = _news_service().top_headline()
+    if headline is None:
+        return "Sorry, I couldn't get the news right now."
+    return f"The latest headline is: {headline}"
+
+@command(
+    keywords=[("next", "headline"), ("next", "story"), ("another", "headline")],
+    deadline=2.0
+)
+def handle_next_headline(text: str) -> str:
+    """Reads the headline after the last one, from memory."""
+    headline = _news_service().next_headline()
+    if headline is None:
+        return "That's all the headlines I have."
+    return f"Next: {headline}"
@@ -0,0 +1,354 @@
+# modules/llm_client.py
+import sys
+import os
+import json
+import queue
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: Could not import from modules. Check paths.")
+    sys.exit(1)
+
+
+# --- Errors ---
+class LLMClientError(Exception):
+    """Base class for LLM client failures."""
+
+class LLMUnavailableError(LLMClientError):
+    """The server can't be reached, or the circuit breaker is open."""
+
+class LLMTimeoutError(LLMClientError):
+    """The server accepted the request but stopped producing tokens in time."""
+
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    CLOSED: requests flow. After `failure_threshold` consecutive failures it OPENs.
+    OPEN: requests are refused immediately until `reset_timeout` has passed.
+    HALF_OPEN: a single trial request is let through; success closes, failure re-opens.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while requests would be refused. Unlike allow_request(), never changes state."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # OPEN and still cooling down, or HALF_OPEN with a trial already in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("[LLM Client] Circuit closed, server is healthy again.")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def abandon_trial(self):
+        """A half-open trial was cancelled before it proved anything; allow another one."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"[LLM Client] Circuit opened after {self.failures} failure(s).")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# --- Cancellation ---
+class CancelToken:
+    """
+    Lets another thread abort an in-flight stream. A generator can't be closed
+    from a different thread while it is blocked waiting for a token, so
+    cancel() wakes the stream up instead and it ends quietly.
+    """
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+# --- Client ---
+_END = object()
+_CANCELLED = object()
+
+def _abort_response(response):
+    """
+    Shuts down the socket under a streaming response. Unlike response.close(),
+    this never waits on the reader thread, and a blocked recv() wakes up at once.
+    """
+    conn = getattr(response.raw, "connection", None) or getattr(response.raw, "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+            return
+        except OSError:
+            pass
+    # Unknown transport: close it off-thread so the caller still doesn't block
+    threading.Thread(target=response.close, daemon=True).start()
+
+class OllamaClient:
+    """
+    A reusable, pooled client for the Ollama HTTP API.
+
+    One requests.Session is shared across turns, so the TCP connection is kept
+    alive between questions. Each stream is read on a helper thread and handed
+    over through a queue, which lets the consumer enforce separate
+    first-token and idle deadlines instead of blocking forever on a socket.
+    """
+    def __init__(self, base_url: str,
+                 connect_timeout: float = config.LLM_CONNECT_TIMEOUT,
+                 first_token_timeout: float = config.LLM_FIRST_TOKEN_TIMEOUT,
+                 idle_timeout: float = config.LLM_IDLE_TIMEOUT,
+                 pool_size: int = config.LLM_POOL_SIZE,
+                 breaker: CircuitBreaker | None = None,
+                 name: str = "ollama"):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.first_token_timeout = first_token_timeout
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self.last_used = 0.0  # time.monotonic() of the last request, for idle heartbeats
+        self.breaker = breaker or CircuitBreaker(
+            config.LLM_BREAKER_FAILURE_THRESHOLD,
+            config.LLM_BREAKER_RESET_SECONDS
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.connect_hist = get_histogram(f"{name}.connect")
+        self.first_token_hist = get_histogram(f"{name}.first_token")
+        self.total_hist = get_histogram(f"{name}.total")
+
+    def _read_stream(self, path: str, payload: dict, out: queue.Queue, state: dict):
+        """Helper thread: performs the POST and forwards parsed JSON lines to `out`."""
+        start = time.perf_counter()
+        try:
+            # The read timeout here is only a backstop; the consumer enforces the real deadlines.
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                stream=True,
+                timeout=(self.connect_timeout, max(self.first_token_timeout, self.idle_timeout) + 1.0)
+            )
+            state["response"] = response
+            if state["cancelled"]:
+                response.close()
+                return
+            self.connect_hist.record(time.perf_counter() - start)
+            response.raise_for_status()
+
+            # chunk_size=None hands over each token as soon as it arrives instead of
+            # waiting for a 512-byte read to fill up.
+            for line in response.iter_lines(chunk_size=None):
+                if state["cancelled"]:
+                    break
+                if not line:
+                    continue
+                try:
+                    out.put(json.loads(line.decode('utf-8')))
+                except json.JSONDecodeError:
+                    print(f"[LLM Client] Warning: Received non-JSON line: {line}")
+            out.put(_END)
+        except Exception as e:
+            if not state["cancelled"]:
+                out.put(e)
+        finally:
+            response = state.get("response")
+            if response is not None:
+                response.close()
+
+    def stream(self, path: str, payload: dict, cancel_token: CancelToken | None = None):
+        """
+        Generator yielding each JSON object of a streaming Ollama response.
+        Closing the generator, or cancelling `cancel_token`, cancels the request
+        and drops the connection, which makes Ollama stop generating.
+        A cancelled stream simply ends; it is not counted as a failure.
+        """
+        if not self.breaker.allow_request():
+            raise LLMUnavailableError(f"{self.name} circuit is open")
+
+        self.last_used = time.monotonic()
+        out = queue.Queue()
+        state = {"cancelled": False, "response": None}
+        if cancel_token is not None:
+            cancel_token.on_cancel(lambda: out.put(_CANCELLED))
+        reader = threading.Thread(target=self._read_stream, args=(path, payload, out, state), daemon=True)
+        start = time.perf_counter()
+        reader.start()
+
+        timeout = self.first_token_timeout
+        got_first = False
+        finished = False
+        failed = False
+        try:
+            while True:
+                try:
+                    item = out.get(timeout=timeout)
+                except queue.Empty:
+                    phase = "idle" if got_first else "first-token"
+                    failed = True
+                    self.breaker.record_failure()
+                    raise LLMTimeoutError(f"{self.name} {phase} timeout after {timeout:.1f}s")
+
+                if item is _END:
+                    finished = True
+                    break
+                if item is _CANCELLED:
+                    return
+                if isinstance(item, Exception):
+                    failed = True
+                    self.breaker.record_failure()
+                    if isinstance(item, (requests.exceptions.ConnectionError, requests.exceptions.HTTPError)):
+                        raise LLMUnavailableError(f"{self.name} request failed: {item}") from item
+                    if isinstance(item, requests.exceptions.Timeout):
+                        raise LLMTimeoutError(f"{self.name} socket timeout: {item}") from item
+                    raise LLMClientError(f"{self.name} stream error: {item}") from item
+
+                if not got_first:
+                    got_first = True
+                    timeout = self.idle_timeout
+                    self.first_token_hist.record(time.perf_counter() - start)
+                yield item
+
+            self.breaker.record_success()
+            self.total_hist.record(time.perf_counter() - start)
+        finally:
+            if not finished:
+                if not failed:
+                    # Cancelled by the caller: only tokens tell us anything about health
+                    if got_first:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.abandon_trial()
+                state["cancelled"] = True
+                response = state.get("response")
+                if response is not None:
+                    _abort_response(response)
+
+    def stream_chat(self, payload: dict, cancel_token: CancelToken | None = None):
+        """Streams /api/chat chunks. See stream()."""
+        return self.stream("/api/chat", payload, cancel_token)
+
+    def close(self):
+        self.session.close()
+
+
+if __name__ == '__main__':
+    # Self-test against a local stub server that streams, stalls, and answers slowly.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from modules.metrics import report
+
+    class StubOllama(BaseHTTPRequestHandler):
+        # Ollama streams with chunked transfer encoding over keep-alive connections
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def write_chunk(self, obj):
+            data = (json.dumps(obj) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            mode = payload["model"]
+            if mode == "slow-first":
+                time.sleep(1.5)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i, word in enumerate(["Hello", " there", "."]):
+                    if mode == "stall" and i == 1:
+                        time.sleep(1.5)
+                    self.write_chunk({"message": {"content": word}, "done": False})
+                    time.sleep(0.02)
+                self.write_chunk({"done": True})
+                self.wfile.write(b"0\r\n\r\n")
+            except BrokenPipeError:
+                pass # The client gave up on us, as intended
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = OllamaClient(url, first_token_timeout=0.5, idle_timeout=0.5,
+                          breaker=CircuitBreaker(failure_threshold=2, reset_timeout=1.0), name="stub")
+
+    def run(mode):
+        try:
+            text = "".join(c.get("message", {}).get("content", "") for c in client.stream_chat({"model": mode}))
+            return f"ok: {text!r}"
+        except LLMClientError as e:
+            return f"{type(e).__name__}: {e}"
+
+    print("--- Testing Ollama Client ---")
+    print("streaming: ", run("stream"))
+    print("streaming (pooled): ", run("stream"))
+    print("slow first token:", run("slow-first"))
+    print("idle stall:", run("stall"))
+    print("breaker open:", run("stream"))
+    time.sleep(1.1)
+    print("after reset:", run("stream"))
+    print(report())
+    server.shutdown()
@@ -1,6 +1,4 @@
 # modules/llm_handler.py
-import requests
-import json
 import sys
 import os
 
@@ -12,86 +10,217 @@ try:
         sys.path.append(project_root)
     # Import sanitize_text_for_tts from utils, not a local copy
     from modules.utils import sanitize_text_for_tts
+    from modules.segmenter import SentenceSegmenter, split_sentences
+    from modules.response_cache import ResponseCache
+    from modules.chat_history import ChatHistory
+    from modules.metrics import get_histogram
+    import config
+    from modules.llm_router import LLMRouter
+    from modules.llm_client import CancelToken, LLMUnavailableError, LLMTimeoutError
 except ImportError:
     print("Error: Could not import from modules. Check paths.")
     sys.exit(1)
 
 # --- Ollama Configuration ---
-OLLAMA_API_URL = "http://127.0.0.1:11434/api/chat"
-OLLAMA_MODEL = "lar-model"
+OLLAMA_BASE_URL = config.OLLAMA_BASE_URL
+OLLAMA_MODEL = config.OLLAMA_MODEL
 SYSTEM_PROMPT = "You are Lar, a helpful AI assistant. Your tone is conversational and natural. You are programmed to enjoy common topics like sports and food, and you should form brief, positive opinions when asked. For example, you find football fascinating. Use commas to connect related ideas. Keep your responses concise, typically one or two sentences total."
 
-print(f"LLM Handler (Ollama) initialized. Model: {OLLAMA_MODEL}")
+# Spoken instead of an answer when Ollama is down, hung, or the circuit is open
+FALLBACK_UNAVAILABLE = "Sorry, I can't reach my language model right now."
+FALLBACK_TIMEOUT = "Sorry, that's taking too long to think about. Please try again."
 
-def query_llm_stream(prompt: str, history: list) -> iter:
+# Chat turns are routed (and hedged) across the configured backends; summaries
+# and embeddings always use the primary backend's pooled client.
+router = LLMRouter.from_config()
+client = router.primary.client
+prompt_eval_hist = get_histogram("ollama.prompt_eval")
+
+def embed_text(text: str) -> list:
+    """Embedding vector for the response cache's similarity lookups."""
+    payload = {"model": OLLAMA_MODEL, "input": text, "keep_alive": config.LLM_KEEP_ALIVE}
+    for chunk in client.stream("/api/embed", payload):
+        return chunk["embeddings"][0]
+    raise ValueError("Empty embedding response")
+
+response_cache = None
+if config.LLM_CACHE_ENABLED:
+    response_cache = ResponseCache(embed_fn=embed_text if config.LLM_CACHE_USE_EMBEDDINGS else None)
+
+print(f"LLM Handler (Ollama) initialized. Backends: {', '.join(f'{b.name}={b.model}' for b in router.backends)}")
+
+def summarize_turns(previous_summary: str, turns: list) -> str:
+    """
+    Rolling summariser for ChatHistory: asks the model to fold the old turns
+    into the existing summary. Raises on failure so ChatHistory can fall back.
+    """
+    transcript = "\n".join(f"User: {u}\nLar: {a}" for u, a in turns)
+    prompt = (
+        "Summarise this conversation in at most three short sentences, "
+        "keeping names, facts and preferences.\n"
+        f"Earlier summary: {previous_summary or 'none'}\n{transcript}"
+    )
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": True,
+        "keep_alive": config.LLM_KEEP_ALIVE,
+        "options": {"num_predict": config.LLM_HISTORY_SUMMARY_TOKENS}
+    }
+    return "".join(chunk.get("response", "") for chunk in client.stream("/api/generate", payload)).strip()
+
+def create_chat_history() -> ChatHistory:
+    """Builds the history manager used by the logic worker."""
+    return ChatHistory(summarizer=summarize_turns if config.LLM_HISTORY_USE_LLM_SUMMARY else None)
+
+def _log_prompt_eval(chunk: dict, history: ChatHistory):
+    """Ollama reports load and prompt-evaluation cost on the final chunk of every response."""
+    load_seconds = chunk.get("load_duration", 0) / 1e9
+    if load_seconds >= config.LLM_COLD_LOAD_THRESHOLD:
+        print(f"[LLM] This turn paid a cold model load of {load_seconds:.2f}s.")
+
+    count = chunk.get("prompt_eval_count")
+    duration_ns = chunk.get("prompt_eval_duration")
+    if count is None or duration_ns is None:
+        return
+    prompt_eval_hist.record(duration_ns / 1e9)
+    print(f"[LLM] Prompt eval: {count} tokens in {duration_ns / 1e6:.0f} ms "
+          f"(history ~{history.estimated_tokens()} tokens, {len(history)} messages)")
+
+def _stream_cached_answer(prompt: str, answer: str, history: ChatHistory, max_sentences: int | None):
+    """Replays a cached answer sentence by sentence, exactly like a live one."""
+    sentences = split_sentences(answer)
+    if max_sentences:
+        sentences = sentences[:max_sentences]
+    try:
+        for sentence in sentences:
+            yield sanitize_text_for_tts(sentence)
+    finally:
+        history.add_exchange(prompt, " ".join(sentences))
+    return history
+
+def cache_answer(cache_key: str, answer: str):
+    """Stores an answer produced outside query_llm_stream, e.g. a confirmed speculation."""
+    if response_cache and cache_key and answer:
+        response_cache.put(cache_key, answer)
+
+def query_llm_stream(prompt: str, history: ChatHistory, max_sentences: int | None = None,
+                     cache_key: str | None = None, cancel_token: CancelToken | None = None,
+                     tools: list | None = None, on_tool_call=None, on_first_token=None) -> iter:
     """
     Sends a prompt and streams the response from Ollama, yielding sentences.
     This function is a GENERATOR.
-    It takes the prompt and the CURRENT history as arguments.
-    It yields sentences one by one.
-    It RETURNS the UPDATED history.
-    """
+    It takes the prompt and the conversation's ChatHistory as arguments.
+    It yields sentences one by one, stopping after `max_sentences` if given.
     
-    # 1. Create a local copy of the history and add the system prompt
-    #    (This is safer for threaded applications than a global history)
-    local_history = [
-        {"role": "system", "content": SYSTEM_PROMPT}
-    ]
-    local_history.extend(history)
-    local_history.append({"role": "user", "content": prompt})
+    The consumer may also stop early with .close(). Either way the HTTP stream
+    is closed, which makes Ollama stop generating, and whatever was already
+    yielded is recorded in the history as the (truncated) answer.
+
+    If `cache_key` (normally the user's raw prompt) is given, history-independent
+    questions are answered from, and stored in, the response cache.
+    `cancel_token` lets another thread abort the stream; a cancelled answer is never cached.
+
+    If `tools` (Ollama function specs) are given, the model may answer with
+    tool calls; each one is handed to `on_tool_call(call)` as soon as its chunk
+    arrives, while the text keeps streaming. Answers that called a tool are not cached.
+
+    `on_first_token()` is called once, when the model's first output arrives
+    (not for cached answers).
+    """
+    if response_cache and cache_key:
+        cached_answer = response_cache.get(cache_key)
+        if cached_answer:
+            print(f"[LLM] Answering from cache: '{cache_key}'")
+            return (yield from _stream_cached_answer(prompt, cached_answer, history, max_sentences))
+
+
+    # 1. Build the messages. The system prompt lives in the Modelfile, so it is
+    #    only sent when a model without it is configured.
+    messages = []
+    if config.LLM_SEND_SYSTEM_PROMPT:
+        messages.append({"role": "system", "content": SYSTEM_PROMPT})
+    messages.extend(history.messages())
+    messages.append({"role": "user", "content": prompt})
 
     payload = {
         "model": OLLAMA_MODEL,
-        "messages": local_history,
-        "stream": True
+        "messages": messages,
+        "stream": True,
+        "keep_alive": config.LLM_KEEP_ALIVE
     }
+    if tools:
+        payload["tools"] = tools
+    if max_sentences:
+        # Don't let the model run on far past what we are going to speak
+        payload["options"] = {"num_predict": max_sentences * config.LLM_TOKENS_PER_SENTENCE}
 
-    sentence_buffer = ""
+    segmenter = SentenceSegmenter()
     full_response_text = ""
+    spoken = [] # Raw sentences handed to the consumer so far
+    finished = False
+    used_tools = False
+    stream = router.stream_chat(payload, cancel_token, prompt=prompt)
 
     try:
-        with requests.post(OLLAMA_API_URL, json=payload, stream=True) as response:
-            response.raise_for_status()
+        for chunk in stream:
+            if on_first_token and not (full_response_text or used_tools):
+                message = chunk.get('message', {})
+                if message.get('content') or message.get('tool_calls'):
+                    on_first_token()
+            if chunk.get('done'):
+                _log_prompt_eval(chunk, history)
+
+            for tool_call in chunk.get('message', {}).get('tool_calls') or ():
+                used_tools = True
+                if on_tool_call:
+                    on_tool_call(tool_call)
+
+            chunk_text = chunk.get('message', {}).get('content', '')
             
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        chunk = json.loads(line.decode('utf-8'))
-                        chunk_text = chunk.get('message', {}).get('content', '')
-                        
-                        if not chunk_text:
-                            continue
-
-                        sentence_buffer += chunk_text
-                        full_response_text += chunk_text
-
-                        # Use the same sentence-splitting logic
-                        if any(p in sentence_buffer for p in ['.', '?', '!']):
-                            processed_buffer = sentence_buffer.replace('?', '?|').replace('!', '!|').replace('.', '.|')
-                            parts = processed_buffer.split('|')
-                            
-                            for i in range(len(parts) - 1):
-                                sentence_to_yield = parts[i].strip()
-                                if sentence_to_yield:
-                                    yield sanitize_text_for_tts(sentence_to_yield)
-                            
-                            sentence_buffer = parts[-1]
-                            
-                    except json.JSONDecodeError:
-                        print(f"Warning: Received non-JSON line from Ollama: {line}")
+            if not chunk_text:
+                continue
+
+            full_response_text += chunk_text
+
+            # The segmenter only scans the newly arrived text
+            for sentence in segmenter.feed(chunk_text):
+                spoken.append(sentence)
+                yield sanitize_text_for_tts(sentence)
+                if max_sentences and len(spoken) >= max_sentences:
+                    print(f"[LLM] Sentence limit ({max_sentences}) reached, cancelling the stream.")
+                    if response_cache and cache_key and not used_tools:
+                        response_cache.put(cache_key, " ".join(spoken))
+                    return history
+
+        if cancel_token and cancel_token.cancelled:
+            return history
 
         # Yield any remaining text
-        if sentence_buffer.strip():
-            yield sanitize_text_for_tts(sentence_buffer.strip())
+        tail = segmenter.flush()
+        if tail:
+            spoken.append(tail)
+            yield sanitize_text_for_tts(tail)
             
-        # 2. Add the complete response to the history
-        local_history.append({"role": "assistant", "content": full_response_text.strip()})
+        # 2. Add the complete exchange to the history
+        finished = True
+        history.add_exchange(prompt, full_response_text.strip())
+        if response_cache and cache_key and not used_tools:
+            response_cache.put(cache_key, full_response_text.strip())
         
-        # 3. Return the updated history (minus the system prompt)
-        #    The logic_worker will capture this in StopIteration.value
-        return local_history[1:] # Return history without system prompt
+        # 3. Return the history. The logic_worker will capture this in StopIteration.value
+        return history
 
-    except requests.exceptions.ConnectionError:
-        yield "ERROR: Could not connect to Ollama server."
+    except LLMUnavailableError as e:
+        print(f"[LLM] Ollama unavailable: {e}")
+        yield FALLBACK_UNAVAILABLE
+    except LLMTimeoutError as e:
+        print(f"[LLM] Ollama timed out: {e}")
+        yield FALLBACK_TIMEOUT
     except Exception as e:
-        yield f"An error occurred during LLM stream: {e}"
\ No newline at end of file
+        yield f"An error occurred during LLM stream: {e}"
+    finally:
+        # Closing the client stream drops the connection and aborts generation
+        stream.close()
+        if not finished and spoken:
+            history.add_exchange(prompt, " ".join(spoken))
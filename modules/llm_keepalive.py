@@ -0,0 +1,104 @@
+# modules/llm_keepalive.py
+import sys
+import os
+import threading
+import time
+import datetime
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.llm_handler import router
+    from modules.llm_client import LLMClientError
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: Could not import from modules. Check paths.")
+    sys.exit(1)
+
+warmup_hist = get_histogram("ollama.warmup")
+
+
+def load_model(reason: str = "warm-up", backend=None) -> float | None:
+    """
+    Asks Ollama to load the model without generating anything (an empty prompt
+    does exactly that) and refreshes its keep_alive timer.
+    Defaults to the primary backend.
+    Returns the wall-clock latency in seconds, or None on failure.
+    """
+    backend = backend or router.primary
+    payload = {
+        "model": backend.model,
+        "prompt": "",
+        "stream": True,
+        "keep_alive": config.LLM_KEEP_ALIVE
+    }
+    start = time.perf_counter()
+    load_seconds = 0.0
+    try:
+        for chunk in backend.client.stream("/api/generate", payload):
+            if chunk.get("done"):
+                load_seconds = chunk.get("load_duration", 0) / 1e9
+    except LLMClientError as e:
+        print(f"[LLM] {reason.capitalize()} of {backend.name} failed: {e}")
+        return None
+
+    elapsed = time.perf_counter() - start
+    warmup_hist.record(elapsed)
+    if load_seconds >= config.LLM_COLD_LOAD_THRESHOLD:
+        print(f"[LLM] {reason.capitalize()}: cold load of {backend.model} took {elapsed:.2f}s "
+              f"(model load {load_seconds:.2f}s).")
+    else:
+        print(f"[LLM] {reason.capitalize()}: {backend.model} already resident ({elapsed * 1000:.0f} ms).")
+    return elapsed
+
+def start_warmup() -> list:
+    """Loads every backend's model on background threads so it overlaps with Piper/Porcupine init."""
+    threads = []
+    for backend in router.backends:
+        thread = threading.Thread(target=load_model, args=("warm-up", backend), daemon=True,
+                                  name=f"llm-warmup-{backend.name}")
+        thread.start()
+        threads.append(thread)
+    return threads
+
+def warm_up_all():
+    """Blocking variant of start_warmup(), for the startup profiler."""
+    for thread in start_warmup():
+        thread.join()
+
+def _within_hours(hours: tuple, now: datetime.datetime | None = None) -> bool:
+    start_hour, end_hour = hours
+    hour = (now or datetime.datetime.now()).hour
+    if start_hour <= end_hour:
+        return start_hour <= hour < end_hour
+    return hour >= start_hour or hour < end_hour  # Window that wraps past midnight
+
+
+class ModelKeepAlive(threading.Thread):
+    """
+    Keeps the model resident during the configured hours.
+    Every LLM_HEARTBEAT_INTERVAL seconds, if nothing has used the model in that
+    time, it sends an empty-prompt load request. That costs no generation, only
+    resets Ollama's keep_alive timer (or reloads the model if it was evicted).
+    Outside the hours it does nothing, so the model unloads after LLM_KEEP_ALIVE.
+    """
+    def __init__(self, stop_event: threading.Event,
+                 interval: float = config.LLM_HEARTBEAT_INTERVAL,
+                 hours: tuple = config.LLM_HEARTBEAT_HOURS):
+        super().__init__(daemon=True, name="llm-keepalive")
+        self.stop_event = stop_event
+        self.interval = interval
+        self.hours = hours
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if not _within_hours(self.hours):
+                continue
+            for backend in router.backends:
+                if time.monotonic() - backend.client.last_used < self.interval:
+                    continue  # A real request already refreshed keep_alive
+                load_model("heartbeat", backend)
@@ -0,0 +1,248 @@
+# modules/llm_router.py
+import sys
+import os
+import re
+import queue
+import threading
+import time
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.llm_client import OllamaClient, CancelToken, LLMUnavailableError
+except ImportError:
+    print("Error: Could not import from modules. Check paths.")
+    sys.exit(1)
+
+
+# --- Prompt Complexity ---
+COMPLEX_MARKERS = re.compile(
+    r"\b(explain|why|how does|how do|compare|difference|versus|analy[sz]e|summari[sz]e|"
+    r"write|describe|step by step|pros and cons|recommend|plan)\b"
+)
+
+def prompt_complexity(prompt: str) -> int:
+    """
+    A cheap score of how much reasoning a prompt needs.
+    One point per reasoning marker, one for a long prompt, one for several questions.
+    """
+    text = prompt.lower()
+    score = len(COMPLEX_MARKERS.findall(text))
+    if len(text.split()) > 20:
+        score += 1
+    if text.count("?") > 1:
+        score += 1
+    return score
+
+
+# --- Backends ---
+class LLMBackend:
+    """One Ollama endpoint + model, with its own pooled client and latency estimate."""
+    # Weight of the newest sample in the first-token moving average
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, name: str, url: str, model: str, tier: str = "small", options: dict | None = None):
+        self.name = name
+        self.model = model
+        self.tier = tier
+        self.options = options or {}
+        self.client = OllamaClient(url, name=name)
+        self.first_token_ewma = None
+
+    def available(self) -> bool:
+        return not self.client.breaker.is_open()
+
+    def expected_first_token(self) -> float:
+        # Untried backends are assumed as fast as the hedge delay, so they get a chance
+        return self.first_token_ewma if self.first_token_ewma is not None else config.LLM_HEDGE_DELAY
+
+    def record_first_token(self, seconds: float):
+        if self.first_token_ewma is None:
+            self.first_token_ewma = seconds
+        else:
+            self.first_token_ewma += self.EWMA_ALPHA * (seconds - self.first_token_ewma)
+
+    def record_failure(self):
+        # Treat a failure like a very slow first token so ranking moves away from it
+        self.record_first_token(config.LLM_FIRST_TOKEN_TIMEOUT)
+
+    def payload_for(self, payload: dict) -> dict:
+        payload = dict(payload, model=self.model)
+        if self.options:
+            payload["options"] = {**self.options, **payload.get("options", {})}
+        return payload
+
+
+_END = object()
+_CANCELLED = object()
+
+class LLMRouter:
+    """
+    Routes chat requests across several LLM backends.
+
+    Backends are ranked by prompt complexity (simple prompts prefer the
+    "small" tier, complex ones the "large" tier) and then by their live
+    first-token latency. The request goes to the best one; if it hasn't
+    produced a token within `hedge_delay`, the same request is also sent to
+    the next one, and whichever answers first wins while the other is
+    cancelled. A backend that fails outright is replaced immediately.
+    """
+    def __init__(self, backends: list, hedge_delay: float = config.LLM_HEDGE_DELAY):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.hedge_delay = hedge_delay
+
+    @classmethod
+    def from_config(cls) -> "LLMRouter":
+        return cls([LLMBackend(**spec) for spec in config.LLM_BACKENDS])
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    def rank(self, prompt: str) -> list:
+        preferred = "large" if prompt_complexity(prompt) >= config.LLM_COMPLEXITY_THRESHOLD else "small"
+        healthy = [b for b in self.backends if b.available()]
+        return sorted(healthy, key=lambda b: (b.tier != preferred, b.expected_first_token()))
+
+    def _pump(self, backend: LLMBackend, payload: dict, token: CancelToken, events: queue.Queue):
+        try:
+            for chunk in backend.client.stream_chat(backend.payload_for(payload), token):
+                events.put((backend, chunk))
+            events.put((backend, _END))
+        except Exception as e:
+            events.put((backend, e))
+
+    def stream_chat(self, payload: dict, cancel_token: CancelToken | None = None, prompt: str = ""):
+        """
+        Generator with the same contract as OllamaClient.stream_chat(), hedged
+        across backends. The payload's "model" is replaced per backend.
+        """
+        candidates = self.rank(prompt)
+        if not candidates:
+            raise LLMUnavailableError("All LLM backends are unavailable")
+
+        events = queue.Queue()
+        attempts = {}  # backend -> (CancelToken, start time)
+        if cancel_token is not None:
+            cancel_token.on_cancel(lambda: events.put((None, _CANCELLED)))
+
+        def launch(backend):
+            token = CancelToken()
+            attempts[backend] = (token, time.perf_counter())
+            threading.Thread(target=self._pump, args=(backend, payload, token, events), daemon=True).start()
+
+        launch(candidates.pop(0))
+        hedge_at = time.perf_counter() + self.hedge_delay
+        winner = None
+        running = 1
+        last_error = None
+
+        try:
+            while True:
+                timeout = None
+                if winner is None and candidates:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                try:
+                    backend, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge = candidates.pop(0)
+                    print(f"[LLM Router] No token yet, hedging on {hedge.name}.")
+                    launch(hedge)
+                    running += 1
+                    hedge_at = time.perf_counter() + self.hedge_delay
+                    continue
+
+                if item is _CANCELLED:
+                    return
+                if winner is not None and backend is not winner:
+                    continue  # Leftovers from a cancelled loser
+
+                if isinstance(item, Exception):
+                    backend.record_failure()
+                    if backend is winner:
+                        raise item
+                    running -= 1
+                    last_error = item
+                    if running == 0:
+                        if not candidates:
+                            raise last_error
+                        failover = candidates.pop(0)
+                        print(f"[LLM Router] {backend.name} failed, failing over to {failover.name}.")
+                        launch(failover)
+                        running += 1
+                        hedge_at = time.perf_counter() + self.hedge_delay
+                    continue
+
+                if winner is None:
+                    winner = backend
+                    backend.record_first_token(time.perf_counter() - attempts[backend][1])
+                    for other, (token, _) in attempts.items():
+                        if other is not backend:
+                            token.cancel()
+                    if len(attempts) > 1:
+                        print(f"[LLM Router] {backend.name} answered first.")
+
+                if item is _END:
+                    return
+                yield item
+        finally:
+            for token, _ in attempts.values():
+                token.cancel()
+
+
+if __name__ == '__main__':
+    # Hedging and failover against local stub servers with different speeds.
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def start_stub(first_token_delay: float) -> str:
+        class Stub(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(first_token_delay)
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for word in (payload["model"], " says hi", "."):
+                        data = (json.dumps({"message": {"content": word}}) + "\n").encode()
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def answer(router, prompt="what is two plus two"):
+        start = time.perf_counter()
+        text = "".join(c["message"]["content"] for c in router.stream_chat({"messages": []}, prompt=prompt))
+        return f"{text!r} in {(time.perf_counter() - start) * 1000:.0f} ms"
+
+    print("--- Testing LLM Router ---")
+    fast, slow = start_stub(0.05), start_stub(1.0)
+    router = LLMRouter([
+        LLMBackend("slow-small", slow, "slow", tier="small"),
+        LLMBackend("fast-large", fast, "fast", tier="large"),
+    ], hedge_delay=0.2)
+    print("hedged:", answer(router))
+    print("complex prompt prefers large tier:", answer(router, "explain why the sky is blue and compare it to sunsets"))
+
+    dead = LLMRouter([
+        LLMBackend("dead", "http://127.0.0.1:9", "dead"),
+        LLMBackend("fast", fast, "fast"),
+    ], hedge_delay=5.0)
+    print("failover:", answer(dead))
@@ -0,0 +1,87 @@
+# modules/metrics.py
+import bisect
+import threading
+
+# Bucket upper bounds in milliseconds. The last bucket catches everything above.
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """
+    A small fixed-bucket latency histogram. Thread-safe.
+    Percentiles are reported as the upper bound of the bucket they fall in,
+    which is plenty for spotting regressions without keeping every sample.
+    """
+    def __init__(self, name: str, buckets_ms: tuple = DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        ms = seconds * 1000.0
+        index = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> float:
+        """Returns the bucket upper bound (ms) containing the p-th percentile."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = p / 100.0 * self.count
+            running = 0
+            for index, bucket_count in enumerate(self.counts):
+                running += bucket_count
+                if running >= target:
+                    if index < len(self.buckets_ms):
+                        return float(self.buckets_ms[index])
+                    return self.max_ms
+        return self.max_ms
+
+    def summary(self) -> str:
+        if not self.count:
+            return f"{self.name}: no samples"
+        mean = self.total_ms / self.count
+        return (f"{self.name}: n={self.count} mean={mean:.0f}ms "
+                f"p50<={self.percentile(50):.0f}ms p95<={self.percentile(95):.0f}ms "
+                f"max={self.max_ms:.0f}ms")
+
+
+# --- Global Histogram Registry ---
+_histograms = {}
+_registry_lock = threading.Lock()
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """Returns the named histogram, creating it on first use."""
+    with _registry_lock:
+        if name not in _histograms:
+            _histograms[name] = LatencyHistogram(name)
+        return _histograms[name]
+
+def report() -> str:
+    """One line per histogram, sorted by name."""
+    with _registry_lock:
+        histograms = sorted(_histograms.values(), key=lambda h: h.name)
+    return "\n".join(h.summary() for h in histograms)
+
+def print_report():
+    print("[Metrics] Latency histograms:\n" + (report() or "no histograms recorded"))
+
+
+class MetricsReporter(threading.Thread):
+    """Prints the latency report every `interval` seconds until `stop_event` is set."""
+    def __init__(self, stop_event: threading.Event, interval: float):
+        super().__init__(daemon=True, name="metrics-report")
+        self.stop_event = stop_event
+        self.interval = interval
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            print_report()
@@ -1,94 +1,286 @@
 # modules/post_llm_tools.py
-import subprocess
+import threading
+import queue
 import re
+import time
+import json
+from typing import Callable, NamedTuple
 
-# --- MODIFIED: Import all fastpath handlers ---
-# We will re-use the functions you've already built.
-from modules.fastpath import (
-    handle_time_query,
-    handle_program_launch,
-    handle_web_search,
-    handle_media_control,
-    handle_weather_query,
-    handle_news_query
-)
-
-# --- MODIFIED: Post-LLM Tool Registry ---
-
-# This registry now maps the *actual* fastpath functions
-# to the keywords that should trigger them *after* an LLM response.
-# This allows the LLM to "delegate" tasks.
-# The keyword list is copied from modules/fastpath/__init__.py for simplicity.
+import config
+from modules.fastpath import REGISTRY
+from modules.metrics import get_histogram
+from core.router import IntentRouter, tokenize
+
+# --- Keyword Fallback Registry ---
+# Matches prompts that ask for a post-LLM action. Schedules the action when
+# LLM_TOOL_CALLS_ENABLED is off (the model can't emit tool calls), and keeps
+# such prompts out of the response cache either way.
+# Built from the handlers declared post_llm=True. Their keyword tuples and any
+# extra post_llm_keywords match anywhere in the prompt; as in the fastpath
+# router, their single-word triggers only match the whole utterance and their
+# prefixes its start, so "how do I mute my zoom call" doesn't mute the music.
 POST_LLM_COMMANDS = {
-    # Note: Time is usually handled by LLM, but we add it for completeness.
-    handle_time_query: [
-        ("what", "time"), 
-        ("current", "time"), 
-        ("the", "time")
-    ],
-    
-    handle_program_launch: [
-        ("open", "firefox"), ("launch", "firefox"),
-        ("open", "browser"), ("launch", "browser"),
-        ("open", "brave"), ("launch", "brave"),
-        ("open", "terminal"), ("launch", "terminal"),
-        ("open", "console"), ("launch", "console"),
-        ("open", "code"), ("launch", "code"),
-        ("open", "visual studio"), ("launch", "visual studio"),
-        ("open", "cursor"), ("launch", "cursor"),
-        ("open", "spotify"), ("launch", "spotify")
-    ],
-    
-    handle_web_search: [
-        ("look", "up"),
-        ("search", "for"),
-        ("find", "information on") # Added an extra trigger
-    ],
-    
-    handle_media_control: [
-        # --- Using the same comprehensive list from fastpath ---
-        ("play",), ("pause",), ("resume",), ("stop",), ("next",), ("previous",),
-        ("play", "music"), ("pause", "music"),
-        ("resume", "music"), ("stop", "music"),
-        ("next", "song"), ("previous", "song"),
-        ("last", "song"), ("next", "track"),
-        ("previous", "track"), ("toggle", "music"),
-        ("play", "spotify"), ("pause", "spotify"),
-    ],
-    
-    handle_weather_query: [
-        ("what", "weather"),
-        ("today's", "forecast"),
-        ("the", "weather")
-    ],
-    
-    handle_news_query: [
-        ("what", "news"),
-        ("headlines",),
-        ("top", "story")
-    ]
+    spec.handler: spec.keywords + spec.post_llm_keywords
+    for spec in REGISTRY.post_llm_specs()
+    if spec.keywords or spec.post_llm_keywords
+}
+POST_LLM_SINGLE_WORD_TRIGGERS = {
+    trigger: spec.handler for spec in REGISTRY.post_llm_specs() for trigger in spec.single
+}
+POST_LLM_PREFIX_COMMANDS = {
+    trigger: spec.handler for spec in REGISTRY.post_llm_specs() for trigger in spec.prefixes
 }
+_POST_LLM_ROUTER = IntentRouter(POST_LLM_COMMANDS, POST_LLM_SINGLE_WORD_TRIGGERS, POST_LLM_PREFIX_COMMANDS)
+
+# Politeness before the command itself: "hey lar, can you please play some jazz"
+_REQUEST_LEAD_IN = re.compile(r"^(?:(?:hey\s+)?lar\b[\s,]*)?(?:(?:please|(?:can|could|would|will)\s+you)\b[\s,]*)*")
+
+
+class PostLLMAction(NamedTuple):
+    handler: Callable
+    command: str     # The prompt from the matched trigger onward, as the handlers parse it
+    at_start: bool   # Whether the trigger opens the request (after any lead-in)
+
+
+def _phrase_start(text: str, phrase: str) -> int:
+    """Where `phrase` first appears in `text` as whole tokens, or -1."""
+    tokens = [re.escape(token) for token in tokenize(phrase)]
+    found = re.search(r"(?<![a-z0-9])" + r"[^a-z0-9]+".join(tokens) + r"(?![a-z0-9])", text)
+    return found.start() if found else -1
+
+def match_action(user_prompt: str) -> PostLLMAction | None:
+    """The post-LLM action the prompt asks for, or None."""
+    request = _REQUEST_LEAD_IN.sub("", user_prompt.lower().strip(" .?!,"))
+    match = _POST_LLM_ROUTER.match(request)
+    if match is None:
+        return None
+    start = 0
+    if match.kind == 'keywords':
+        # "could you look up the tides" -> "look up the tides"
+        start = min(position for position in (_phrase_start(request, phrase) for phrase in match.trigger.split(" + "))
+                    if position >= 0)
+    return PostLLMAction(match.handler, request[start:], start == 0)
+
+def is_tool_intent(user_prompt: str) -> bool:
+    """
+    Whether the prompt asks for something a post-LLM handler does ("play some
+    jazz", "what time is it"). Such answers must not be cached: a replayed
+    answer would say "putting on some jazz" without the tool ever running.
+    Only requests that open with the command count, so trivia that merely
+    mentions a trigger ("how do I look up a word") is still cached.
+    """
+    action = match_action(user_prompt)
+    return action is not None and action.at_start
+
+
+# --- Scheduled Post-LLM Actions ---
+action_start_hist = get_histogram("post_llm.prompt_to_action")
+action_run_hist = get_histogram("post_llm.action_run")
+
+class ScheduledAction:
+    """A matched post-LLM action waiting for its turn relative to the spoken answer."""
+    def __init__(self, handler, prompt: str):
+        self.handler = handler
+        self.prompt = prompt
+        self.created = time.perf_counter()
+        self.gate = threading.Event()
 
-def run_post_llm_actions(user_prompt: str):
+    def release(self):
+        """Lets the action run (called once the answer has reached the agreed point)."""
+        self.gate.set()
+
+
+class PostLLMActionScheduler:
     """
-    Iterates through registered commands and executes the first match
-    by calling the appropriate fastpath handler.
+    Matches post-LLM actions as soon as the prompt is known and runs them on
+    one worker thread, in parallel with LLM streaming and TTS.
+
+    Ordering: actions run one at a time in prompt order, and each waits for
+    its gate. With POST_LLM_ACTION_ORDER = "after_first_sentence" the logic
+    worker opens the gate once the first sentence of the answer is queued for
+    TTS (so "Sure, putting on some jazz" is heard before the music starts);
+    with "immediate" it is open from the start. A gate that is never opened
+    (e.g. the LLM hangs) times out after POST_LLM_GATE_TIMEOUT.
+    """
+    def __init__(self, order: str = config.POST_LLM_ACTION_ORDER,
+                 gate_timeout: float = config.POST_LLM_GATE_TIMEOUT):
+        self.order = order
+        self.gate_timeout = gate_timeout
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name="post-llm-actions").start()
+
+    def schedule(self, user_prompt: str) -> ScheduledAction | None:
+        match = match_action(user_prompt)
+        if match is None:
+            return None
+        print(f"[Post-LLM] Matched prompt '{user_prompt}', scheduling {match.handler.__name__}('{match.command}')")
+        # Handlers parse the command as if it had been said on its own
+        action = ScheduledAction(match.handler, match.command)
+        if self.order == "immediate":
+            action.release()
+        self._queue.put(action)
+        return action
 
-    These functions (e.g., handle_media_control) now return None or an 
-    error string, which we will *not* speak, as the LLM has 
-    already handled the verbal response.
+    def _run(self):
+        while True:
+            action = self._queue.get()
+            if not action.gate.wait(self.gate_timeout):
+                print(f"[Post-LLM] Gate for {action.handler.__name__} timed out, running anyway.")
+            start = time.perf_counter()
+            action_start_hist.record(start - action.created)
+            print(f"[Post-LLM] Executing tool: {action.handler.__name__} "
+                  f"({(start - action.created) * 1000:.0f} ms after the prompt)")
+            try:
+                action.handler(action.prompt)
+            except Exception as e:
+                print(f"[Post-LLM] Error executing {action.handler.__name__}: {e}")
+            action_run_hist.record(time.perf_counter() - start)
+
+
+# --- Structured Tool Calls ---
+# Every fastpath handler becomes a tool the LLM can call. Handlers parse plain
+# text, so each tool takes a single "command" argument phrased like something
+# the user would say, with example phrases taken from the handler's triggers.
+MAX_TOOL_EXAMPLES = 6
+
+def build_tool_specs() -> tuple:
+    """Returns (Ollama `tools` list, {tool name: handler}) for the post_llm handlers."""
+    specs, handlers = [], {}
+    for spec in REGISTRY.post_llm_specs():
+        name = spec.name.removeprefix("handle_")
+        handlers[name] = spec.handler
+        phrases = [f"{p} ..." for p in spec.prefixes] + list(spec.single) + [" ".join(k) for k in spec.keywords]
+        examples = ", ".join(f"'{p}'" for p in list(dict.fromkeys(phrases))[:MAX_TOOL_EXAMPLES])
+        specs.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": (spec.doc or name).strip().splitlines()[0],
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "command": {
+                            "type": "string",
+                            "description": f"The command in plain words, e.g. {examples}"
+                        }
+                    },
+                    "required": ["command"]
+                }
+            }
+        })
+    return specs, handlers
+
+TOOLS, TOOL_HANDLERS = build_tool_specs()
+
+
+class ToolCallDispatcher:
+    """
+    Runs tool calls the moment they are parsed from the LLM stream, each on
+    its own thread, so the action happens while the rest of the answer is
+    still being generated and spoken.
     """
-    prompt = user_prompt.lower()
-    
-    for function, keyword_tuples in POST_LLM_COMMANDS.items():
-        for keyword_tuple in keyword_tuples:
-            if all(keyword in prompt for keyword in keyword_tuple):
-                print(f"[Post-LLM] Matched prompt '{prompt}'")
-                print(f"[Post-LLM] Executing tool: {function.__name__}")
-                try:
-                    # Execute the matched function from fastpath
-                    # We don't need the return value for TTS.
-                    function(prompt)
-                except Exception as e:
-                    print(f"[Post-LLM] Error executing {function.__name__}: {e}")
-                return # Stop after first match
\ No newline at end of file
+    def __init__(self, handlers: dict = TOOL_HANDLERS):
+        self.handlers = handlers
+        self.results = []  # (tool name, returned text) in completion order
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def dispatch(self, tool_call: dict):
+        function = tool_call.get("function", {})
+        name = function.get("name", "")
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            # Some models send the arguments as a JSON string
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = {"command": arguments}
+
+        handler = self.handlers.get(name)
+        if handler is None:
+            print(f"[Tools] LLM called unknown tool '{name}', ignoring.")
+            return
+        command = str(arguments.get("command", "")).lower()
+        print(f"[Tools] Executing {name}('{command}')")
+        thread = threading.Thread(target=self._run, args=(name, handler, command), daemon=True,
+                                  name=f"tool-{name}")
+        with self._lock:
+            self._threads.append(thread)
+        thread.start()
+
+    def _run(self, name: str, handler, command: str):
+        try:
+            result = handler(command)
+        except Exception as e:
+            print(f"[Tools] Error executing {name}: {e}")
+            return
+        if result:
+            with self._lock:
+                self.results.append((name, result))
+
+    @property
+    def called(self) -> bool:
+        with self._lock:
+            return bool(self._threads)
+
+    def wait(self, timeout: float) -> list:
+        """Waits (up to `timeout` in total) for every dispatched call; returns the result texts."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            return [result for _, result in self.results]
+
+
+if __name__ == '__main__':
+    # Tool calls are dispatched as soon as they arrive and run concurrently
+    print("--- Tool specs built from the fastpath registry ---")
+    for spec in TOOLS:
+        print(f"{spec['function']['name']:>15}: {spec['function']['parameters']['properties']['command']['description']}")
+
+    # Action prompts stay out of the response cache
+    assert is_tool_intent("Play some jazz") and is_tool_intent("open firefox")
+    assert not is_tool_intent("what is the capital of france")
+    # Single-word triggers are whole utterances, not keywords
+    assert is_tool_intent("mute") and not is_tool_intent("how do I mute my zoom call")
+    assert not is_tool_intent("what does unmute mean")
+    for trivia in ("who will play in the final", "what's the next full moon",
+                   "how do i stop my dog barking", "how do I look up a word"):
+        assert not is_tool_intent(trivia), trivia
+    assert is_tool_intent("can you play some jazz") and is_tool_intent("what time is it")
+
+    # Keyword-fallback actions get the command itself, not the whole request
+    import modules.fastpath.music as music
+
+    class FakeSpotify:
+        def __init__(self):
+            self.played = []
+        def search_track(self, query):
+            return {"uri": f"spotify:track:{query.replace(' ', '-')}", "name": query.title()}
+        def play(self, uris=None):
+            self.played.append(uris)
+
+    spotify = FakeSpotify()
+    music._spotify = lambda: spotify
+    assert match_action("Can you play some jazz?").command == "play some jazz"
+    assert match_action("could you look up the tides").command == "look up the tides"
+    PostLLMActionScheduler(order="immediate").schedule("Can you play some jazz?")
+    deadline = time.monotonic() + 2.0
+    while not spotify.played and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spotify.played == [["spotify:track:some-jazz"]], spotify.played
+    print("keyword fallback played:", spotify.played[0])
+
+    def slow_tool(text):
+        time.sleep(0.5)
+        return f"done: {text}"
+
+    dispatcher = ToolCallDispatcher({"slow": slow_tool})
+    start = time.perf_counter()
+    dispatcher.dispatch({"function": {"name": "slow", "arguments": {"command": "One"}}})
+    dispatcher.dispatch({"function": {"name": "slow", "arguments": '{"command": "two"}'}})
+    dispatcher.dispatch({"function": {"name": "missing", "arguments": {}}})
+    print(f"dispatch returned after {(time.perf_counter() - start) * 1000:.0f} ms")
+    print("results:", dispatcher.wait(2.0), f"after {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,184 @@
+# modules/response_cache.py
+import sys
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: config.py not found.")
+    sys.exit(1)
+
+
+# --- Prompt Normalisation ---
+# Politeness and wake-up words that don't change what is being asked
+FILLER_PHRASES = ("hey lar", "okay lar", "ok lar", "lar", "please", "can you", "could you", "tell me")
+
+# Words that make an answer depend on the conversation so far, or on when it is asked
+CONTEXT_WORDS = {
+    "it", "that", "this", "those", "these", "he", "she", "they", "him", "her", "them",
+    "his", "its", "their", "there", "then", "again", "more", "else", "also", "too",
+    "why", "previous", "last", "earlier", "same", "another", "other", "my", "mine",
+    "we", "us", "our", "today", "tonight", "tomorrow", "yesterday", "now", "current",
+    "latest", "recent", "joke", "random",
+}
+
+_CONTRACTIONS = {"what's": "what is", "who's": "who is", "where's": "where is", "how's": "how is",
+                 "it's": "it is", "you're": "you are", "i'm": "i am", "whats": "what is"}
+
+def normalize_prompt(prompt: str) -> str:
+    """'Hey Lar, what's your name?' -> 'what is your name'"""
+    text = prompt.lower().replace("’", "'")
+    words = [_CONTRACTIONS.get(word, word) for word in re.findall(r"[a-z0-9']+", text)]
+    text = " " + " ".join(words) + " "
+    for phrase in FILLER_PHRASES:
+        text = text.replace(f" {phrase} ", " ")
+    return " ".join(text.split())
+
+def is_history_independent(prompt: str) -> bool:
+    """True if the answer can't depend on earlier turns (or on the time of day)."""
+    words = normalize_prompt(prompt).split()
+    return bool(words) and not any(word in CONTEXT_WORDS for word in words)
+
+def _cosine(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of finished LLM answers, keyed by normalised prompt and
+    persisted as JSON so it survives restarts.
+
+    If `embed_fn` is given, a miss on the exact key falls back to the most
+    similar cached prompt above `similarity_threshold`.
+    """
+    def __init__(self, path: str = config.LLM_CACHE_PATH,
+                 max_entries: int = config.LLM_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = config.LLM_CACHE_TTL_SECONDS,
+                 embed_fn=None,
+                 similarity_threshold: float = config.LLM_CACHE_SIMILARITY):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()  # key -> {"answer", "created", "embedding"}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, prompt: str) -> str | None:
+        if not is_history_independent(prompt):
+            return None
+        key = normalize_prompt(prompt)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["answer"]
+
+        if self.embed_fn:
+            match = self._nearest(key)
+            if match is not None:
+                with self._lock:
+                    if match in self.entries:
+                        self.entries.move_to_end(match)
+                        self.hits += 1
+                        print(f"[Cache] Similar prompt hit: '{key}' ~ '{match}'")
+                        return self.entries[match]["answer"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, prompt: str, answer: str):
+        if not answer or not is_history_independent(prompt):
+            return
+        key = normalize_prompt(prompt)
+        entry = {"answer": answer, "created": time.time()}
+        if self.embed_fn:
+            try:
+                entry["embedding"] = self.embed_fn(key)
+            except Exception as e:
+                print(f"[Cache] Embedding failed, storing exact key only: {e}")
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._save()
+
+    def _nearest(self, key: str) -> str | None:
+        try:
+            query = self.embed_fn(key)
+        except Exception as e:
+            print(f"[Cache] Embedding failed: {e}")
+            return None
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            candidates = [(k, e["embedding"]) for k, e in self.entries.items() if "embedding" in e]
+        for candidate_key, embedding in candidates:
+            score = _cosine(query, embedding)
+            if score >= best_score:
+                best_key, best_score = candidate_key, score
+        return best_key
+
+    def _expire(self, now: float):
+        expired = [k for k, e in self.entries.items() if now - e["created"] > self.ttl_seconds]
+        for key in expired:
+            del self.entries[key]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = OrderedDict(data.get("entries", []))
+            self._expire(time.time())
+            print(f"[Cache] Loaded {len(self.entries)} cached LLM answer(s).")
+        except Exception as e:
+            print(f"[Cache] Could not load {self.path}, starting empty: {e}")
+            self.entries = OrderedDict()
+
+    def _save(self):
+        with self._lock:
+            data = {"entries": list(self.entries.items())}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"[Cache] Could not save {self.path}: {e}")
+
+
+if __name__ == '__main__':
+    import tempfile
+    print("--- Testing Response Cache ---")
+    path = os.path.join(tempfile.mkdtemp(), "cache.json")
+    cache = ResponseCache(path=path, max_entries=2, ttl_seconds=60)
+    cache.put("Hey Lar, what's your name?", "My name is Lar.")
+    print("normalised hit:", cache.get("what is your name please"))
+    print("history-dependent skipped:", cache.get("why is that"), is_history_independent("why is that"))
+    cache.put("who are you", "I am Lar, your helpful AI assistant.")
+    cache.put("who created you", "I was created by Manas Taneja.")
+    print("LRU evicted oldest:", cache.get("what is your name"))
+    print("persisted across restart:", ResponseCache(path=path).get("who created you"))
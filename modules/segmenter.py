@@ -0,0 +1,258 @@
+# modules/segmenter.py
+"""
+Incremental sentence segmentation for streamed LLM output.
+
+Every LLM backend feeds its token stream through a SentenceSegmenter so that
+Piper receives whole sentences as early as possible. Each character is looked
+at once (plus a handful of look-behind characters for abbreviations), and
+chunks are only joined when one may end a sentence, so a long run-on sentence
+costs time proportional to its length, not to its length squared.
+"""
+
+import re
+
+TERMINATORS = ".?!"
+_CANDIDATE = re.compile(r"[.?!\n]")
+# Closing quotes/brackets that belong to the sentence they follow
+CLOSERS = "\"')]”’"
+# Look-behind window for abbreviation checks
+MAX_ABBREVIATION_LENGTH = 12
+
+# Lower-case, without the final period
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "ft", "vs", "etc",
+    "e.g", "i.e", "eg", "ie", "approx", "inc", "ltd", "corp", "dept",
+    "vol", "fig", "u.s", "u.k",
+}
+# Abbreviations only when a number or lower-case word follows ("Dec. 5", "5 p.m. today");
+# "born in Dec. He died" and "at 5 p.m. The sun set" end the sentence.
+DATE_TIME_ABBREVIATIONS = {
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "a.m", "p.m",
+}
+
+
+class SentenceSegmenter:
+    """
+    Feed text chunks in with feed(); complete sentences come out.
+    Call flush() when the stream ends to get whatever is left.
+
+    A terminator only ends a sentence once the following characters have
+    arrived, which is how "3.5", "example.com" and "Dr. Smith" stay whole.
+    """
+    def __init__(self):
+        self._chunks = []  # Text of the current sentence, joined only when it may end
+        self._length = 0   # Total length of _chunks
+        self._start = 0    # Start of the current sentence in the joined buffer
+        self._scan = 0     # Next index in the buffer that hasn't been examined
+
+    def feed(self, text: str) -> list:
+        if not text:
+            return []
+        self._chunks.append(text)
+        self._length += len(text)
+        if self._scan == self._length - len(text) and not _CANDIDATE.search(text):
+            # Nothing waiting for look-ahead and nothing that could end a sentence
+            self._scan = self._length
+            return []
+        buf = "".join(self._chunks)
+        n = len(buf)
+        i = self._scan
+        sentences = []
+
+        while i < n:
+            # Jump straight to the next character that could end a sentence
+            match = _CANDIDATE.search(buf, i)
+            if match is None:
+                i = n
+                break
+            i = match.start()
+            ch = buf[i]
+
+            # A newline ends a sentence/list item even without punctuation
+            if ch == "\n":
+                self._emit(buf, i, sentences)
+                self._start = i + 1
+                i += 1
+                continue
+
+            # Take the whole run of terminators and any closing quotes
+            j = i
+            while j < n and buf[j] in TERMINATORS:
+                j += 1
+            while j < n and buf[j] in CLOSERS:
+                j += 1
+            if j >= n:
+                break  # Can't decide yet, resume from i on the next chunk
+            if not buf[j].isspace():
+                i = j  # "3.5", "example.com", "e.g" - not a boundary
+                continue
+
+            # Look past the whitespace at the first character of what follows
+            k = j
+            while k < n and buf[k] in " \t":
+                k += 1
+            if k >= n:
+                break
+            if buf[k] == "\n" or self._is_boundary(buf, i, j, k):
+                self._emit(buf, j, sentences)
+                self._start = k
+            i = k
+
+        # Drop everything already emitted so the buffer only holds the current sentence
+        rest = buf[self._start:]
+        self._chunks = [rest] if rest else []
+        self._length = len(rest)
+        self._scan = i - self._start
+        self._start = 0
+        return sentences
+
+    def flush(self) -> str | None:
+        """Returns the unterminated tail of the stream (if any) and resets."""
+        tail = "".join(self._chunks).strip()
+        self._chunks = []
+        self._length = 0
+        self._start = 0
+        self._scan = 0
+        return tail or None
+
+    def _emit(self, buf: str, end: int, sentences: list):
+        sentence = buf[self._start:end].strip()
+        if sentence:
+            sentences.append(sentence)
+
+    def _is_boundary(self, buf: str, i: int, j: int, k: int) -> bool:
+        """i: first terminator, j: first whitespace after it, k: first character after that."""
+        run = buf[i:j]
+        if "?" in run or "!" in run:
+            return True
+
+        next_char = buf[k]
+        if run.startswith(".."):
+            # Ellipsis: a pause mid-sentence unless a new sentence clearly starts
+            return next_char.isupper()
+
+        # A single period. Find the word it's attached to.
+        w = i
+        while w > self._start and i - w < MAX_ABBREVIATION_LENGTH and not buf[w - 1].isspace():
+            w -= 1
+        word = buf[w:i].lower().lstrip("\"'([")
+        if word in ABBREVIATIONS:
+            return False
+        if word in DATE_TIME_ABBREVIATIONS and next_char.isdigit():
+            return False  # "Dec. 25"; a lower-case word is handled below
+        if len(word) == 1 and word.isalpha():
+            return False  # An initial, as in "J. R. R. Tolkien"
+        if word.isdigit() and not buf[self._start:w].strip():
+            return False  # A list marker, as in "1. Preheat the oven"
+        if next_char.islower():
+            return False  # "approx. five" - unknown abbreviation, keep going
+        return True
+
+
+def split_sentences(text: str) -> list:
+    """Segments a complete piece of text, e.g. a cached answer."""
+    segmenter = SentenceSegmenter()
+    sentences = segmenter.feed(text)
+    tail = segmenter.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+# --- Test Corpus ---
+CORPUS = [
+    ("Hello there. How are you?", ["Hello there.", "How are you?"]),
+    ("Pi is roughly 3.14. That's close enough!", ["Pi is roughly 3.14.", "That's close enough!"]),
+    ("Dr. Smith will see you now. Please wait.", ["Dr. Smith will see you now.", "Please wait."]),
+    ("Bring snacks, e.g. chips or fruit. Thanks!", ["Bring snacks, e.g. chips or fruit.", "Thanks!"]),
+    ("Visit example.com for more. It's free.", ["Visit example.com for more.", "It's free."]),
+    ("Well... maybe not. Yes.", ["Well... maybe not.", "Yes."]),
+    ("I waited... Nothing happened.", ["I waited...", "Nothing happened."]),
+    ("Really?! That's amazing.", ["Really?!", "That's amazing."]),
+    ("He said \"stop.\" Then he left.", ["He said \"stop.\"", "Then he left."]),
+    ("J. R. R. Tolkien wrote it. Great book.", ["J. R. R. Tolkien wrote it.", "Great book."]),
+    ("It weighs approx. five kilos. Heavy.", ["It weighs approx. five kilos.", "Heavy."]),
+    ("The U.S. economy grew 2.5% in 2024. Nice.", ["The U.S. economy grew 2.5% in 2024.", "Nice."]),
+    ("1. Preheat the oven.\n2. Add the flour.", ["1. Preheat the oven.", "2. Add the flour."]),
+    ("No terminator at the end", ["No terminator at the end"]),
+    ("Version 1.2.3 is out. Update now.", ["Version 1.2.3 is out.", "Update now."]),
+    ("The answer is no. It is yes.", ["The answer is no.", "It is yes."]),
+    ("No. I do not think so.", ["No.", "I do not think so."]),
+    ("He was born in Dec. He died later.", ["He was born in Dec.", "He died later."]),
+    ("It was 5 p.m. The sun set.", ["It was 5 p.m.", "The sun set."]),
+    ("It opens on Dec. 25 this year. Come early.", ["It opens on Dec. 25 this year.", "Come early."]),
+    ("We met at 5 p.m. yesterday. It rained.", ["We met at 5 p.m. yesterday.", "It rained."]),
+]
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    def legacy_split_stream(chunks):
+        """The splitter query_llm_stream used to have, kept here for comparison."""
+        sentence_buffer = ""
+        out = []
+        for chunk_text in chunks:
+            sentence_buffer += chunk_text
+            if any(p in sentence_buffer for p in ['.', '?', '!']):
+                processed_buffer = sentence_buffer.replace('?', '?|').replace('!', '!|').replace('.', '.|')
+                parts = processed_buffer.split('|')
+                for i in range(len(parts) - 1):
+                    if parts[i].strip():
+                        out.append(parts[i].strip())
+                sentence_buffer = parts[-1]
+        if sentence_buffer.strip():
+            out.append(sentence_buffer.strip())
+        return out
+
+    def segment_stream(chunks):
+        segmenter = SentenceSegmenter()
+        out = []
+        for chunk in chunks:
+            out.extend(segmenter.feed(chunk))
+        tail = segmenter.flush()
+        if tail:
+            out.append(tail)
+        return out
+
+    def tokenize(text, rng):
+        """Splits text into 1-5 character chunks, roughly like LLM tokens."""
+        chunks, pos = [], 0
+        while pos < len(text):
+            step = rng.randint(1, 5)
+            chunks.append(text[pos:pos + step])
+            pos += step
+        return chunks
+
+    print("--- Testing Sentence Segmenter ---")
+    rng = random.Random(0)
+    failures = 0
+    for text, expected in CORPUS:
+        # Every case must hold both whole and when streamed in random chunks
+        failed = False
+        for label, got in (("whole", split_sentences(text)), ("streamed", segment_stream(tokenize(text, rng)))):
+            if got != expected:
+                failed = True
+                print(f"FAIL ({label}): {text!r}\n  expected {expected}\n  got      {got}")
+        failures += failed
+    print(f"{len(CORPUS) - failures}/{len(CORPUS)} corpus cases passed (whole and streamed).")
+
+    print("--- Micro-benchmark ---")
+    short_answer = tokenize(" ".join(text for text, _ in CORPUS), rng)
+    # A long answer with few terminators is the worst case for the old splitter
+    long_answer = tokenize(("and then, after that, it went on " * 400) + "until it stopped.", rng)
+    for name, chunks in (("short answer", short_answer), ("long run-on answer", long_answer)):
+        runs = 20
+        legacy = timeit.timeit(lambda: legacy_split_stream(chunks), number=runs) / runs
+        new = timeit.timeit(lambda: segment_stream(chunks), number=runs) / runs
+        print(f"{name:>20} ({len(chunks)} chunks): legacy {legacy * 1000:.2f} ms, segmenter {new * 1000:.2f} ms")
+
+    # Ten times the run-on text should take about ten times as long, not a hundred
+    longer_answer = tokenize(("and then, after that, it went on " * 4000) + "until it stopped.", rng)
+    base = timeit.timeit(lambda: segment_stream(long_answer), number=20) / 20
+    longer = timeit.timeit(lambda: segment_stream(longer_answer), number=5) / 5
+    print(f"run-on x10: {longer / base:.1f}x the time")
+
+    raise SystemExit(1 if failures else 0)
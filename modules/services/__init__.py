@@ -0,0 +1,5 @@
+# modules/services/__init__.py
+
+# Long-lived background data services (weather, news, ...). Each keeps its
+# data in memory and refreshes it off the request path, so fastpath handlers
+# answer from memory instead of waiting on the network.
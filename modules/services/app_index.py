@@ -0,0 +1,302 @@
+# modules/services/app_index.py
+import sys
+import os
+import re
+import json
+import shlex
+import difflib
+import threading
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: app_index.py could not import config.")
+    sys.exit(1)
+
+APP_INDEX_CACHE_VERSION = 1
+
+# Exec= field codes (%u, %F, ...) that the launcher would substitute
+_FIELD_CODE = re.compile(r"^%[a-zA-Z]$")
+
+
+def normalize_name(name: str) -> str:
+    """'Visual Studio Code' / 'gnome-terminal' -> 'visual studio code' / 'gnome terminal'"""
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+def xdg_application_dirs() -> list:
+    """XDG application directories, highest priority first."""
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":")
+    dirs = [data_home] + data_dirs + [
+        os.path.expanduser("~/.local/share/flatpak/exports/share"),
+        "/var/lib/flatpak/exports/share",
+        "/var/lib/snapd/desktop",
+    ]
+    seen, result = set(), []
+    for base in dirs:
+        path = os.path.join(base, "applications")
+        if base and path not in seen:
+            seen.add(path)
+            result.append(path)
+    return result
+
+
+def executable_dirs() -> list:
+    return [d for d in dict.fromkeys(os.environ.get("PATH", "").split(os.pathsep)) if d]
+
+
+def parse_desktop_file(path: str) -> dict | None:
+    """The launchable bits of a .desktop file, or None if it shouldn't be offered."""
+    fields, in_entry = {}, False
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                    continue
+                if in_entry and "=" in line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    fields.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+    if fields.get("Type") != "Application" or not fields.get("Exec") or not fields.get("Name"):
+        return None
+    if fields.get("NoDisplay") == "true" or fields.get("Hidden") == "true":
+        return None
+    try:
+        argv = [arg for arg in shlex.split(fields["Exec"]) if not _FIELD_CODE.match(arg)]
+    except ValueError:
+        return None
+    if not argv:
+        return None
+    return {"id": os.path.basename(path)[:-len(".desktop")], "name": fields["Name"],
+            "generic": fields.get("GenericName", ""), "argv": argv}
+
+
+def _scan_desktop_dir(directory: str) -> list:
+    apps = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith(".desktop"):
+            app = parse_desktop_file(os.path.join(directory, entry))
+            if app:
+                apps.append(app)
+    return apps
+
+def _scan_path_dir(directory: str) -> list:
+    names = []
+    for entry in sorted(os.listdir(directory)):
+        full = os.path.join(directory, entry)
+        if os.access(full, os.X_OK) and os.path.isfile(full):
+            names.append(entry)
+    return names
+
+def _mtime(directory: str) -> int | None:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+class AppIndex:
+    """
+    Every launchable application from XDG .desktop files, with a lookup
+    table from spoken names to a command line. $PATH is only used to find
+    the programs behind desktop entries, plus the few executables allowed
+    by name in `path_allowlist`; "shutdown" or "rm" never resolve.
+
+    Each directory's scan is cached on disk with the directory's mtime; on
+    load only directories whose mtime changed (something was installed or
+    removed) are rescanned. resolve() is a dict lookup on aliases, then on
+    names (desktop Name, desktop id, executable name, then GenericName),
+    then falls back to the closest desktop-entry name by difflib ratio.
+    Executables are resolved against $PATH when the index is built, not on
+    every launch.
+    """
+    def __init__(self, desktop_dirs: list | None = None, path_dirs: list | None = None,
+                 cache_path: str = config.APP_INDEX_CACHE_PATH,
+                 aliases: dict = config.APP_ALIASES,
+                 path_allowlist: tuple = config.APP_PATH_ALLOWLIST,
+                 fuzzy_cutoff: float = config.APP_FUZZY_CUTOFF):
+        self.desktop_dirs = desktop_dirs if desktop_dirs is not None else xdg_application_dirs()
+        self.path_dirs = path_dirs if path_dirs is not None else executable_dirs()
+        self.cache_path = cache_path
+        self.aliases = {normalize_name(k): normalize_name(v) for k, v in aliases.items()}
+        self.path_allowlist = tuple(path_allowlist)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.names = {}          # normalised spoken name -> app dict
+        self.desktop_names = []  # The names fuzzy matching may pick from
+        self.rescanned = []
+        self._lock = threading.Lock()
+
+    def load(self) -> "AppIndex":
+        """Reads the cache, rescans changed directories and rebuilds the lookup table."""
+        cached = {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == APP_INDEX_CACHE_VERSION:
+                cached = data["dirs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        dirs, rescanned = {}, []
+        for kind, directories, scan in (("desktop", self.desktop_dirs, _scan_desktop_dir),
+                                        ("path", self.path_dirs, _scan_path_dir)):
+            for directory in directories:
+                mtime = _mtime(directory)
+                if mtime is None:
+                    continue
+                key = f"{kind}:{directory}"
+                entry = cached.get(key)
+                if entry is None or entry["mtime"] != mtime:
+                    try:
+                        entry = {"mtime": mtime, "items": scan(directory)}
+                    except OSError:
+                        continue
+                    rescanned.append(directory)
+                dirs[key] = entry
+
+        if rescanned or set(dirs) != set(cached):
+            self._save(dirs)
+        self.rescanned = rescanned
+        names, desktop_names = self._build(dirs)
+        with self._lock:
+            self.names, self.desktop_names = names, desktop_names
+        return self
+
+    def _build(self, dirs: dict) -> tuple:
+        executables = {}  # name -> absolute path, first $PATH entry wins
+        for directory in self.path_dirs:
+            for name in dirs.get(f"path:{directory}", {}).get("items", ()):
+                executables.setdefault(name, os.path.join(directory, name))
+
+        names, generic, seen_ids = {}, {}, set()
+        for directory in self.desktop_dirs:
+            for app in dirs.get(f"desktop:{directory}", {}).get("items", ()):
+                if app["id"] in seen_ids:
+                    continue  # Shadowed by a higher-priority directory
+                seen_ids.add(app["id"])
+                program = app["argv"][0]
+                if not os.path.isabs(program):
+                    if program not in executables:
+                        continue  # Not actually installed
+                    program = executables[program]
+                launch = {"name": app["name"], "argv": [program] + app["argv"][1:]}
+                for spoken in (app["name"], app["id"], app["id"].split(".")[-1],
+                               os.path.basename(app["argv"][0])):
+                    names.setdefault(normalize_name(spoken), launch)
+                if app["generic"]:
+                    generic.setdefault(normalize_name(app["generic"]), launch)
+
+        for name, launch in generic.items():
+            names.setdefault(name, launch)
+        names.pop("", None)
+        desktop_names = list(names)
+        for name in self.path_allowlist:
+            if name in executables:
+                names.setdefault(normalize_name(name), {"name": name, "argv": [executables[name]]})
+        return names, desktop_names
+
+    def _save(self, dirs: dict):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": APP_INDEX_CACHE_VERSION, "dirs": dirs}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"[Apps] Could not write app index cache: {e}")
+
+    def resolve(self, spoken: str) -> dict | None:
+        """{'name': ..., 'argv': [...]} for a spoken app name, or None."""
+        key = normalize_name(spoken)
+        with self._lock:
+            names, desktop_names = self.names, self.desktop_names
+        # An alias whose target isn't installed falls through to the name itself
+        app = names.get(self.aliases.get(key, key)) or names.get(key)
+        if app is None and key:
+            close = difflib.get_close_matches(key, desktop_names, n=1, cutoff=self.fuzzy_cutoff)
+            if close:
+                print(f"[Apps] Fuzzy match: '{key}' ~ '{close[0]}'")
+                app = names[close[0]]
+        return app
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_app_index() -> AppIndex:
+    """The shared app index, loaded on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AppIndex().load()
+        return _index
+
+
+if __name__ == '__main__':
+    # Test with a fake XDG tree and $PATH: cold build, cached load, incremental rescan
+    import tempfile
+    import time
+    root = tempfile.mkdtemp()
+    user_apps, system_apps, bin_dir = (os.path.join(root, d) for d in ("user", "system", "bin"))
+    for directory in (user_apps, system_apps, bin_dir):
+        os.makedirs(directory)
+
+    def executable(name):
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(path, 0o755)
+
+    def desktop(directory, file_id, name, exec_line, generic=""):
+        with open(os.path.join(directory, f"{file_id}.desktop"), "w") as f:
+            f.write(f"[Desktop Entry]\nType=Application\nName={name}\nExec={exec_line}\n"
+                    + (f"GenericName={generic}\n" if generic else ""))
+
+    for name in ("brave", "gnome-terminal", "cursor", "libreoffice", "htop",
+                 "shutdown", "reboot", "rm", "killall"):
+        executable(name)
+    desktop(system_apps, "brave-browser", "Brave Web Browser", "brave %U", "Web Browser")
+    desktop(system_apps, "org.gnome.Terminal", "Terminal", "gnome-terminal")
+    desktop(system_apps, "libreoffice-writer", "LibreOffice Writer", "libreoffice --writer %U")
+    desktop(system_apps, "missing", "Not Installed", "no-such-binary")
+    desktop(user_apps, "cursor", "Cursor", "cursor --no-sandbox %F")
+
+    print("--- Testing App Index ---")
+    cache_path = os.path.join(root, "app_index.json")
+    index = AppIndex([user_apps, system_apps], [bin_dir], cache_path=cache_path, path_allowlist=("htop",))
+    start = time.perf_counter()
+    index.load()
+    print(f"cold build: {(time.perf_counter() - start) * 1000:.1f} ms, rescanned {len(index.rescanned)} dirs")
+    start = time.perf_counter()
+    index.load()
+    print(f"cached load: {(time.perf_counter() - start) * 1000:.1f} ms, rescanned {len(index.rescanned)} dirs")
+
+    for spoken in ("brave", "terminal", "libreoffice writer", "libre office writer", "web browser",
+                   "code", "htop", "not installed", "photoshop"):
+        app = index.resolve(spoken)
+        print(f"  {spoken!r:24} -> {app and app['argv']}")
+    # Bare $PATH executables are never offered, nor fuzzy-matched
+    for spoken in ("shutdown", "reboot", "rm", "kill all", "killall"):
+        assert index.resolve(spoken) is None, (spoken, index.resolve(spoken))
+    print("  shutdown/reboot/rm/kill all -> None")
+
+    time.sleep(0.01)
+    executable("gimp")
+    desktop(system_apps, "gimp", "GNU Image Manipulation Program", "gimp %U")
+    index.load()
+    print(f"after installing gimp: rescanned {[os.path.basename(d) for d in index.rescanned]}, "
+          f"'image manipulation program' -> {index.resolve('gnu image manipulation program')['argv']}")
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        index.resolve("terminal")
+    print(f"resolve: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us per lookup")
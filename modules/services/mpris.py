@@ -0,0 +1,201 @@
+# modules/services/mpris.py
+import sys
+import os
+import subprocess
+import threading
+import time
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: mpris.py could not import config.")
+    sys.exit(1)
+
+# Optional: without jeepney, readiness falls back to polling playerctl
+try:
+    from jeepney import MatchRule, message_bus
+    from jeepney.io.blocking import open_dbus_connection
+except ImportError:
+    open_dbus_connection = None
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2"
+
+
+def _player_of(bus_name: str) -> str | None:
+    """'org.mpris.MediaPlayer2.spotify.instance42' -> 'spotify'"""
+    if not bus_name.startswith(MPRIS_PREFIX + "."):
+        return None
+    return bus_name[len(MPRIS_PREFIX) + 1:].split(".")[0]
+
+
+class MprisWatcher:
+    """
+    Tracks which MPRIS media players are on the session bus.
+
+    One background thread holds a D-Bus connection, reads the current MPRIS
+    names once, then follows NameOwnerChanged signals for the
+    org.mpris.MediaPlayer2 namespace. is_running() is a set lookup and
+    wait_for() wakes the moment the player's name appears, with no polling
+    and no subprocesses. If jeepney or the session bus is unavailable, both
+    fall back to `playerctl status`.
+    """
+    def __init__(self, bus: str = "SESSION"):
+        self.bus = bus
+        self.players = {}   # player -> set of its bus names
+        self.connected = False
+        self._ready = threading.Event()
+        self._changed = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self) -> "MprisWatcher":
+        if self._thread is None:
+            if open_dbus_connection is None:
+                print("[MPRIS] jeepney not installed; falling back to playerctl polling.")
+                self._ready.set()
+            else:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="mpris-watcher")
+                self._thread.start()
+                self._ready.wait(2.0)
+        return self
+
+    def stop(self):
+        self._stopped = True
+
+    def _run(self):
+        try:
+            connection = open_dbus_connection(bus=self.bus)
+        except Exception as e:
+            print(f"[MPRIS] Could not connect to the {self.bus.lower()} bus; falling back to playerctl: {e}")
+            self._ready.set()
+            return
+        rule = MatchRule(type="signal", sender="org.freedesktop.DBus", interface="org.freedesktop.DBus",
+                         member="NameOwnerChanged", path="/org/freedesktop/DBus")
+        rule.add_arg_condition(0, MPRIS_PREFIX, kind="namespace")
+        with connection, connection.filter(rule) as signals:
+            # Subscribe before listing, so a player appearing in between isn't missed
+            connection.send_and_get_reply(message_bus.AddMatch(rule))
+            names = connection.send_and_get_reply(message_bus.ListNames()).body[0]
+            for name in names:
+                self._update(name, present=True)
+            self.connected = True
+            self._ready.set()
+            while not self._stopped:
+                try:
+                    message = connection.recv_until_filtered(signals, timeout=1.0)
+                except TimeoutError:
+                    continue
+                except Exception as e:
+                    print(f"[MPRIS] Lost the bus connection: {e}")
+                    break
+                name, _old_owner, new_owner = message.body
+                self._update(name, present=bool(new_owner))
+        self.connected = False
+
+    def _update(self, bus_name: str, present: bool):
+        player = _player_of(bus_name)
+        if player is None:
+            return
+        with self._changed:
+            names = self.players.setdefault(player, set())
+            if present:
+                names.add(bus_name)
+            else:
+                names.discard(bus_name)
+                if not names:
+                    del self.players[player]
+            self._changed.notify_all()
+
+    def is_running(self, player: str) -> bool:
+        if not self.connected:
+            return self._playerctl_status(player)
+        with self._changed:
+            return player in self.players
+
+    def wait_for(self, player: str, timeout: float) -> bool:
+        """Blocks until `player` is on the bus (True) or `timeout` passes (False)."""
+        if not self.connected:
+            return self._poll_playerctl(player, timeout)
+        with self._changed:
+            return self._changed.wait_for(lambda: player in self.players, timeout)
+
+    # --- Fallback without D-Bus access ---
+
+    @staticmethod
+    def _playerctl_status(player: str) -> bool:
+        try:
+            result = subprocess.run(["playerctl", f"--player={player}", "status"],
+                                    capture_output=True, timeout=2, check=False)
+            return result.returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    def _poll_playerctl(self, player: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._playerctl_status(player):
+                return True
+            time.sleep(1)
+        return False
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_mpris_watcher() -> MprisWatcher:
+    """The shared, started MPRIS watcher."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = MprisWatcher().start()
+        return _watcher
+
+
+if __name__ == '__main__':
+    # Test against a private dbus-daemon with a fake player that claims its
+    # MPRIS name after a delay, like Spotify finishing its startup.
+    import tempfile
+    if open_dbus_connection is None:
+        print("jeepney is not installed; nothing to test.")
+        sys.exit(0)
+
+    config_path = os.path.join(tempfile.mkdtemp(), "session.conf")
+    with open(config_path, "w") as f:
+        f.write('<busconfig><type>session</type><listen>unix:tmpdir=/tmp</listen>'
+                '<policy context="default"><allow send_destination="*" eavesdrop="true"/>'
+                '<allow eavesdrop="true"/><allow own="*"/></policy></busconfig>')
+    daemon = subprocess.Popen(["dbus-daemon", f"--config-file={config_path}", "--nofork", "--print-address"],
+                              stdout=subprocess.PIPE, text=True)
+    address = daemon.stdout.readline().strip()
+
+    def fake_player(delay: float, hold: float):
+        time.sleep(delay)
+        with open_dbus_connection(bus=address) as player:
+            claimed["at"] = time.perf_counter()
+            player.send_and_get_reply(message_bus.RequestName(f"{MPRIS_PREFIX}.spotify.instance1234"))
+            time.sleep(hold)
+
+    print("--- Testing MPRIS Watcher ---")
+    try:
+        watcher = MprisWatcher(bus=address).start()
+        print("connected:", watcher.connected, "| spotify running:", watcher.is_running("spotify"))
+
+        claimed = {}
+        threading.Thread(target=fake_player, args=(0.5, 1.0), daemon=True).start()
+        start = time.perf_counter()
+        ready = watcher.wait_for("spotify", timeout=5)
+        woke = time.perf_counter()
+        print(f"ready={ready} after {woke - start:.2f}s, "
+              f"{(woke - claimed['at']) * 1000:.1f} ms after the player requested its name")
+
+        time.sleep(1.3)  # The fake player disconnects
+        print("after the player quit, running:", watcher.is_running("spotify"))
+        print("wait_for times out when nothing appears:", watcher.wait_for("vlc", timeout=0.3))
+        watcher.stop()
+    finally:
+        daemon.terminate()
@@ -0,0 +1,227 @@
+# modules/services/news.py
+import sys
+import os
+import re
+import threading
+import time
+import requests
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: news.py could not import config.")
+    sys.exit(1)
+
+fetch_hist = get_histogram("news.fetch")
+parse_hist = get_histogram("news.parse")
+
+
+def _headline_key(title: str) -> str:
+    """Same story from two feeds (or with different punctuation) gets the same key."""
+    return " ".join(re.findall(r"[a-z0-9]+", title.lower()))
+
+
+class Headline:
+    __slots__ = ("title", "feed", "published", "key")
+
+    def __init__(self, title: str, feed: str, published: float):
+        self.title = title
+        self.feed = feed
+        self.published = published
+        self.key = _headline_key(title)
+
+
+class NewsService:
+    """
+    Polls the configured RSS feeds in the background and keeps a compact,
+    deduplicated list of headlines in memory, newest first.
+
+    Each poll is a conditional GET (If-None-Match / If-Modified-Since from the
+    previous response), so an unchanged feed costs a 304 and no parsing.
+    A cursor supports "next headline" without refetching; asking for the top
+    headline again resets it.
+    """
+    def __init__(self, feeds: list = config.NEWS_FEEDS,
+                 poll_interval: float = config.NEWS_POLL_INTERVAL,
+                 timeout: float = config.NEWS_TIMEOUT,
+                 max_headlines: int = config.NEWS_MAX_HEADLINES):
+        self.feeds = list(feeds)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_headlines = max_headlines
+        self.session = requests.Session()
+        self.validators = {}   # feed url -> {"etag": ..., "last_modified": ...}
+        self.headlines = []    # Headline objects, newest first
+        self.not_modified = 0
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "NewsService":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="news-service")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.session.close()
+
+    def _run(self):
+        self.poll()
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+
+    def poll(self, wait: bool = False) -> bool:
+        """Polls every feed once. Returns True if any feed had new content."""
+        if not self._poll_lock.acquire(blocking=wait):
+            return False  # A poll is already running
+        try:
+            changed = False
+            for url in self.feeds:
+                changed |= self._poll_feed(url)
+            return changed
+        finally:
+            self._poll_lock.release()
+
+    def _poll_feed(self, url: str) -> bool:
+        headers = {}
+        validators = self.validators.get(url, {})
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            fetch_hist.record(time.perf_counter() - start)
+            if response.status_code == 304:
+                self.not_modified += 1
+                return False
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"[News] Fetching {url} failed, keeping cached headlines: {e}")
+            return False
+
+        self.validators[url] = {"etag": response.headers.get("ETag"),
+                                "last_modified": response.headers.get("Last-Modified")}
+        import feedparser  # Deferred: keeps it off the startup import path
+        start = time.perf_counter()
+        feed = feedparser.parse(response.content)
+        entries = []
+        for entry in feed.entries:
+            title = entry.get("title", "").strip()
+            if not title:
+                continue
+            published = entry.get("published_parsed") or entry.get("updated_parsed")
+            entries.append(Headline(title, url, time.mktime(published) if published else 0.0))
+        parse_hist.record(time.perf_counter() - start)
+        self._merge(url, entries)
+        return True
+
+    def _merge(self, url: str, entries: list):
+        with self._lock:
+            current = self.headlines[self._cursor] if self._cursor < len(self.headlines) else None
+            # This feed's old entries are replaced; other feeds' entries stay
+            merged = [h for h in self.headlines if h.feed != url] + entries
+            merged.sort(key=lambda h: h.published, reverse=True)  # Stable: feed order breaks ties
+            seen, deduped = set(), []
+            for headline in merged:
+                if headline.key not in seen:
+                    seen.add(headline.key)
+                    deduped.append(headline)
+            self.headlines = deduped[:self.max_headlines]
+            # Keep the reader's place if their headline is still there
+            self._cursor = 0
+            if current is not None:
+                for index, headline in enumerate(self.headlines):
+                    if headline.key == current.key:
+                        self._cursor = index
+                        break
+
+    def top_headline(self) -> str | None:
+        with self._lock:
+            self._cursor = 0
+            return self.headlines[0].title if self.headlines else None
+
+    def next_headline(self) -> str | None:
+        """The headline after the last one read, or None at the end of the list."""
+        with self._lock:
+            if self._cursor + 1 >= len(self.headlines):
+                return None
+            self._cursor += 1
+            return self.headlines[self._cursor].title
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_news_service() -> NewsService:
+    """The shared, started news service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = NewsService().start()
+        return _service
+
+
+if __name__ == '__main__':
+    # Test against local stub feeds: conditional requests, dedup, navigation
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def rss(titles):
+        items = "".join(
+            f"<item><title>{title}</title><pubDate>Mon, 0{6 - i} Jan 2025 10:00:00 GMT</pubDate></item>"
+            for i, title in enumerate(titles))
+        return f'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>{items}</channel></rss>'.encode()
+
+    FEEDS = {
+        "/world": rss(["Storm hits coast", "Election results announced", "New species found"]),
+        "/uk": rss(["Election results announced.", "Trains delayed by snow"]),
+    }
+    stats = {"full": 0, "304": 0}
+
+    class StubFeeds(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            etag = f'"{hash(FEEDS[self.path]) & 0xffff:x}"'
+            if self.headers.get("If-None-Match") == etag:
+                stats["304"] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            stats["full"] += 1
+            body = FEEDS[self.path]
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFeeds)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print("--- Testing News Service ---")
+    service = NewsService(feeds=[base + "/world", base + "/uk"], poll_interval=3600)
+    service.poll()
+    print("stored:", [h.title for h in service.headlines])
+    print("top:", service.top_headline())
+    print("next:", service.next_headline())
+    print("next:", service.next_headline())
+    print("changed on re-poll:", service.poll(), f"(full fetches {stats['full']}, 304s {stats['304']})")
+    print("next after re-poll:", service.next_headline())
+    print(f"fetch: {fetch_hist.summary()}")
+    print(f"parse: {parse_hist.summary()}")
+    service.stop()
@@ -0,0 +1,381 @@
+# modules/services/spotify.py
+import sys
+import os
+import threading
+import time
+import requests
+import spotipy
+from spotipy.oauth2 import SpotifyOAuth
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+    from modules.services.spotify_search import SpotifySearchCache
+except ImportError:
+    print("Error: spotify.py could not import config.")
+    sys.exit(1)
+
+api_hist = get_histogram("spotify.api")
+
+
+class PlaybackState:
+    """What Spotify was last known to be doing, from the API or from our own commands."""
+    def __init__(self, is_playing: bool = False, volume: int | None = None, device_id: str | None = None,
+                 device_name: str | None = None, track: str | None = None):
+        self.is_playing = is_playing
+        self.volume = volume
+        self.device_id = device_id
+        self.device_name = device_name
+        self.track = track
+        self.updated_at = time.monotonic()
+
+    @classmethod
+    def from_api(cls, playback: dict | None) -> "PlaybackState":
+        if not playback or not playback.get("device"):
+            return cls()  # Nothing is playing anywhere
+        device = playback["device"]
+        item = playback.get("item") or {}
+        return cls(bool(playback.get("is_playing")), device.get("volume_percent"),
+                   device.get("id"), device.get("name"), item.get("name"))
+
+    def has_device(self) -> bool:
+        return self.device_id is not None
+
+    def age(self) -> float:
+        return time.monotonic() - self.updated_at
+
+
+class SpotifyService:
+    """
+    A Spotify client that remembers playback and device state, so commands
+    don't have to ask Spotify first.
+
+    A background thread re-reads the playback state every `poll_interval`
+    seconds (to notice changes made from other devices) and refreshes the
+    OAuth token `token_margin` seconds before it expires, so no command pays
+    for a token refresh. Each successful command also updates the cached
+    state straight away. All requests share one pooled requests.Session.
+    """
+    def __init__(self, auth_manager: SpotifyOAuth | None = None, api_prefix: str | None = None,
+                 poll_interval: float = config.SPOTIFY_POLL_INTERVAL,
+                 max_state_age: float = config.SPOTIFY_STATE_MAX_AGE,
+                 token_margin: float = config.SPOTIFY_TOKEN_REFRESH_MARGIN,
+                 timeout: float = config.SPOTIFY_TIMEOUT,
+                 search_cache: SpotifySearchCache | None = None):
+        self.session = requests.Session()
+        self.auth_manager = auth_manager
+        self.search_cache = search_cache if search_cache is not None else SpotifySearchCache()
+        self.api_prefix = api_prefix
+        self.poll_interval = poll_interval
+        self.max_state_age = max_state_age
+        self.token_margin = token_margin
+        self.timeout = timeout
+        self.client = None
+        self.state = None
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    # --- Connection and token ---
+
+    def _build_auth_manager(self) -> SpotifyOAuth | None:
+        if not all([config.SPOTIPY_CLIENT_ID, config.SPOTIPY_CLIENT_SECRET, config.SPOTIPY_REDIRECT_URI]):
+            print("[Spotify] Error: Missing SPOTIPY credentials in config.py or .env")
+            return None
+        return SpotifyOAuth(
+            client_id=config.SPOTIPY_CLIENT_ID,
+            client_secret=config.SPOTIPY_CLIENT_SECRET,
+            redirect_uri=config.SPOTIPY_REDIRECT_URI,
+            scope=config.SPOTIPY_SCOPE,
+            cache_path=config.SPOTIPY_CACHE_PATH,
+            requests_session=self.session,
+            requests_timeout=self.timeout
+        )
+
+    def has_cached_token(self) -> bool:
+        """Whether connect() can succeed without the interactive browser login."""
+        if self.auth_manager is None:
+            self.auth_manager = self._build_auth_manager()
+        return self.auth_manager is not None and self.auth_manager.cache_handler.get_cached_token() is not None
+
+    def connect(self) -> bool:
+        """Authenticates (if needed) and reads the initial playback state."""
+        with self._connect_lock:
+            if self.client is not None:
+                return True
+            try:
+                if self.auth_manager is None:
+                    self.auth_manager = self._build_auth_manager()
+                    if self.auth_manager is None:
+                        return False
+                client = spotipy.Spotify(auth_manager=self.auth_manager, requests_session=self.session,
+                                         requests_timeout=self.timeout)
+                if self.api_prefix:
+                    client.prefix = self.api_prefix
+                self.client = client
+                self.refresh_state()
+                print("[Spotify] Spotify client initialized and authenticated successfully.")
+                return True
+            except Exception as e:
+                self.client = None
+                print(f"[Spotify] Failed to initialize Spotify: {e}")
+                return False
+
+    def refresh_token_if_due(self) -> bool:
+        """Refreshes the access token if it expires within `token_margin` seconds."""
+        token_info = self.auth_manager.cache_handler.get_cached_token() if self.auth_manager else None
+        if not token_info or token_info.get("expires_at", 0) - time.time() > self.token_margin:
+            return False
+        self.auth_manager.refresh_access_token(token_info["refresh_token"])
+        return True
+
+    def _call(self, method: str, *args, **kwargs):
+        """One Web API call. A 401 means the token went bad early: refresh and retry once."""
+        start = time.perf_counter()
+        try:
+            self.api_calls += 1
+            return getattr(self.client, method)(*args, **kwargs)
+        except spotipy.exceptions.SpotifyException as e:
+            if e.http_status != 401:
+                raise
+            print("[Spotify] Token rejected, refreshing...")
+            token_info = self.auth_manager.cache_handler.get_cached_token()
+            self.auth_manager.refresh_access_token(token_info["refresh_token"])
+            self.api_calls += 1
+            return getattr(self.client, method)(*args, **kwargs)
+        finally:
+            api_hist.record(time.perf_counter() - start)
+
+    # --- Background refresh ---
+
+    def start(self) -> "SpotifyService":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="spotify-service")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self.session.close()
+
+    def _run(self):
+        # Without a cached token, connecting means the interactive login;
+        # leave that to the first Spotify command, as before.
+        if self.client is None and self.has_cached_token():
+            self.connect()
+        while not self._stopped:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped or self.client is None:
+                continue
+            try:
+                self.refresh_token_if_due()
+                self.refresh_state()
+            except Exception as e:
+                print(f"[Spotify] Background refresh failed: {e}")
+
+    def refresh_state(self) -> PlaybackState:
+        state = PlaybackState.from_api(self._call("current_playback"))
+        with self._lock:
+            self.state = state
+        return state
+
+    def current_state(self) -> PlaybackState:
+        """The cached state, re-read from Spotify only if it's older than `max_state_age`."""
+        state = self.state
+        if state is None or state.age() > self.max_state_age:
+            state = self.refresh_state()
+        return state
+
+    def _update(self, **changes):
+        with self._lock:
+            if self.state is None:
+                return
+            for name, value in changes.items():
+                setattr(self.state, name, value)
+            self.state.updated_at = time.monotonic()
+
+    def _track_changed(self):
+        """The new track's name is only known to Spotify; re-read the state soon."""
+        self._update(track=None, is_playing=True)
+        self._wake.set()
+
+    def _device_gone(self, error: spotipy.exceptions.SpotifyException):
+        if error.reason == 'NO_ACTIVE_DEVICE':
+            with self._lock:
+                self.state = PlaybackState()
+
+    # --- Commands (each updates the cached state on success) ---
+
+    def _command(self, method: str, *args, after=None, **kwargs):
+        try:
+            result = self._call(method, *args, **kwargs)
+        except spotipy.exceptions.SpotifyException as e:
+            self._device_gone(e)
+            raise
+        if after:
+            after()
+        return result
+
+    def set_volume(self, volume: int):
+        self._command("volume", volume, after=lambda: self._update(volume=volume))
+
+    def play(self, uris: list | None = None):
+        if uris:
+            self._command("start_playback", uris=uris, after=self._track_changed)
+        else:
+            self._command("start_playback", after=lambda: self._update(is_playing=True))
+
+    def pause(self):
+        self._command("pause_playback", after=lambda: self._update(is_playing=False))
+
+    def next_track(self):
+        self._command("next_track", after=self._track_changed)
+
+    def previous_track(self):
+        self._command("previous_track", after=self._track_changed)
+
+    def search_track(self, query: str) -> dict | None:
+        """
+        The best matching track as {'uri': ..., 'name': ...}, or None. Cached
+        queries skip the search call; stale ones are re-searched in the background.
+        """
+        track, stale = self.search_cache.get(query)
+        if track is not None:
+            if stale:
+                threading.Thread(target=self._search, args=(query,), daemon=True).start()
+            return track
+        return self._search(query)
+
+    def _search(self, query: str) -> dict | None:
+        results = self._call("search", q=query, limit=1, type='track')
+        tracks = results['tracks']['items']
+        if not tracks:
+            return None
+        track = {"uri": tracks[0]['uri'], "name": tracks[0]['name']}
+        self.search_cache.put(query, track)
+        return track
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_spotify_service() -> SpotifyService:
+    """The shared, started Spotify service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SpotifyService().start()
+        return _service
+
+
+if __name__ == '__main__':
+    # Test against a local fake Spotify Web API: cached state, optimistic
+    # updates, background refresh and early token refresh.
+    import json
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+    from spotipy.cache_handler import MemoryCacheHandler
+
+    fake = {"volume": 40, "is_playing": False, "track": "Song A", "calls": [], "tokens": 0}
+
+    class FakeSpotify(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status: int, body: dict | None = None):
+            data = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_call(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            fake["calls"].append(f"{self.command} {url.path}")
+            if url.path == "/api/token":
+                fake["tokens"] += 1
+                return self.reply(200, {"access_token": f"token-{fake['tokens']}", "token_type": "Bearer",
+                                        "expires_in": 3600, "scope": config.SPOTIPY_SCOPE})
+            if url.path == "/v1/search":
+                return self.reply(200, {"tracks": {"items": [
+                    {"uri": "spotify:track:42", "name": parse_qs(url.query)["q"][0].title()}]}})
+            if url.path == "/v1/me/player" and self.command == "GET":
+                return self.reply(200, {"is_playing": fake["is_playing"], "item": {"name": fake["track"]},
+                                        "device": {"id": "dev1", "name": "Desk", "volume_percent": fake["volume"]}})
+            if url.path == "/v1/me/player/volume":
+                fake["volume"] = int(parse_qs(url.query)["volume_percent"][0])
+            elif url.path == "/v1/me/player/pause":
+                fake["is_playing"] = False
+            elif url.path == "/v1/me/player/play":
+                fake["is_playing"] = True
+            elif url.path == "/v1/me/player/next":
+                fake["track"] = "Song B"
+            self.reply(204)
+
+        do_GET = do_PUT = do_POST = handle_call
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # A cached token that expires in 2 minutes: inside the refresh margin
+    auth = SpotifyOAuth(client_id="id", client_secret="secret", redirect_uri="http://localhost/cb",
+                        scope=config.SPOTIPY_SCOPE, open_browser=False,
+                        cache_handler=MemoryCacheHandler({
+                            "access_token": "token-0", "token_type": "Bearer", "expires_in": 120,
+                            "refresh_token": "refresh", "scope": config.SPOTIPY_SCOPE,
+                            "expires_at": int(time.time()) + 120}))
+    auth.OAUTH_TOKEN_URL = base + "/api/token"
+
+    print("--- Testing Spotify Service ---")
+    search_cache = SpotifySearchCache(path=os.path.join(tempfile.mkdtemp(), "search.json"))
+    service = SpotifyService(auth_manager=auth, api_prefix=base + "/v1/", poll_interval=0.3,
+                             search_cache=search_cache)
+    service.start()
+    time.sleep(0.2)
+    state = service.current_state()
+    print(f"connected: playing={state.is_playing} volume={state.volume} track={state.track}")
+
+    fake["calls"].clear()
+    for _ in range(3):  # "volume up" three times: one call each, no state read first
+        service.set_volume(min(100, service.current_state().volume + 10))
+    print(f"volume up x3 -> cached {service.current_state().volume}, fake {fake['volume']}, "
+          f"calls {fake['calls']}")
+
+    fake["calls"].clear()
+    playing = service.current_state().is_playing
+    service.pause() if playing else service.play()
+    print(f"toggle -> cached playing={service.current_state().is_playing}, calls {fake['calls']}")
+
+    service.next_track()
+    time.sleep(0.2)  # The wake-up re-reads the state for the new track name
+    print(f"next -> track {service.current_state().track}")
+
+    fake["calls"].clear()
+    for query in ("bohemian rhapsody", "the song bohemian rhapsody", "bohemian rhapsodie"):
+        track = service.search_track(query)
+    print(f"play x3 -> {track['name']}, search calls: {fake['calls'].count('GET /v1/search')}")
+
+    fake["volume"] = 15  # Changed from another device
+    time.sleep(0.5)
+    print(f"after background poll: volume {service.current_state().volume}, "
+          f"tokens refreshed early: {fake['tokens']}")
+    print(f"api latency: {api_hist.summary()}")
+    service.stop()
@@ -0,0 +1,124 @@
+# modules/services/spotify_search.py
+import sys
+import os
+import re
+import json
+import time
+import difflib
+import threading
+from collections import OrderedDict
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: spotify_search.py could not import config.")
+    sys.exit(1)
+
+# Words that don't change which track is meant ("play the song hello by adele please")
+FILLER_WORDS = {"the", "song", "track", "by", "please", "some", "on", "spotify", "music", "a"}
+
+def normalize_query(query: str) -> str:
+    """'The song Hello, by Adele!' -> 'hello adele'"""
+    words = re.findall(r"[a-z0-9']+", query.lower().replace("’", "'"))
+    return " ".join(word for word in words if word not in FILLER_WORDS) or " ".join(words)
+
+
+class SpotifySearchCache:
+    """
+    Remembers which track a "play <query>" resolved to, keyed by normalised
+    query and persisted as JSON, so repeat requests skip the search call.
+
+    Lookups fall back to the closest cached query (difflib ratio at least
+    `fuzzy_cutoff`) to absorb ASR variants like "bohemian rhapsodie"; the
+    variant is then stored as an alias. Entries older than `ttl_seconds` are
+    still returned, marked stale, so the caller can revalidate them in the
+    background. Least recently used entries are dropped past `max_entries`.
+    """
+    def __init__(self, path: str = config.SPOTIFY_SEARCH_CACHE_PATH,
+                 max_entries: int = config.SPOTIFY_SEARCH_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = config.SPOTIFY_SEARCH_CACHE_TTL_SECONDS,
+                 fuzzy_cutoff: float = config.SPOTIFY_SEARCH_FUZZY_CUTOFF):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.entries = OrderedDict()  # key -> {"uri", "name", "stored"}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, query: str) -> tuple:
+        """(track dict or None, stale). The track dict has 'uri' and 'name'."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                close = difflib.get_close_matches(key, list(self.entries), n=1, cutoff=self.fuzzy_cutoff)
+                if close:
+                    print(f"[Spotify] Search cache fuzzy hit: '{key}' ~ '{close[0]}'")
+                    entry = dict(self.entries[close[0]])
+                    self.entries[key] = entry  # Remember the variant
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.hits += 1
+            stale = time.time() - entry["stored"] > self.ttl_seconds
+            return {"uri": entry["uri"], "name": entry["name"]}, stale
+
+    def put(self, query: str, track: dict):
+        key = normalize_query(query)
+        with self._lock:
+            self.entries[key] = {"uri": track["uri"], "name": track["name"], "stored": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = OrderedDict(data.get("entries", []))
+            print(f"[Spotify] Loaded {len(self.entries)} cached search result(s).")
+        except Exception as e:
+            print(f"[Spotify] Could not load {self.path}, starting empty: {e}")
+            self.entries = OrderedDict()
+
+    def _save(self):
+        with self._lock:
+            data = {"entries": list(self.entries.items())}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"[Spotify] Could not save {self.path}: {e}")
+
+
+if __name__ == '__main__':
+    import tempfile
+    print("--- Testing Spotify Search Cache ---")
+    path = os.path.join(tempfile.mkdtemp(), "search.json")
+    cache = SpotifySearchCache(path=path, max_entries=3, ttl_seconds=60)
+    cache.put("bohemian rhapsody", {"uri": "spotify:track:1", "name": "Bohemian Rhapsody"})
+    print("normalised hit:", cache.get("the song Bohemian Rhapsody, please"))
+    print("ASR variant hit:", cache.get("bohemian rhapsodie"))
+    print("unrelated miss:", cache.get("hotel california"))
+    cache.put("hello by adele", {"uri": "spotify:track:2", "name": "Hello"})
+    cache.put("yesterday", {"uri": "spotify:track:3", "name": "Yesterday"})
+    print("LRU keys after eviction:", list(cache.entries))
+    print("persisted across restart:", SpotifySearchCache(path=path).get("hello adele"))
+    print("stale after TTL:", SpotifySearchCache(path=path, ttl_seconds=0).get("hello adele"))
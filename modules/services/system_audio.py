@@ -0,0 +1,339 @@
+# modules/services/system_audio.py
+import sys
+import os
+import re
+import subprocess
+import threading
+import time
+from shutil import which
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: system_audio.py could not import config.")
+    sys.exit(1)
+
+# Optional: a native PulseAudio/PipeWire client; without it we drive pactl
+try:
+    import pulsectl
+except ImportError:
+    pulsectl = None
+
+apply_hist = get_histogram("system_audio.apply")
+
+
+class SinkState:
+    """Default sink volume (percent) and mute state."""
+    def __init__(self, volume: int, muted: bool):
+        self.volume = volume
+        self.muted = muted
+
+
+# --- Backends: read() -> SinkState, set_volume(percent), set_mute(bool), watch(callback) ---
+
+class PulsectlBackend:
+    """One native connection for commands, a second one listening for sink changes."""
+    name = "pulsectl"
+
+    def __init__(self):
+        self.pulse = pulsectl.Pulse("lar-volume")
+        self._lock = threading.Lock()  # pulsectl connections aren't thread-safe
+
+    def _sink(self):
+        return self.pulse.get_sink_by_name(self.pulse.server_info().default_sink_name)
+
+    def read(self) -> SinkState:
+        with self._lock:
+            sink = self._sink()
+            return SinkState(round(sink.volume.value_flat * 100), bool(sink.mute))
+
+    def set_volume(self, percent: int):
+        with self._lock:
+            self.pulse.volume_set_all_chans(self._sink(), percent / 100.0)
+
+    def set_mute(self, muted: bool):
+        with self._lock:
+            self.pulse.mute(self._sink(), muted)
+
+    def watch(self, callback):
+        def listen():
+            with pulsectl.Pulse("lar-volume-events") as events:
+                events.event_mask_set("sink", "server")
+                events.event_callback_set(lambda event: callback())
+                events.event_listen()
+        threading.Thread(target=listen, daemon=True, name="pulse-events").start()
+
+
+class PactlBackend:
+    """
+    pactl for reads and writes, plus one long-lived `pactl subscribe` that
+    reports sink changes, so the cached state is kept current without
+    forking per command.
+    """
+    name = "pactl"
+
+    def __init__(self):
+        self.subscriber = None
+
+    @staticmethod
+    def _pactl(*args) -> str:
+        return subprocess.run(["pactl", *args], capture_output=True, text=True, timeout=2, check=True).stdout
+
+    def read(self) -> SinkState:
+        volume = re.search(r"(\d+)%", self._pactl("get-sink-volume", "@DEFAULT_SINK@"))
+        muted = "yes" in self._pactl("get-sink-mute", "@DEFAULT_SINK@")
+        return SinkState(int(volume.group(1)) if volume else 0, muted)
+
+    def set_volume(self, percent: int):
+        self._pactl("set-sink-volume", "@DEFAULT_SINK@", f"{percent}%")
+
+    def set_mute(self, muted: bool):
+        self._pactl("set-sink-mute", "@DEFAULT_SINK@", "1" if muted else "0")
+
+    def watch(self, callback):
+        self.subscriber = subprocess.Popen(["pactl", "subscribe"], stdout=subprocess.PIPE,
+                                           stderr=subprocess.DEVNULL, text=True)
+        def listen():
+            for line in self.subscriber.stdout:
+                if "on sink" in line or "on server" in line:
+                    callback()
+        threading.Thread(target=listen, daemon=True, name="pactl-subscribe").start()
+
+
+class AmixerBackend:
+    """Last resort for ALSA-only systems: no change events, so reads aren't cached for long."""
+    name = "amixer"
+
+    @staticmethod
+    def _amixer(*args) -> str:
+        return subprocess.run(["amixer", *args], capture_output=True, text=True, timeout=2, check=True).stdout
+
+    def read(self) -> SinkState:
+        output = self._amixer("get", "Master")
+        volume = re.search(r"\[(\d+)%\]", output)
+        return SinkState(int(volume.group(1)) if volume else 0, "[off]" in output)
+
+    def set_volume(self, percent: int):
+        self._amixer("set", "Master", f"{percent}%")
+
+    def set_mute(self, muted: bool):
+        self._amixer("set", "Master", "mute" if muted else "unmute")
+
+    def watch(self, callback):
+        pass
+
+
+def _open_backend():
+    if pulsectl is not None:
+        try:
+            return PulsectlBackend()
+        except Exception as e:
+            print(f"[Audio] pulsectl could not connect, using pactl: {e}")
+    if which("pactl"):
+        return PactlBackend()
+    if which("amixer"):
+        return AmixerBackend()
+    return None
+
+
+class SystemAudioController:
+    """
+    System (default sink) volume and mute, with the state cached in memory.
+
+    The backend reports sink changes (including ones made elsewhere), and a
+    refresher thread re-reads the state off the command path. Events within
+    `echo_window` of our own write are its echo and aren't re-read (with
+    pactl that would fork twice more per command). Volume changes are
+    applied after a `coalesce_window`: "volume up" said three times in quick
+    succession becomes one +30% write.
+    """
+    def __init__(self, backend=None, coalesce_window: float = config.SYSTEM_VOLUME_COALESCE_WINDOW,
+                 max_state_age: float = config.SYSTEM_VOLUME_MAX_STATE_AGE,
+                 echo_window: float = config.SYSTEM_VOLUME_ECHO_WINDOW):
+        self.backend = backend if backend is not None else _open_backend()
+        self.coalesce_window = coalesce_window
+        self.max_state_age = max_state_age
+        self.echo_window = echo_window
+        self.state = None
+        self.read_at = 0.0
+        self.writes = 0
+        self._pending = None   # Target volume waiting for the coalesce window
+        self._timer = None
+        self._written_at = float("-inf")  # monotonic time of our last write
+        self._event_at = 0.0              # monotonic time of the last sink event
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        if self.backend is not None:
+            self.backend.watch(self._on_change)
+            threading.Thread(target=self._refresher, daemon=True, name="system-audio").start()
+
+    def available(self) -> bool:
+        return self.backend is not None
+
+    def _on_change(self):
+        self._event_at = time.monotonic()
+        self._changed.set()
+
+    def _wrote(self):
+        # Caller holds self._lock
+        self.writes += 1
+        self._written_at = time.monotonic()
+
+    def _refresher(self):
+        while True:
+            self._changed.wait()
+            time.sleep(self.coalesce_window)  # Let a burst of events settle
+            self._changed.clear()
+            with self._lock:
+                if self._pending is not None:
+                    continue  # Our own write is about to land; it sets the state
+                if self._event_at - self._written_at <= self.echo_window:
+                    continue  # The echo of our own write; the state is already set
+            try:
+                self._read()
+            except Exception as e:
+                print(f"[Audio] Could not read the sink state: {e}")
+
+    def _read(self) -> SinkState:
+        state = self.backend.read()
+        with self._lock:
+            self.state, self.read_at = state, time.monotonic()
+        return state
+
+    def current(self) -> SinkState:
+        """The cached sink state; read from the backend only if missing or too old."""
+        with self._lock:
+            state = self.state
+            fresh = time.monotonic() - self.read_at <= self.max_state_age
+        if state is None or not fresh:
+            state = self._read()
+        return state
+
+    def adjust(self, delta: int) -> int:
+        """Changes the volume by `delta` percent. Returns the (pending) new volume."""
+        base = self.current().volume
+        with self._lock:
+            target = max(0, min(100, (self._pending if self._pending is not None else base) + delta))
+            return self._schedule(target)
+
+    def set_volume(self, percent: int) -> int:
+        with self._lock:
+            return self._schedule(max(0, min(100, percent)))
+
+    def _schedule(self, target: int) -> int:
+        # Caller holds self._lock
+        self._pending = target
+        if self._timer is None:
+            self._timer = threading.Timer(self.coalesce_window, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return target
+
+    def _flush(self):
+        with self._lock:
+            target, self._pending, self._timer = self._pending, None, None
+        if target is None:
+            return
+        start = time.perf_counter()
+        try:
+            self.backend.set_volume(target)
+            with self._lock:
+                self._wrote()
+                if self.state is not None:
+                    self.state.volume = target
+        except Exception as e:
+            print(f"[Audio] Setting volume to {target}% failed: {e}")
+        finally:
+            apply_hist.record(time.perf_counter() - start)
+
+    def set_mute(self, muted: bool):
+        start = time.perf_counter()
+        self.backend.set_mute(muted)
+        apply_hist.record(time.perf_counter() - start)
+        with self._lock:
+            self._wrote()
+            if self.state is not None:
+                self.state.muted = muted
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_system_audio() -> SystemAudioController:
+    """The shared system audio controller."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = SystemAudioController()
+        return _controller
+
+
+if __name__ == '__main__':
+    # Test the pactl backend against a fake `pactl` on $PATH that logs every
+    # invocation: repeated adjustments must coalesce and reads come from cache.
+    import tempfile
+    root = tempfile.mkdtemp()
+    state_path, log_path = os.path.join(root, "sink"), os.path.join(root, "calls")
+    with open(state_path, "w") as f:
+        f.write("40 no")
+    with open(os.path.join(root, "pactl"), "w") as f:
+        f.write(f'''#!{sys.executable}
+import sys, os, time
+state_path, log_path = {state_path!r}, {log_path!r}
+args = sys.argv[1:]
+with open(log_path, "a") as log:
+    log.write(" ".join(args) + "\\n")
+volume, muted = open(state_path).read().split()
+if args[0] == "subscribe":
+    last = os.stat(state_path).st_mtime_ns
+    while True:
+        time.sleep(0.02)
+        mtime = os.stat(state_path).st_mtime_ns
+        if mtime != last:
+            last = mtime
+            print("Event 'change' on sink #0", flush=True)
+elif args[0] == "get-sink-volume":
+    print(f"Volume: front-left: 0 / {{volume}}% / 0 dB")
+elif args[0] == "get-sink-mute":
+    print(f"Mute: {{muted}}")
+elif args[0] == "set-sink-volume":
+    open(state_path, "w").write(f"{{args[2].rstrip('%')}} {{muted}}")
+elif args[0] == "set-sink-mute":
+    open(state_path, "w").write(f"{{volume}} {{'yes' if args[2] == '1' else 'no'}}")
+''')
+    os.chmod(os.path.join(root, "pactl"), 0o755)
+    os.environ["PATH"] = root + os.pathsep + os.environ["PATH"]
+
+    def calls():
+        with open(log_path) as f:
+            return [line.split()[0] for line in f if line.strip()]
+
+    print("--- Testing System Audio Controller ---")
+    controller = SystemAudioController(backend=PactlBackend(), coalesce_window=0.15)
+    print("backend:", controller.backend.name, "| volume:", controller.current().volume)
+    before = len(calls())
+    for _ in range(3):
+        controller.adjust(+10)
+    time.sleep(0.5)
+    issued = calls()[before:]
+    print(f"volume up x3 -> {controller.current().volume}% with "
+          f"{issued.count('set-sink-volume')} pactl write(s), "
+          f"{issued.count('get-sink-volume')} re-read(s) of our own change")
+    assert issued == ["set-sink-volume"], issued
+
+    with open(state_path, "w") as f:
+        f.write("25 no")  # Changed by another app
+    time.sleep(0.5)
+    before = len(calls())
+    print(f"external change picked up from events: {controller.current().volume}% "
+          f"({len(calls()) - before} pactl calls on the read)")
+    controller.set_mute(True)
+    print("muted:", controller.current().muted)
+    print(f"apply latency: {apply_hist.summary()}")
+    controller.backend.subscriber.terminate()
@@ -0,0 +1,184 @@
+# modules/services/weather.py
+import sys
+import os
+import threading
+import time
+import requests
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: weather.py could not import config.")
+    sys.exit(1)
+
+fetch_hist = get_histogram("weather.fetch")
+
+
+class WeatherRecord:
+    """One current-conditions reading, e.g. 'Partly cloudy +24°C'."""
+    def __init__(self, conditions: str, fetched_at: float):
+        self.conditions = conditions
+        self.fetched_at = fetched_at  # time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class WeatherService:
+    """
+    Keeps the current weather in memory.
+
+    A background thread refreshes it every `refresh_interval` seconds (shorter
+    than the TTL, so it is normally renewed before it expires) through one
+    pooled requests.Session. Readers never wait on the network: current()
+    returns whatever is cached, and a read of an expired record also kicks off
+    a refresh. If a refresh fails the old record is kept and served as stale,
+    up to `max_stale` seconds old.
+    """
+    def __init__(self, url: str = config.WEATHER_URL,
+                 ttl: float = config.WEATHER_TTL_SECONDS,
+                 refresh_interval: float = config.WEATHER_REFRESH_INTERVAL,
+                 timeout: float = config.WEATHER_TIMEOUT,
+                 max_stale: float = config.WEATHER_MAX_STALE_SECONDS):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.max_stale = max_stale
+        self.session = requests.Session()
+        self.record = None
+        self.failures = 0
+        self._last_attempt = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "WeatherService":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="weather-service")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.session.close()
+
+    def _run(self):
+        self.refresh()
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self, wait: bool = False) -> bool:
+        """
+        Fetches a new reading. Returns False (keeping the old one) on failure.
+        If another refresh is in flight, returns at once unless `wait` is set,
+        in which case it waits for that one instead of starting a second.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            if not wait:
+                return False
+            with self._refresh_lock:
+                return self.record is not None
+        try:
+            self._last_attempt = time.monotonic()
+            start = time.perf_counter()
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            # wttr.in plain text is UTF-8 ("°C") but may come without a charset header
+            conditions = response.content.decode("utf-8", errors="replace").strip()
+            if not conditions:
+                raise ValueError("empty weather response")
+            fetch_hist.record(time.perf_counter() - start)
+            self.record = WeatherRecord(conditions, time.monotonic())
+            self.failures = 0
+            return True
+        except (requests.RequestException, ValueError) as e:
+            self.failures += 1
+            print(f"[Weather] Refresh failed ({self.failures} in a row), keeping cached data: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def current(self) -> WeatherRecord | None:
+        """The cached reading (possibly stale), or None if there is nothing usable."""
+        record = self.record
+        if record is None:
+            return None
+        if record.age() > self.ttl:
+            # Expired: refresh in the background (at most one attempt per timeout period)
+            if not self._refresh_lock.locked() and time.monotonic() - self._last_attempt > self.timeout:
+                threading.Thread(target=self.refresh, daemon=True).start()
+            if record.age() > self.max_stale:
+                return None
+        return record
+
+    def is_fresh(self, record: WeatherRecord) -> bool:
+        return record.age() <= self.ttl
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_weather_service() -> WeatherService:
+    """The shared, started weather service."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WeatherService().start()
+        return _service
+
+
+if __name__ == '__main__':
+    # Test against a local stub server: memory hits, TTL refresh, stale-on-failure
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stub_state = {"hits": 0, "fail": False, "conditions": "Sunny +25°C"}
+
+    class StubWttr(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            stub_state["hits"] += 1
+            if stub_state["fail"]:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = stub_state["conditions"].encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWttr)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    print("--- Testing Weather Service ---")
+    service = WeatherService(url=url, ttl=0.5, refresh_interval=0.3, timeout=1.0, max_stale=60).start()
+    time.sleep(0.1)
+    record = service.current()
+    print("first reading:", record.conditions, f"(stub hits: {stub_state['hits']})")
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        service.current()
+    print(f"served from memory: {(time.perf_counter() - start) / 100000 * 1e6:.2f} us per query")
+
+    stub_state["conditions"] = "Light rain +18°C"
+    time.sleep(0.4)
+    print("after background refresh:", service.current().conditions, f"(stub hits: {stub_state['hits']})")
+
+    stub_state["fail"] = True
+    time.sleep(0.8)
+    record = service.current()
+    print(f"stub failing -> stale served: {record.conditions} (age {record.age():.1f}s, "
+          f"fresh={service.is_fresh(record)})")
+    print(f"fetch latency: {fetch_hist.summary()}")
+    service.stop()
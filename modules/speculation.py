@@ -0,0 +1,162 @@
+# modules/speculation.py
+import sys
+import os
+import queue
+import threading
+import time
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    from modules.llm_client import CancelToken
+    from modules.chat_history import estimate_tokens
+    from modules.response_cache import normalize_prompt
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: Could not import from modules. Check paths.")
+    sys.exit(1)
+
+_DONE = object()
+
+
+class SpeculationStats:
+    """Hit rate, wasted tokens and latency saved by speculative LLM requests."""
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+        self.saved_hist = get_histogram("speculation.saved")
+        self._lock = threading.Lock()
+
+    def record_hit(self, saved_seconds: float):
+        with self._lock:
+            self.hits += 1
+        self.saved_hist.record(saved_seconds)
+
+    def record_miss(self, wasted_tokens: int):
+        with self._lock:
+            self.misses += 1
+            self.wasted_tokens += wasted_tokens
+
+    def summary(self) -> str:
+        with self._lock:
+            reconciled = self.hits + self.misses
+            rate = self.hits / reconciled * 100 if reconciled else 0.0
+            return (f"hit rate {self.hits}/{reconciled} ({rate:.0f}%), "
+                    f"~{self.wasted_tokens} tokens wasted, latency saved: {self.saved_hist.summary()}")
+
+stats = SpeculationStats()
+
+
+class SpeculativeRequest:
+    """
+    An LLM request started from a partial transcript, before the final
+    transcript is known. Sentences are buffered, not spoken, until the logic
+    worker reconciles it with the final text: on a match they are replayed
+    (and the rest streamed live), otherwise the request is cancelled.
+
+    `start_stream(prompt, history, cancel_token, on_tool_call)` must return a
+    query_llm_stream-style sentence generator. It is given a fork of the chat
+    history so an unconfirmed answer never lands in the real one; commit()
+    copies it over once the speculation has been confirmed and consumed.
+    Tool calls are held back the same way and only dispatched by consume().
+    The answer is never cached under the partial text; commit() hands it
+    to `cache` so it is stored under the confirmed final prompt.
+    """
+    def __init__(self, partial_text: str, start_stream, history):
+        self.partial_text = partial_text
+        self.history = history.fork()
+        self._last_turn_before = self.history.turns[-1] if self.history.turns else None
+        self.key = normalize_prompt(partial_text)
+        self.cancel_token = CancelToken()
+        self.started_at = time.perf_counter()
+        self.first_sentence_at = None
+        self.produced = []
+        self.completed = False  # The stream ended by itself, not cancelled or failed
+        self.used_tools = False
+        self._sentences = queue.Queue()
+        self._tool_calls = []
+        self._tool_sink = None
+        self._tool_lock = threading.Lock()
+        self._generator = start_stream(partial_text, self.history, self.cancel_token, self._on_tool_call)
+        stats.started += 1
+        threading.Thread(target=self._run, daemon=True, name="llm-speculation").start()
+
+    def _run(self):
+        try:
+            for sentence in self._generator:
+                if self.first_sentence_at is None:
+                    self.first_sentence_at = time.perf_counter()
+                self.produced.append(sentence)
+                self._sentences.put(sentence)
+            self.completed = not self.cancel_token.cancelled
+        except Exception as e:
+            print(f"[Speculation] Speculative request failed: {e}")
+        finally:
+            self._generator.close()
+            self._sentences.put(_DONE)
+
+    def _on_tool_call(self, tool_call: dict):
+        self.used_tools = True
+        with self._tool_lock:
+            if self._tool_sink is None:
+                self._tool_calls.append(tool_call)  # Not confirmed yet, no side effects
+                return
+            sink = self._tool_sink
+        sink(tool_call)
+
+    def matches(self, final_text: str) -> bool:
+        return self.key == normalize_prompt(final_text)
+
+    def cancel(self):
+        """Aborts the request and counts whatever it generated as wasted."""
+        self.cancel_token.cancel()
+        stats.record_miss(estimate_tokens(" ".join(self.produced)) if self.produced else 0)
+        print(f"[Speculation] Miss for '{self.partial_text}'. {stats.summary()}")
+
+    def consume(self, on_tool_call=None):
+        """
+        Generator over the speculative answer for a confirmed final transcript:
+        buffered sentences first, then the rest as it streams in. Held-back
+        tool calls are dispatched to `on_tool_call` straight away.
+        """
+        final_at = time.perf_counter()
+        if on_tool_call:
+            with self._tool_lock:
+                held, self._tool_calls = self._tool_calls, []
+                self._tool_sink = on_tool_call
+            for tool_call in held:
+                on_tool_call(tool_call)
+        first = True
+        try:
+            while True:
+                sentence = self._sentences.get()
+                if sentence is _DONE:
+                    break
+                if first:
+                    # Without speculation the first sentence would have taken the same
+                    # time-to-first-sentence, but counted from the final transcript.
+                    time_to_first = self.first_sentence_at - self.started_at
+                    stats.record_hit(min(time_to_first, final_at - self.started_at))
+                    print(f"[Speculation] Hit for '{self.partial_text}'. {stats.summary()}")
+                    first = False
+                yield sentence
+            if first:
+                stats.record_hit(0.0)  # Confirmed, but the request produced nothing
+        finally:
+            # The consumer stopped early; don't keep generating for nobody
+            self.cancel_token.cancel()
+
+    def commit(self, history, cache=None):
+        """
+        Records the confirmed exchange in the real chat history, and passes a
+        complete answer without tool calls to `cache(answer)` if given.
+        """
+        if self.history.turns and self.history.turns[-1] is not self._last_turn_before:
+            history.add_exchange(*self.history.turns[-1])
+            if cache and self.completed and not self.used_tools:
+                cache(self.history.turns[-1][1])
@@ -0,0 +1,184 @@
+# modules/startup.py
+# Only imports config, so it can be imported first and time everything after it.
+import sys
+import os
+import json
+import threading
+import time
+import statistics
+from contextlib import contextmanager
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+except ImportError:
+    print("Error: config.py not found.")
+    sys.exit(1)
+
+
+class StartupError(Exception):
+    """A required startup phase failed. `results` holds what the other phases produced, for cleanup."""
+    def __init__(self, message: str, results: dict):
+        super().__init__(message)
+        self.results = results
+
+
+class StartupProfiler:
+    """
+    Records how long each startup phase takes, relative to when this module
+    was first imported, and the time until Lar reports itself online.
+
+    Independent phases are run concurrently with run_parallel(). Every run's
+    time-to-online is appended to a history file, and a run noticeably slower
+    than the recent median is reported as a regression.
+    """
+    def __init__(self, history_path: str = config.STARTUP_HISTORY_PATH):
+        self.t0 = time.perf_counter()
+        self.history_path = history_path
+        self.phases = []  # (name, start offset, duration, thread name)
+        self.online_at = None
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases.append((name, start - self.t0, end - start, threading.current_thread().name))
+            if self.online_at is not None:
+                print(f"[Startup] {name} finished at +{end - self.t0:.2f}s (after online).")
+
+    def run_parallel(self, required: dict, background: dict | None = None) -> dict:
+        """
+        Runs each `name: fn` on its own thread. Waits for the `required` ones
+        and returns their results; `background` ones keep running. Raises
+        StartupError if a required phase fails.
+        """
+        results, errors = {}, {}
+
+        def run(name, fn, record_errors):
+            try:
+                with self.phase(name):
+                    result = fn()
+                results[name] = result
+            except BaseException as e:  # init code may sys.exit()
+                if record_errors:
+                    errors[name] = e
+                else:
+                    print(f"[Startup] Background phase '{name}' failed: {e}")
+
+        threads = []
+        for name, fn in required.items():
+            thread = threading.Thread(target=run, args=(name, fn, True), daemon=True, name=f"init-{name}")
+            thread.start()
+            threads.append(thread)
+        for name, fn in (background or {}).items():
+            threading.Thread(target=run, args=(name, fn, False), daemon=True, name=f"init-{name}").start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            name, error = next(iter(errors.items()))
+            raise StartupError(f"{name} failed: {error}", results) from error
+        return results
+
+    def mark_online(self) -> float:
+        """Records time-to-online, prints the phase report and checks for a regression."""
+        self.online_at = self.elapsed()
+        print(self.report())
+        previous = self._load_history()
+        self._append_history()
+        self._check_regression(previous)
+        return self.online_at
+
+    def report(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+        lines = ["--- Startup report ---",
+                 f"{'phase':<22} {'start':>7} {'took':>7}  thread"]
+        for name, start, duration, thread in phases:
+            lines.append(f"{name:<22} {start:>6.2f}s {duration:>6.2f}s  {thread}")
+        if self.online_at is not None:
+            busy = sum(duration for _, _, duration, _ in phases)
+            lines.append(f"Time to online: {self.online_at:.2f}s "
+                         f"(phases add up to {busy:.2f}s run sequentially)")
+        return "\n".join(lines)
+
+    def _load_history(self) -> list:
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    def _append_history(self):
+        entry = {
+            "time": time.time(),
+            "online": round(self.online_at, 3),
+            "phases": {name: round(duration, 3) for name, _, duration, _ in self.phases}
+        }
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            with open(self.history_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"[Startup] Could not record startup history: {e}")
+
+    def _check_regression(self, previous: list) -> bool:
+        if self.online_at > config.STARTUP_ONLINE_BUDGET:
+            print(f"[Startup] Time to online {self.online_at:.2f}s is over the "
+                  f"{config.STARTUP_ONLINE_BUDGET:.1f}s budget.")
+        recent = [entry["online"] for entry in previous[-config.STARTUP_HISTORY_WINDOW:]]
+        if len(recent) < 3:
+            return False
+        median = statistics.median(recent)
+        if self.online_at > median * config.STARTUP_REGRESSION_FACTOR:
+            print(f"[Startup] Regression: online took {self.online_at:.2f}s, "
+                  f"recent median is {median:.2f}s.")
+            return True
+        return False
+
+# Created on first import, which lar.py does before anything else
+profiler = StartupProfiler()
+
+
+if __name__ == '__main__':
+    # Regression test with simulated phases: the concurrent start must reach
+    # online in about the time of the slowest phase, not the sum of all of them.
+    import tempfile
+    SIMULATED = {"ASR warm-up": 0.4, "Piper load": 0.3, "Porcupine init": 0.2}
+
+    def simulate(seconds):
+        return lambda: time.sleep(seconds)
+
+    sequential = StartupProfiler(os.path.join(tempfile.mkdtemp(), "history.jsonl"))
+    for name, seconds in SIMULATED.items():
+        with sequential.phase(name):
+            time.sleep(seconds)
+    sequential_online = sequential.mark_online()
+
+    history = os.path.join(tempfile.mkdtemp(), "history.jsonl")
+    for run in range(4):
+        parallel = StartupProfiler(history)
+        parallel.run_parallel({n: simulate(s) for n, s in SIMULATED.items()},
+                              background={"LLM warm-up": simulate(0.6)})
+        parallel_online = parallel.mark_online()
+
+    assert parallel_online < max(SIMULATED.values()) + 0.1, parallel_online
+    assert parallel_online < sequential_online / 1.5, (parallel_online, sequential_online)
+    print(f"\nOK: sequential {sequential_online:.2f}s -> concurrent {parallel_online:.2f}s")
+
+    slow = StartupProfiler(history)
+    slow.run_parallel({"ASR warm-up": simulate(0.8)})
+    slow.mark_online()  # Should print a regression warning
+    time.sleep(0.3)  # Let the background phase report
@@ -0,0 +1,207 @@
+# modules/tracing.py
+import sys
+import os
+import json
+import glob
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+
+# --- Robust Path Setup ---
+try:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    import config
+    from modules.metrics import get_histogram
+except ImportError:
+    print("Error: tracing.py could not import config.")
+    sys.exit(1)
+
+# The spans of one spoken request, each timed from the span it follows. "first_audio"
+# is timed from routing, as the thinking phrase may be heard before the LLM's first token.
+SPAN_AFTER = {
+    "speech_end": "start",
+    "endpointed": "speech_end",
+    "asr_done": "endpointed",
+    "routed": "asr_done",
+    "llm_first_token": "routed",
+    "first_audio": "routed",
+}
+SPANS = tuple(SPAN_AFTER)
+
+
+class Tracer:
+    """
+    Per-utterance latency tracing.
+
+    begin() allocates a request ID when the wake word (or a follow-up) is
+    heard; the ID travels with the audio, transcript and sentences through
+    the pipeline, and each stage calls mark() as it reaches a span. Every
+    span is written as one JSON line with its wall-clock time, the time
+    since the span it follows (`ms`, see SPAN_AFTER) and since the request
+    began. Only the first mark of a span counts, so "first audio" can be
+    marked for every sentence.
+    Spans are also recorded in the `trace.<span>` histograms.
+    """
+    def __init__(self, path: str = config.TRACE_PATH, max_bytes: int = config.TRACE_MAX_BYTES,
+                 backups: int = config.TRACE_BACKUPS, max_open: int = config.TRACE_OPEN_REQUESTS,
+                 enabled: bool = config.TRACE_ENABLED):
+        self.path = path
+        self.max_open = max_open
+        self.run = int(time.time())  # Request IDs restart with every run
+        self._ids = itertools.count(1)
+        self._open = OrderedDict()   # request_id -> {span: time}, oldest request first
+        self._lock = threading.Lock()
+        self._file = None  # Rotates the file and serialises writes from the stage threads
+        if enabled:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._file = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            except OSError as e:
+                print(f"[Trace] Could not open {path}, spans are only kept as metrics: {e}")
+
+    def begin(self, source: str) -> int:
+        """Starts tracing a new spoken request and returns its ID."""
+        now = time.time()
+        with self._lock:
+            request_id = next(self._ids)
+            self._open[request_id] = {"start": now}
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)  # Never finished (e.g. no command after the wake word)
+        self._write({"run": self.run, "request": request_id, "span": "start", "t": round(now, 4),
+                     "source": source})
+        return request_id
+
+    def mark(self, request_id: int, span: str, at: float | None = None, **fields) -> bool:
+        """
+        Records `span` for the request, at time.time() or the given `at`.
+        Returns False if the request isn't traced or the span was already marked.
+        """
+        now = time.time() if at is None else at
+        with self._lock:
+            request = self._open.get(request_id)
+            if request is None or span in request:
+                return False
+            previous = request.get(SPAN_AFTER.get(span), max(request.values()))
+            request[span] = now
+            since_previous = now - previous
+            since_start = now - request["start"]
+        get_histogram(f"trace.{span}").record(max(since_previous, 0.0))
+        self._write({"run": self.run, "request": request_id, "span": span, "t": round(now, 4),
+                     "ms": round(since_previous * 1000, 1), "since_start_ms": round(since_start * 1000, 1),
+                     **fields})
+        return True
+
+    def _write(self, record: dict):
+        if self._file is not None:
+            self._file.handle(logging.makeLogRecord({"msg": json.dumps(record)}))
+
+
+# --- Summariser ---
+
+def trace_files(path: str = config.TRACE_PATH) -> list:
+    """The trace file and its rotated backups, oldest first."""
+    backups = sorted(glob.glob(f"{glob.escape(path)}.[0-9]*"),
+                     key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+def load_spans(paths: list) -> list:
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a crash
+    return records
+
+def percentile(sorted_samples: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return sorted_samples[int(rank) - 1]
+
+def summarize(records: list) -> dict:
+    """
+    {row: sorted milliseconds}: one row per span (time since the span it
+    follows) plus "reply" (speech end to first audio, what the user waits for).
+    """
+    rows, requests = {}, {}
+    for record in records:
+        span = record.get("span")
+        if span == "start":
+            continue
+        rows.setdefault(span, []).append(record["ms"])
+        requests.setdefault((record["run"], record["request"]), {})[span] = record["t"]
+    for spans in requests.values():
+        if "speech_end" in spans and "first_audio" in spans:
+            rows.setdefault("reply", []).append((spans["first_audio"] - spans["speech_end"]) * 1000)
+    order = {span: index for index, span in enumerate(SPANS + ("reply",))}
+    return {span: sorted(samples) for span, samples in sorted(rows.items(), key=lambda r: order.get(r[0], len(order)))}
+
+def report(path: str = config.TRACE_PATH) -> str:
+    """p50/p95/p99 per span over the trace file and its backups."""
+    summary = summarize(load_spans(trace_files(path)))
+    if not summary:
+        return f"No spans traced in {path}."
+    lines = [f"{'span':<16} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for span, samples in summary.items():
+        lines.append(f"{span:<16} {len(samples):>5} " + " ".join(
+            f"{percentile(samples, p):>6.0f}ms" for p in (50, 95, 99)))
+    return "\n".join(lines)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """The shared tracer, writing to TRACE_PATH."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+if __name__ == '__main__':
+    # `python -m modules.tracing` summarises TRACE_PATH (or the given file);
+    # `--test` simulates utterances into a small, rotating trace first.
+    if len(sys.argv) > 1 and sys.argv[1] != "--test":
+        print(report(sys.argv[1]))
+        sys.exit(0)
+    if len(sys.argv) == 1:
+        print(report())
+        sys.exit(0)
+
+    import random
+    import tempfile
+    print("--- Testing Tracer ---")
+    path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    tracer = Tracer(path=path, max_bytes=8_000, backups=5)
+    random.seed(0)
+    for _ in range(60):
+        request_id = tracer.begin("wake_word")
+        base = time.time()
+        speech_end = base + random.uniform(0.8, 2.5)
+        tracer.mark(request_id, "speech_end", at=speech_end)
+        at = speech_end + 0.8  # Silence endpointing
+        tracer.mark(request_id, "endpointed", at=at)
+        at += random.uniform(0.15, 0.4)
+        tracer.mark(request_id, "asr_done", at=at)
+        at += 0.0005
+        route = random.choice(("fastpath", "llm"))
+        tracer.mark(request_id, "routed", at=at, route=route)
+        # The thinking phrase is usually heard before the LLM's first token
+        tracer.mark(request_id, "first_audio", at=at + random.uniform(0.05, 0.12))
+        if route == "llm":
+            tracer.mark(request_id, "llm_first_token", at=at + random.uniform(0.2, 1.5))
+        assert not tracer.mark(request_id, "first_audio", at=at + 2), "a second first_audio must be ignored"
+
+    files = trace_files(path)
+    print(f"{len(files)} trace files after rotation: {[os.path.basename(f) for f in files]}")
+    print(report(path))
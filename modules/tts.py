@@ -2,6 +2,8 @@
 import subprocess
 import sys
 import os
+import threading
+import time
 
 # --- Robust Path Setup ---
 try:
@@ -10,6 +12,7 @@ try:
     if project_root not in sys.path:
         sys.path.append(project_root)
     import config
+    from modules.audio_output import get_mixer, shutdown_mixer
 except ImportError:
     print("Error: config.py not found.")
     sys.exit(1)
@@ -17,43 +20,33 @@ except ImportError:
 class TTS_Server:
     """
     Manages a persistent Piper TTS process for low-latency speech synthesis.
+    Piper's raw PCM is played through the shared output mixer, so earcons
+    and speech share one always-open device.
     """
     def __init__(self):
         self.piper_process = None
-        self.aplay_process = None
+        self.reader_thread = None
+        self._on_audio = None # Called with the next chunk Piper produces (see speak)
         
         piper_command = [
             config.PIPER_PATH,
             '--model', config.PIPER_MODEL_PATH,
             '--output-raw'
         ]
-        
-        # --- MODIFICATION ---
-        # Use the absolute path to aplay to avoid PATH issues.
-        # Replace '/usr/bin/aplay' if your `which aplay` command showed a different path.
-        aplay_command = [
-            '/usr/bin/aplay', # <--- Use absolute path here
-            '-r', '22050',
-            '-f', 'S16_LE',
-            '-c', '1'
-        ]
 
         try:
+            self.mixer = get_mixer()
             self.piper_process = subprocess.Popen(
                 piper_command,
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.DEVNULL
             )
-            self.aplay_process = subprocess.Popen(
-                aplay_command,
-                stdin=self.piper_process.stdout,
-                stderr=subprocess.DEVNULL
-            )
+            self.reader_thread = threading.Thread(target=self._pump_audio, daemon=True)
+            self.reader_thread.start()
             print("TTS Server initialized successfully.")
         except FileNotFoundError:
-            # This error is now more specific.
-            print("Error: '/usr/bin/aplay' or Piper executable not found. Check the path.")
+            print("Error: Piper executable not found. Check the path.")
             self.shutdown()
             sys.exit(1)
         except Exception as e:
@@ -61,9 +54,26 @@ class TTS_Server:
             self.shutdown()
             sys.exit(1)
 
-    def speak(self, text: str):
+    def _pump_audio(self):
+        """Copies Piper's stdout into the mixer as soon as each chunk is available."""
+        stdout = self.piper_process.stdout
+        try:
+            while True:
+                data = stdout.read1(4096)
+                if not data:
+                    break
+                on_audio, self._on_audio = self._on_audio, None
+                self.mixer.write_pcm(data)
+                if on_audio:
+                    on_audio()
+        except Exception as e:
+            print(f"TTS Error: Audio reader stopped: {e}")
+
+    def speak(self, text: str, on_audio=None):
         """
         Sends text to the running Piper process to be spoken.
+        `on_audio()` is called once the next chunk of audio reaches the mixer;
+        if Piper is idle, that is when this text starts playing.
         """
         if not self.piper_process or not self.piper_process.stdin:
             print("TTS Error: Piper process is not running.")
@@ -73,6 +83,8 @@ class TTS_Server:
         
         print(f"Lar: {text}")
         try:
+            if on_audio:
+                self._on_audio = on_audio
             text_with_newline = (text + '\n').encode('utf-8')
             self.piper_process.stdin.write(text_with_newline)
             self.piper_process.stdin.flush()
@@ -83,18 +95,15 @@ class TTS_Server:
 
     def shutdown(self):
         """
-        Terminates the Piper and aplay processes gracefully.
+        Terminates the Piper process gracefully.
+        The shared mixer is owned by the caller and closed separately.
         """
         print("Shutting down TTS Server...")
         if self.piper_process:
             self.piper_process.terminate()
-        if self.aplay_process:
-            self.aplay_process.terminate()
-        
-        if self.piper_process:
             self.piper_process.wait()
-        if self.aplay_process:
-            self.aplay_process.wait()
+        if self.reader_thread:
+            self.reader_thread.join(timeout=1.0)
 
 if __name__ == '__main__':
     print("--- Testing TTS Server Module ---")
@@ -102,5 +111,8 @@ if __name__ == '__main__':
     try:
         tts.speak("If you can hear this, the persistent TTS server is working.")
         tts.speak("This second sentence should play almost instantly.")
+        time.sleep(1.0) # Give Piper time to start producing audio
+        tts.mixer.wait_for_tts(timeout=15.0)
     finally:
-        tts.shutdown()
\ No newline at end of file
+        tts.shutdown()
+        shutdown_mixer()
\ No newline at end of file
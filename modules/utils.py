@@ -1,6 +1,4 @@
 # modules/utils.py
-import soundfile as sf
-import sounddevice as sd
 import os
 import random
 
@@ -19,14 +17,15 @@ ACK_START_SOUND = os.path.join(project_root, "assets", "audio", "ack_start.wav")
 
 def play_sound(sound_path: str):
     """
-    Plays a WAV file using sounddevice.
+    Plays a preloaded earcon through the shared output mixer.
+    Non-blocking: the sound is mixed with any TTS audio already playing.
+    Earcons must be loaded with modules.audio_output.load_earcons() at startup.
     """
-    if not os.path.exists(sound_path):
-        return
+    # Imported here so text-only users of utils don't open an audio device
+    from modules.audio_output import play_earcon
     try:
-        data, fs = sf.read(sound_path, dtype='float32')
-        sd.play(data, fs)
-        sd.wait()
+        if not play_earcon(sound_path):
+            print(f"[Audio] Earcon not preloaded, skipping: {sound_path}")
     except Exception as e:
         print(f"Error playing sound: {e}")
 